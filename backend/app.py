@@ -1,18 +1,52 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, redirect
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import mysql.connector
+from mysql.connector import pooling
 import jwt
 from datetime import datetime, timezone, timedelta
 import os
-from functools import wraps, lru_cache
+import threading
+from functools import wraps, partial
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date
 import json
-from PIL import Image
+import posixpath
+import time
 from io import BytesIO
-from decimal import Decimal
-from flask.json import JSONEncoder
+from utils.serialization import jsonify, raw_json, init_app as init_json
+from utils.mysql_converter import WireConverter
+from utils.image_worker import ImageWorker, QueueFull
+from utils.image_cache import ResizeCache
+from utils.image_cleanup import cleanup_thumbnails
+from utils.file_serving import FileServer
+from utils.upload_index import UploadIndex
+from utils.spooled_request import SpooledRequest
+from utils.query_stats import QueryStats
+from utils.slow_queries import SlowQueryLog
+from utils.statement_cache import StatementCache, StatementPool
+from utils.db_router import ReplicaRouter, parse_replicas
+from utils.deadlines import Deadlines, DeadlineExceeded, parse_overrides
+from utils.transactions import Transactions, TransactionConflict
+from utils.blob_store import (
+    store as store_blob, remove as remove_upload, storage_path, blob_name, blob_filename, ChecksumMismatch
+)
+from utils.storage import storage_from_env, put_blob, process_stored_upload, stored_metadata
+from utils.resumable_uploads import UploadSessions, UploadError, parse_metadata as parse_upload_metadata
+from utils.image_variants import (
+    negotiate, build_srcset, parse_widths, format_widths, VARIANTS_DIR
+)
+from utils.listing_sql import (
+    GROUP_CONCAT_HINT, DISTANCE_SQL, NEARBY_FOOD_SQL, NEARBY_STAYS_SQL,
+    image_list_sql, first_image_sql, stay_images_sql, stay_amenities_sql
+)
+from utils.records import (
+    FoodExperience, Stay, Host, Image as ImageRecord,
+    FOOD_EXPERIENCE_COLUMNS, STAY_COLUMNS,
+    select_columns, compile_shaper, columns_spec
+)
 
 # Load environment variables
 load_dotenv()
@@ -24,9 +58,11 @@ if os.getenv('FLASK_ENV') == 'production':
     CORS(app, resources={
         r"/*": {
             "origins": ["http://167.99.157.245"],
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Type"]
+            "methods": ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "Tus-Resumable",
+                              "Upload-Length", "Upload-Offset", "Upload-Metadata"],
+            "expose_headers": ["Content-Type", "Location", "Tus-Resumable",
+                               "Upload-Length", "Upload-Offset", "Upload-Expires"]
         }
     })
 else:
@@ -39,18 +75,169 @@ DB_CONFIG = {
     'host': os.getenv('MYSQL_HOST', 'localhost'),
     'user': os.getenv('MYSQL_USER'),
     'password': os.getenv('MYSQL_PASSWORD'),
-    'database': os.getenv('MYSQL_DATABASE')
+    'database': os.getenv('MYSQL_DATABASE'),
+    # Rows come back as floats, ISO strings and bools (see WireConverter).
+    # That takes the pure Python protocol instead of the C extension; see
+    # benchmarks/bench_driver.py for what it costs
+    'converter_class': WireConverter,
+    'use_pure': True
 }
+DB_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 10))
+
+# Hot queries run as server-side prepared statements, kept per pooled
+# connection so each is parsed once per connection rather than per request.
+# PREPARED_STATEMENTS=0 goes back to plain text-protocol cursors.
+statements = StatementCache(
+    enabled=os.getenv('PREPARED_STATEMENTS', '1') == '1',
+    size=int(os.getenv('PREPARED_STATEMENTS_PER_CONNECTION', 64))
+)
+
+def make_pool(name, config):
+    # The default pool resets sessions, dropping prepared statements
+    pool_class = StatementPool if statements.enabled else pooling.MySQLConnectionPool
+    return pool_class(pool_name=name, pool_size=DB_POOL_SIZE, **config)
+
+# Read-only handlers use the replicas in MYSQL_REPLICAS (comma-separated
+# host[:port]) when set. After a write the client reads from the primary
+# for DB_STICKY_SECONDS, so hosts see their own changes straight away.
+db_router = ReplicaRouter(
+    parse_replicas(os.getenv('MYSQL_REPLICAS', ''), DB_CONFIG),
+    make_pool,
+    sticky_seconds=int(os.getenv('DB_STICKY_SECONDS', 10)),
+    max_lag=int(os.getenv('MYSQL_REPLICA_MAX_LAG')) if os.getenv('MYSQL_REPLICA_MAX_LAG') else None,
+    secure_cookie=os.getenv('FLASK_ENV') == 'production'
+)
+db_router.init_app(app)
+
+# Routes that can scan a lot (the distance searches) get a time budget:
+# their SELECTs carry MAX_EXECUTION_TIME and they answer 503 once it's
+# spent. DEADLINES_MS overrides it per endpoint ("get_stays=3000", 0 = off).
+deadlines = Deadlines(parse_overrides(os.getenv('DEADLINES_MS', '')))
+MAX_RADIUS_KM = float(os.getenv('MAX_SEARCH_RADIUS_KM', 500))
+
+# Host saves that run into a deadlock or lock wait timeout (two tabs, a
+# bulk script) are rolled back and run again, up to TX_RETRY_ATTEMPTS in
+# all, before answering 503
+transactions = Transactions(attempts=int(os.getenv('TX_RETRY_ATTEMPTS', 3)))
+
+# Statements slower than SLOW_QUERY_MS (0 turns this off) are EXPLAINed in
+# the background and kept in a ring buffer of the last SLOW_QUERY_BUFFER,
+# and with SLOW_QUERY_TABLE=1 also in the slow_queries table so they
+# survive restarts; see /api/admin/slow-queries
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 500))
+slow_query_log = SlowQueryLog(
+    lambda: mysql.connector.connect(**DB_CONFIG),
+    threshold_ms=SLOW_QUERY_MS,
+    capacity=int(os.getenv('SLOW_QUERY_BUFFER', 200)),
+    table='slow_queries' if os.getenv('SLOW_QUERY_TABLE', '0') == '1' else None
+) if SLOW_QUERY_MS > 0 else None
+
+# Users allowed on the /api/admin endpoints
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+# Every request's queries are counted and timed; a statement repeated more
+# than QUERY_REPEAT_THRESHOLD times in one request is logged as a likely
+# N+1. SERVER_TIMING=1 sends the totals in a Server-Timing header.
+query_stats = QueryStats(
+    repeat_threshold=int(os.getenv('QUERY_REPEAT_THRESHOLD', 5)),
+    server_timing=os.getenv('SERVER_TIMING', '0' if os.getenv('FLASK_ENV') == 'production' else '1') == '1',
+    slow_log=slow_query_log
+)
+query_stats.init_app(app)
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('UPLOAD_MAX_MB', 16)) * 1024 * 1024  # 16MB max file size
 
 # Create uploads directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Uploaded files past a small buffer are spooled to disk on the upload volume
+SpooledRequest.spool_size = int(os.getenv('UPLOAD_SPOOL_KB', 256)) * 1024
+SpooledRequest.spool_dir = os.path.join(UPLOAD_FOLDER, '.spool')
+os.makedirs(SpooledRequest.spool_dir, exist_ok=True)
+app.request_class = SpooledRequest
+
+# Uploads are re-encoded in a process pool so requests don't wait on PIL
+image_worker = ImageWorker(
+    max_workers=int(os.getenv('IMAGE_WORKERS', 0)) or None,
+    max_pending=int(os.getenv('IMAGE_QUEUE_SIZE', 32)),
+    max_attempts=int(os.getenv('IMAGE_MAX_ATTEMPTS', 3))
+)
+
+def parse_sizes(value):
+    """Parse a size whitelist like '160x160,640x480' into {(160, 160), (640, 480)}"""
+    sizes = set()
+    for size in value.split(','):
+        width, _, height = size.strip().partition('x')
+        sizes.add((int(width), int(height)))
+    return sizes
+
+# On-demand resizes (/uploads/<w>x<h>/<file>) are limited to these sizes so
+# clients can't fill the disk with arbitrary dimensions
+RESIZE_SIZES = parse_sizes(os.getenv('IMAGE_RESIZE_SIZES', '160x160,320x240,640x480,1280x960'))
+resize_cache = ResizeCache(
+    os.path.join(UPLOAD_FOLDER, 'resized'),
+    max_bytes=int(os.getenv('IMAGE_CACHE_MB', 512)) * 1024 * 1024,
+    policy=os.getenv('IMAGE_CACHE_POLICY', 'lru')
+)
+# The budget may have shrunk since the cache was last filled
+cleanup_thumbnails(resize_cache)
+
+# Unreferenced uploads younger than this are kept: a listing referencing
+# them may still be being saved. The orphan sweep collects them later.
+UPLOAD_GRACE_SECONDS = int(os.getenv('UPLOAD_GRACE_SECONDS', 3600))
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Resumable uploads are assembled under uploads/.sessions; sessions idle
+# for longer than UPLOAD_SESSION_HOURS are expired
+upload_sessions = UploadSessions(
+    os.path.join(UPLOAD_FOLDER, '.sessions'),
+    max_length=app.config['MAX_CONTENT_LENGTH'],
+    ttl=int(os.getenv('UPLOAD_SESSION_HOURS', 24)) * 60 * 60
+)
+upload_sessions.expire()
+
+# STORAGE_BACKEND=s3 keeps uploads in an S3-compatible bucket that every
+# app node shares; the default keeps them in UPLOAD_FOLDER. Either way
+# clients can PUT uploads straight to storage with a presigned URL.
+storage = storage_from_env(UPLOAD_FOLDER, app.config['SECRET_KEY'], '/api/storage/')
+image_task = partial(process_stored_upload, storage)
+PRESIGN_EXPIRES_SECONDS = int(os.getenv('UPLOAD_PRESIGN_SECONDS', 900))
+# Remote uploads are hashed here before they are sent to storage
+STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, '.staging')
+os.makedirs(STAGING_FOLDER, exist_ok=True)
+
+# Listings check image existence against this instead of the filesystem
+if storage.is_local:
+    upload_index = UploadIndex(UPLOAD_FOLDER)
+    upload_index.build()
+else:
+    # Indexed from a bucket listing, so only names missing from it cost a
+    # HEAD request (at most once per miss_ttl)
+    upload_index = UploadIndex(UPLOAD_FOLDER, exists=lambda name: storage.exists(storage_path(name)))
+    try:
+        upload_index.build(storage.keys())
+    except Exception as e:
+        print(f"Error listing the upload bucket, checking uploads one by one: {e}")
+
+# Fallback images served for missing uploads, resolved once at startup
+DEFAULT_IMAGES = {
+    name for name in ('default-avatar.png', 'default-food.jpg', 'jollof.jpg', 'mountain.jpg')
+    if os.path.exists(os.path.join(STATIC_FOLDER, name))
+}
+
+# UPLOAD_SERVE_MODE=accel hands file transfers to nginx through the
+# internal locations below (see setup_production.sh)
+file_server = FileServer(os.getenv('UPLOAD_SERVE_MODE', 'direct'), {
+    UPLOAD_FOLDER: os.getenv('UPLOAD_ACCEL_PREFIX', '/_uploads/'),
+    STATIC_FOLDER: os.getenv('STATIC_ACCEL_PREFIX', '/_static/')
+})
+file_server.init_app(app)
+
 def get_full_url(path):
     """Helper function to get full URL for a path"""
     if path.startswith('http'):
@@ -59,10 +246,36 @@ def get_full_url(path):
         return f"{app.config['BASE_URL']}{path}"
     return path
 
+# URL prefix for uploaded files, resolved once for the hot listing paths
+UPLOAD_URL_PREFIX = get_full_url('/uploads/')
+
+def upload_url(filename):
+    return f"{UPLOAD_URL_PREFIX}{filename}"
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = make_pool('fiat', DB_CONFIG)
+    return _db_pool
+
 # Database connection helper with error handling
-def get_db_connection():
+def get_db_connection(read_only=False):
+    """Connection to the primary; with read_only, to a replica if one can serve this request"""
+    if read_only:
+        conn = db_router.connection()
+        if conn is not None:
+            return query_stats.wrap(deadlines.wrap(conn))
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        try:
+            return query_stats.wrap(deadlines.wrap(get_db_pool().get_connection()))
+        except mysql.connector.errors.PoolError:
+            # Pool exhausted, fall back to a one-off connection
+            return query_stats.wrap(deadlines.wrap(mysql.connector.connect(**DB_CONFIG)))
     except mysql.connector.Error as err:
         print(f"Database connection failed: {err}")
         raise
@@ -80,11 +293,10 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('SELECT * FROM users WHERE id = %s', (data['user_id'],))
-            current_user = cursor.fetchone()
-            cursor.close()
+            conn = get_db_connection(read_only=True)
+            current_user = statements.fetchone(
+                conn, 'SELECT * FROM users WHERE id = %s', (data['user_id'],), dictionary=True
+            )
             conn.close()
         except:
             return jsonify({'message': 'Token is invalid'}), 401
@@ -93,13 +305,20 @@ def token_required(f):
     
     return decorated
 
-class CustomJSONEncoder(JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super().default(obj)
+def admin_required(f):
+    """token_required, and the user's email must be in ADMIN_EMAILS"""
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        if not current_user or current_user['email'].lower() not in ADMIN_EMAILS:
+            return jsonify({'message': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+
+    return decorated
 
-app.json_encoder = CustomJSONEncoder
+# Responses are encoded with orjson (Decimal, datetime and date handled
+# centrally), so handlers don't need to convert row values themselves
+init_json(app)
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -154,9 +373,6 @@ def register():
         if not user:
             raise Exception("User was not created successfully")
         
-        # Convert datetime to string for JSON serialization
-        user['created_at'] = user['created_at'].isoformat()
-        
         # Generate token
         token = jwt.encode({
             'user_id': user['id'],
@@ -208,9 +424,6 @@ def login():
         # Remove password from user dict
         user.pop('password', None)
         
-        # Convert is_host to boolean
-        user['is_host'] = bool(user['is_host'])
-        
         # Generate token
         token = jwt.encode({
             'user_id': user['id'],
@@ -239,7 +452,7 @@ def login():
 @token_required
 def get_current_user(current_user):
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         # Get user data including is_host
@@ -251,11 +464,6 @@ def get_current_user(current_user):
         
         print("User data from DB:", user)  # Debug print
         
-        # Convert is_host to boolean
-        user['is_host'] = bool(user['is_host'])
-        
-        print("User data after boolean conversion:", user)  # Debug print
-        
         return jsonify(user)
         
     except Exception as e:
@@ -306,6 +514,233 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def image_columns(metadata):
+    """(variant_widths, blurhash, dominant_color) column values from image metadata"""
+    if not metadata:
+        return (None, None, None)
+    widths = metadata.get('widths')
+    return (format_widths(widths) if widths else None, metadata.get('blurhash'), metadata.get('dominant_color'))
+
+def record_processed_image(filename, metadata):
+    """Store variant widths and placeholder on every image row for filename"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        values = image_columns(metadata) + (filename,)
+        for table in ('food_experience_images', 'stay_images'):
+            cursor.execute(f'''
+                UPDATE {table} SET variant_widths = %s, blurhash = %s, dominant_color = %s
+                WHERE image_path = %s
+            ''', values)
+        conn.commit()
+    except Exception as e:
+        print(f"Error recording image metadata for {filename}: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def read_upload(filename):
+    """An upload's bytes from storage; raises FileNotFoundError if it is missing"""
+    data = storage.read(storage_path(filename))
+    if data is None:
+        raise FileNotFoundError(filename)
+    return data
+
+def upload_path(filename):
+    """Absolute path on disk of an upload, blob variant or legacy file"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], storage_path(filename))
+
+def upload_exists(filename):
+    return storage.exists(storage_path(filename))
+
+def queue_image_processing(filename):
+    """Queue an upload for optimization and responsive variant generation"""
+    return image_worker.submit(filename, filename, task=image_task, on_done=record_processed_image)
+
+def store_upload(stream, original_name, checksum=None):
+    """Store an upload by content hash; returns (filename, created)
+
+    The extension is taken from the client's original_name. A SHA-256
+    checksum, if given, is verified first (ChecksumMismatch otherwise).
+    """
+    ext = os.path.splitext(original_name)[1]
+    if storage.is_local:
+        filename, created = store_blob(app.config['UPLOAD_FOLDER'], stream, ext, expected=checksum)
+    else:
+        filename, created = put_blob(storage, STAGING_FOLDER, stream, ext, expected=checksum)
+    upload_index.add(filename)
+    return filename, created
+
+def save_upload(stream, original_name, checksum=None):
+    """Store an upload by content hash and return its name
+
+    Identical content is stored once; only new content is queued for
+    processing. Raises QueueFull (after discarding the new blob) when the
+    image worker is saturated.
+    """
+    filename, created = store_upload(stream, original_name, checksum)
+    if created:
+        try:
+            queue_image_processing(filename)
+        except QueueFull:
+            discard_uploads([filename])
+            raise
+    return filename
+
+def delete_upload(filename, grace=0):
+    """Delete an upload and its variants from storage; the caller checks it is unreferenced
+
+    Uploads stored or re-uploaded within the last grace seconds are kept.
+    Returns whether the upload was removed.
+    """
+    if storage.is_local:
+        return remove_upload(app.config['UPLOAD_FOLDER'], filename, grace=grace)
+    key = storage_path(filename)
+    modified_at = storage.modified_at(key)
+    if modified_at is None or time.time() - modified_at < grace:
+        return False
+    storage.delete(key)
+    storage.delete_prefix(posixpath.join(posixpath.dirname(key), VARIANTS_DIR, filename))
+    return True
+
+def discard_uploads(filenames):
+    """Remove uploads this request just stored but won't reference after all"""
+    for filename in filenames:
+        delete_upload(filename)
+        upload_index.discard(filename)
+        resize_cache.discard(filename)
+
+def process_image_batch(files):
+    """Store uploaded images and process the new ones in parallel
+
+    Returns (results, images): a result dict per file in request order, and
+    (filename, image_columns, created) for each file that succeeded, ready
+    to insert. Blobs created for files that failed are removed again, and
+    QueueFull is raised (after removing them all) when the image worker
+    has no room for the batch. If storing a file fails, the blobs created
+    for the files before it are removed before the error is raised.
+    """
+    results = []
+    stored = []
+    try:
+        for file in files:
+            result = {'name': file.filename}
+            results.append(result)
+            if not file or not allowed_file(file.filename):
+                result.update(status='error', error='File type not allowed')
+                continue
+            filename, created = store_upload(file.stream, file.filename)
+            stored.append((result, filename, created))
+    except Exception:
+        discard_uploads(list(dict.fromkeys(filename for _, filename, created in stored if created)))
+        raise
+
+    # Content seen before was processed when it was first uploaded
+    new_files = list(dict.fromkeys(filename for _, filename, created in stored if created))
+    try:
+        outcomes = image_worker.run_batch(new_files, task=image_task)
+    except QueueFull:
+        discard_uploads(new_files)
+        raise
+
+    processed = {}
+    failed = {}
+    for filename, (result, error) in zip(new_files, outcomes):
+        if error is None:
+            processed[filename] = image_columns(result)
+        else:
+            print(f"Error processing {filename}: {error}")
+            failed[filename] = str(error)
+    discard_uploads(failed)
+
+    images = []
+    for result, filename, created in stored:
+        if filename in failed:
+            result.update(status='error', error=f"Could not process image: {failed[filename]}")
+            continue
+        result.update(status='ok', filename=filename, url=upload_url(filename))
+        images.append((filename, processed.get(filename) or stored_image_columns(filename), created))
+    return results, images
+
+def insert_listing_images(cursor, image_table, key_column, listing_id, images, first_order=0):
+    """Insert image rows for a listing, in order, as one multi-row INSERT"""
+    now = datetime.now(timezone.utc)
+    # executemany rewrites a plain INSERT ... VALUES into a single
+    # multi-row statement, so this is one round trip however many images
+    cursor.executemany(f'''
+        INSERT INTO {image_table}
+        ({key_column}, image_path, display_order, variant_widths, blurhash, dominant_color, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ''', [
+        (listing_id, filename, first_order + i, *columns, now)
+        for i, (filename, columns, _) in enumerate(images)
+    ])
+
+def release_uploads(filenames):
+    """Delete uploads no image row references any more
+
+    Call after committing the transaction that removed the rows.
+    """
+    if not filenames:
+        return
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        for filename in set(filenames):
+            cursor.execute('''
+                SELECT EXISTS(SELECT 1 FROM food_experience_images WHERE image_path = %s)
+                    OR EXISTS(SELECT 1 FROM stay_images WHERE image_path = %s)
+                    OR EXISTS(SELECT 1 FROM users WHERE image = %s)
+            ''', (filename, filename, filename))
+            if cursor.fetchone()[0]:
+                continue
+            if delete_upload(filename, grace=UPLOAD_GRACE_SECONDS):
+                upload_index.discard(filename)
+                resize_cache.discard(filename)
+                print(f"Removed unreferenced upload: {filename}")
+    except Exception as e:
+        print(f"Error releasing uploads: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def load_image_metadata(filename):
+    """Metadata saved by processing an upload, or None if it isn't processed yet"""
+    return stored_metadata(storage, filename)
+
+def stored_image_columns(filename):
+    """image_columns() for a new image row, from the metadata saved by processing"""
+    return image_columns(load_image_metadata(filename))
+
+def parse_image_list(value):
+    """ImageRecords from an image_list_sql() column"""
+    images = []
+    for entry in value.split('\n') if value else ():
+        path, widths, blurhash, color = (entry.split('\t') + ['', '', ''])[:4]
+        if path:
+            images.append(ImageRecord(path, widths=parse_widths(widths), blurhash=blurhash or None, color=color or None))
+    return images
+
+def parse_first_image(value):
+    """(image_path, placeholder) from a first_image_sql() column"""
+    if not value:
+        return None, None
+    path, blurhash, color = (value.split('\t') + ['', ''])[:3]
+    return path, image_placeholder(blurhash, color)
+
+def image_placeholder(blurhash, color):
+    """Inline placeholder (BlurHash and dominant color) for an image, if computed"""
+    if not blurhash and not color:
+        return None
+    return {'blurhash': blurhash, 'color': color}
+
+def image_srcset(filename, widths):
+    return build_srcset(filename, widths, upload_url)
+
 # Food Experience endpoints
 @app.route('/api/host/food-experiences', methods=['POST'])
 @token_required
@@ -379,9 +814,11 @@ def create_food_experience(current_user):
                 
                 cursor.execute('''
                     INSERT INTO food_experience_images 
-                    (experience_id, image_path, created_at, display_order) 
-                    VALUES (%s, %s, %s, %s)
-                ''', (experience_id, filename, datetime.now(timezone.utc), index))
+                    (experience_id, image_path, created_at, display_order,
+                     variant_widths, blurhash, dominant_color) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ''', (experience_id, filename, datetime.now(timezone.utc), index,
+                      *stored_image_columns(filename)))
         
         conn.commit()
         
@@ -469,6 +906,8 @@ def update_host_food_experience(current_user, id):
                 print("Processing images:", image_urls)  # Debug print
                 
                 # Delete old images
+                cursor.execute('SELECT image_path FROM food_experience_images WHERE experience_id = %s', (id,))
+                replaced_images = [row['image_path'] for row in cursor.fetchall()]
                 cursor.execute('DELETE FROM food_experience_images WHERE experience_id = %s', (id,))
                 
                 # Insert new images
@@ -478,14 +917,16 @@ def update_host_food_experience(current_user, id):
                         print(f"Adding image {i}: {filename}")  # Debug print
                         cursor.execute("""
                             INSERT INTO food_experience_images 
-                            (experience_id, image_path, display_order) 
-                            VALUES (%s, %s, %s)
-                        """, (id, filename, i))
+                            (experience_id, image_path, display_order, variant_widths, blurhash, dominant_color) 
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                        """, (id, filename, i, *stored_image_columns(filename)))
             except Exception as e:
                 print("Error processing images:", str(e))
                 # Continue with the update even if image processing fails
 
         conn.commit()
+        if 'replaced_images' in locals():
+            release_uploads(replaced_images)
 
         # Fetch and return the updated experience
         cursor.execute("""
@@ -542,16 +983,11 @@ def update_host_food_experience(current_user, id):
         if 'conn' in locals():
             conn.close()
 
-def decimal_to_float(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    return obj
-
 @app.route('/api/host/food-experiences', methods=['GET'])
 @token_required
 def get_host_food_experiences(current_user):
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         query = """
@@ -580,28 +1016,13 @@ def get_host_food_experiences(current_user):
                     # Clean the path by removing any order numbers after ':'
                     clean_path = path.split(':')[0].strip()
                     if clean_path:
-                        full_path = os.path.join(UPLOAD_FOLDER, clean_path)
-                        if os.path.exists(full_path):
+                        if clean_path in upload_index:
                             valid_images.append({
                                 'url': get_full_url(f"/uploads/{clean_path}")
                             })
                 exp['images'] = valid_images
             else:
                 exp['images'] = []
-            
-            # Convert decimal values to float for JSON serialization
-            if 'price_per_person' in exp:
-                exp['price_per_person'] = float(exp['price_per_person'])
-            if 'latitude' in exp:
-                exp['latitude'] = float(exp['latitude']) if exp['latitude'] else 0
-            if 'longitude' in exp:
-                exp['longitude'] = float(exp['longitude']) if exp['longitude'] else 0
-            
-            # Convert datetime objects to strings
-            if 'created_at' in exp:
-                exp['created_at'] = exp['created_at'].isoformat()
-            if 'updated_at' in exp:
-                exp['updated_at'] = exp['updated_at'].isoformat()
         
         return jsonify(experiences)
         
@@ -662,13 +1083,8 @@ def delete_food_experience_image(current_user, id):
 
         conn.commit()
 
-        # Delete actual file
-        try:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting file: {e}")
+        # Delete the file unless another listing shares it
+        release_uploads([filename])
 
         return jsonify({'message': 'Image deleted successfully'})
 
@@ -766,9 +1182,11 @@ def create_stay(current_user):
                     filename = image_url.strip().split('/')[-1]
                     cursor.execute('''
                         INSERT INTO stay_images 
-                        (stay_id, image_path, created_at, display_order) 
-                        VALUES (%s, %s, %s, %s)
-                    ''', (stay_id, filename, datetime.now(timezone.utc), index))
+                        (stay_id, image_path, created_at, display_order,
+                         variant_widths, blurhash, dominant_color) 
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ''', (stay_id, filename, datetime.now(timezone.utc), index,
+                          *stored_image_columns(filename)))
 
         conn.commit()
         return jsonify({
@@ -795,7 +1213,7 @@ def create_stay(current_user):
 @token_required
 def get_host_stays(current_user):
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute('''
@@ -818,10 +1236,6 @@ def get_host_stays(current_user):
         
         # Process the results
         for stay in stays:
-            stay['created_at'] = stay['created_at'].isoformat()
-            stay['updated_at'] = stay['updated_at'].isoformat()
-            stay['price_per_night'] = float(stay['price_per_night'])
-            
             # Process image data
             if stay['image_data']:
                 image_list = []
@@ -869,6 +1283,9 @@ def update_stay(current_user, id):
         stay = cursor.fetchone()
         if not stay or stay['host_id'] != current_user['id']:
             return jsonify({'message': 'Stay not found or unauthorized'}), 404
+        # End the transaction the check opened rather than hold its read
+        # view through the image processing below
+        conn.rollback()
 
         data = request.form.to_dict()
         
@@ -909,51 +1326,68 @@ def update_stay(current_user, id):
             float(data['longitude']),
             id
         )
-        cursor.execute(update_query, values)
-
-        # Update amenities
-        if 'amenities' in data:
-            amenities = json.loads(data['amenities'])
-            cursor.execute('DELETE FROM stay_amenities WHERE stay_id = %s', (id,))
-            for amenity_id in amenities:
-                cursor.execute(
-                    'INSERT INTO stay_amenities (stay_id, amenity_id) VALUES (%s, %s)',
-                    (id, amenity_id)
-                )
 
-        # Update availability
-        if 'availability' in data:
-            availability = json.loads(data['availability'])
-            cursor.execute('DELETE FROM stay_availability WHERE stay_id = %s', (id,))
-            for avail in availability:
-                cursor.execute('''
-                    INSERT INTO stay_availability 
-                    (stay_id, date, is_available, price_override, created_at, updated_at) 
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                ''', (
-                    id, 
-                    avail['date'],
-                    avail['is_available'],
-                    avail.get('price_override'),
-                    datetime.now(timezone.utc),
-                    datetime.now(timezone.utc)
-                ))
-
-        # Update images if provided
+        # Process new images before the transaction, so a retry doesn't redo it
+        images = None
+        new_images = []
         if 'images' in request.files:
-            images = request.files.getlist('images')
-            cursor.execute('DELETE FROM stay_images WHERE stay_id = %s', (id,))
-            for i, image in enumerate(images):
-                if image and allowed_file(image.filename):
-                    filename = secure_filename(f"{id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}.jpg")
-                    image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            try:
+                _, images = process_image_batch(request.files.getlist('images'))
+            except QueueFull:
+                response = jsonify({'message': 'Image processing queue is full, please retry shortly'})
+                response.headers['Retry-After'] = '5'
+                return response, 503
+            new_images = [filename for filename, _, created in images if created]
+
+        # Everything the transaction writes, run again on a lock conflict
+        def save():
+            cursor.execute(update_query, values)
+
+            # Update amenities
+            if 'amenities' in data:
+                amenities = json.loads(data['amenities'])
+                cursor.execute('DELETE FROM stay_amenities WHERE stay_id = %s', (id,))
+                for amenity_id in amenities:
+                    cursor.execute(
+                        'INSERT INTO stay_amenities (stay_id, amenity_id) VALUES (%s, %s)',
+                        (id, amenity_id)
+                    )
+
+            # Update availability
+            if 'availability' in data:
+                availability = json.loads(data['availability'])
+                cursor.execute('DELETE FROM stay_availability WHERE stay_id = %s', (id,))
+                for avail in availability:
                     cursor.execute('''
-                        INSERT INTO stay_images 
-                        (stay_id, image_path, display_order, created_at) 
-                        VALUES (%s, %s, %s, NOW())
-                    ''', (id, filename, i))
+                        INSERT INTO stay_availability 
+                        (stay_id, date, is_available, price_override, created_at, updated_at) 
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    ''', (
+                        id, 
+                        avail['date'],
+                        avail['is_available'],
+                        avail.get('price_override'),
+                        datetime.now(timezone.utc),
+                        datetime.now(timezone.utc)
+                    ))
+
+            # Update images if provided
+            replaced_images = []
+            if images is not None:
+                cursor.execute('SELECT image_path FROM stay_images WHERE stay_id = %s', (id,))
+                replaced_images = [row['image_path'] for row in cursor.fetchall()]
+                cursor.execute('DELETE FROM stay_images WHERE stay_id = %s', (id,))
+                if images:
+                    insert_listing_images(cursor, 'stay_images', 'stay_id', id, images)
+            return replaced_images
 
-        conn.commit()
+        try:
+            replaced_images = transactions.run(conn, save)
+        except Exception:
+            # Rolled back, so no row references the new images
+            discard_uploads(new_images)
+            raise
+        release_uploads(replaced_images)
 
         # Fetch and return the updated stay
         cursor.execute('''
@@ -985,10 +1419,6 @@ def update_stay(current_user, id):
         
         # Process the updated stay data
         if updated_stay:
-            updated_stay['price_per_night'] = float(updated_stay['price_per_night'])
-            updated_stay['created_at'] = updated_stay['created_at'].isoformat()
-            updated_stay['updated_at'] = updated_stay['updated_at'].isoformat()
-            
             # Process images
             images = []
             if updated_stay['image_data']:
@@ -1024,6 +1454,11 @@ def update_stay(current_user, id):
             'stay': updated_stay
         }), 200
 
+    except TransactionConflict:
+        response = jsonify({'message': 'The stay is being changed elsewhere, please retry shortly'})
+        response.headers['Retry-After'] = str(transactions.retry_after)
+        return response, 503
+
     except Exception as e:
         print("Error updating stay:", str(e))
         if 'conn' in locals():
@@ -1040,7 +1475,7 @@ def update_stay(current_user, id):
 @app.route('/api/amenities', methods=['GET'])
 def get_amenities():
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         # Get amenities by type (stay, food, or both)
@@ -1099,27 +1534,34 @@ def update_stay_availability(current_user, id):
         if not stay or stay['host_id'] != current_user['id']:
             return jsonify({'message': 'Stay not found or unauthorized'}), 404
             
-        # Update availability
-        for date_info in dates:
-            cursor.execute('''
-                INSERT INTO stay_availability 
-                (stay_id, date, is_available, price_override, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                is_available = VALUES(is_available),
-                price_override = VALUES(price_override),
-                updated_at = VALUES(updated_at)
-            ''', (
-                id, 
-                date_info['date'],
-                date_info['is_available'],
-                date_info.get('price_override'),
-                datetime.now(timezone.utc),
-                datetime.now(timezone.utc)
-            ))
-            
-        conn.commit()
+        # Update availability, in date order so concurrent saves lock rows
+        # in the same order and wait for each other rather than deadlock
+        def save():
+            for date_info in sorted(dates, key=lambda date_info: date_info['date']):
+                cursor.execute('''
+                    INSERT INTO stay_availability 
+                    (stay_id, date, is_available, price_override, created_at, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                    is_available = VALUES(is_available),
+                    price_override = VALUES(price_override),
+                    updated_at = VALUES(updated_at)
+                ''', (
+                    id, 
+                    date_info['date'],
+                    date_info['is_available'],
+                    date_info.get('price_override'),
+                    datetime.now(timezone.utc),
+                    datetime.now(timezone.utc)
+                ))
+
+        transactions.run(conn, save)
         return jsonify({'message': 'Availability updated successfully'})
+
+    except TransactionConflict:
+        response = jsonify({'message': 'Availability is being changed elsewhere, please retry shortly'})
+        response.headers['Retry-After'] = str(transactions.retry_after)
+        return response, 503
         
     except Exception as e:
         print("Error updating availability:", str(e))
@@ -1136,30 +1578,24 @@ def update_stay_availability(current_user, id):
         if 'conn' in locals():
             conn.close()
 
-def optimize_image(image_file):
-    try:
-        img = Image.open(image_file)
-        
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        
-        # Calculate new dimensions while maintaining aspect ratio
-        max_size = 1920
-        ratio = min(max_size/float(img.size[0]), max_size/float(img.size[1]))
-        if ratio < 1:
-            new_size = tuple([int(x*ratio) for x in img.size])
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-        
-        # Save optimized image
-        output = BytesIO()
-        img.save(output, format='JPEG', quality=85, optimize=True)
-        output.seek(0)
-        return output
-        
-    except Exception as e:
-        print(f"Error optimizing image: {e}")
-        return image_file
+def uploaded_response(filename):
+    """202 response for a stored upload, with its processing status"""
+    job = image_worker.status(filename) or {'status': 'done'}
+    
+    # Return absolute URL in production
+    url = get_full_url(f"/uploads/{filename}")
+    
+    return jsonify({
+        'url': url,
+        'status': job['status'],
+        'status_url': get_full_url(f"/api/upload/status/{filename}"),
+        'message': 'File uploaded successfully'
+    }), 202
+
+def queue_full_response():
+    response = jsonify({'error': 'Image processing queue is full, please retry shortly'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
 @app.route('/api/upload', methods=['POST'])
 @token_required
@@ -1179,32 +1615,15 @@ def upload_file(current_user):
         
     if file and allowed_file(file.filename):
         try:
-            # Create uploads directory if it doesn't exist
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            
-            # Optimize image
-            optimized = optimize_image(file)
-            
-            # Generate filename using title and original extension
-            safe_title = secure_filename(title) if title else 'untitled'
-            timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
-            original_ext = os.path.splitext(file.filename)[1]
-            filename = f"{safe_title}_{timestamp}{original_ext}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            print(f"Saving file as: {filename}")
-            
-            # Save optimized image
-            with open(filepath, 'wb') as f:
-                f.write(optimized.getvalue() if isinstance(optimized, BytesIO) else optimized.read())
+            # Store the raw upload under its content hash; it is served as-is
+            # until the worker swaps in the optimized version under the same name
+            try:
+                filename = save_upload(file.stream, file.filename)
+            except QueueFull:
+                return queue_full_response()
             
-            # Return absolute URL in production
-            url = get_full_url(f"/uploads/{filename}")
-            
-            return jsonify({
-                'url': url,
-                'message': 'File uploaded successfully'
-            })
+            print(f"Saved file as: {filename}")
+            return uploaded_response(filename)
             
         except Exception as e:
             print(f"Error during upload: {str(e)}")
@@ -1216,40 +1635,348 @@ def upload_file(current_user):
         print(f"Invalid file type: {file.filename}")
         return jsonify({'error': f'File type not allowed. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
 
+@app.route('/api/upload/status/<path:filename>', methods=['GET'])
+@token_required
+def upload_status(current_user, filename):
+    job = image_worker.status(filename)
+    if job:
+        return jsonify(job)
+    
+    # Jobs are tracked per process; an unknown job whose file exists has
+    # either finished long ago or was handled by another worker
+    if upload_exists(secure_filename(filename)):
+        return jsonify({'id': filename, 'status': 'done'})
+    return jsonify({'error': 'Upload not found'}), 404
+
+# Resumable uploads, following the tus 1.0 core protocol: POST creates a
+# session, HEAD reports its offset and PATCH appends a chunk at that
+# offset. POST .../complete verifies the SHA-256 of the whole file and
+# hands it to the same processing as /api/upload.
+TUS_VERSION = '1.0.0'
+
+def tus_response(body, status, session=None):
+    response = jsonify(body) if body is not None else app.response_class(status=status)
+    response.status_code = status
+    response.headers['Tus-Resumable'] = TUS_VERSION
+    response.headers['Cache-Control'] = 'no-store'
+    if session:
+        response.headers['Upload-Offset'] = str(session['offset'])
+        response.headers['Upload-Length'] = str(session['length'])
+        response.headers['Upload-Expires'] = http_date(session['expires_at'])
+    return response
+
+def upload_error_response(error):
+    return tus_response({'error': str(error)}, error.status)
+
+@app.route('/api/upload/resumable', methods=['POST'])
+@token_required
+def create_resumable_upload(current_user):
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return tus_response({'error': 'Upload-Length header is required'}, 400)
+
+    metadata = parse_upload_metadata(request.headers.get('Upload-Metadata', ''))
+    original_name = metadata.get('filename', '')
+    if not allowed_file(original_name):
+        return tus_response({'error': f'File type not allowed. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}, 400)
+
+    try:
+        upload_sessions.expire()
+        session = upload_sessions.create(current_user['id'], length, original_name)
+    except UploadError as e:
+        return upload_error_response(e)
+
+    response = tus_response({'id': session['id']}, 201, session)
+    response.headers['Location'] = get_full_url(f"/api/upload/resumable/{session['id']}")
+    return response
+
+@app.route('/api/upload/resumable/<session_id>', methods=['HEAD'])
+@token_required
+def resumable_upload_offset(current_user, session_id):
+    try:
+        session = upload_sessions.status(session_id, current_user['id'])
+    except UploadError as e:
+        return upload_error_response(e)
+    return tus_response(None, 200, session)
+
+@app.route('/api/upload/resumable/<session_id>', methods=['PATCH'])
+@token_required
+def append_resumable_upload(current_user, session_id):
+    if request.mimetype != 'application/offset+octet-stream':
+        return tus_response({'error': 'Content-Type must be application/offset+octet-stream'}, 415)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return tus_response({'error': 'Upload-Offset header is required'}, 400)
+
+    try:
+        session = upload_sessions.status(session_id, current_user['id'])
+        if request.content_length and offset + request.content_length > session['length']:
+            return tus_response({'error': 'Chunk extends past Upload-Length'}, 413, session)
+        upload_sessions.append(session_id, current_user['id'], offset, request.stream)
+        session = upload_sessions.status(session_id, current_user['id'])
+    except UploadError as e:
+        return upload_error_response(e)
+    return tus_response(None, 204, session)
+
+@app.route('/api/upload/resumable/<session_id>/complete', methods=['POST'])
+@token_required
+def complete_resumable_upload(current_user, session_id):
+    data = request.get_json(silent=True) or {}
+    checksum = str(data.get('sha256', '')).strip()
+    if len(checksum) != 64:
+        return tus_response({'error': 'sha256 of the complete file is required'}, 400)
+
+    try:
+        stream, session = upload_sessions.open_complete(session_id, current_user['id'])
+    except UploadError as e:
+        return upload_error_response(e)
+
+    try:
+        with stream:
+            filename = save_upload(stream, session['filename'], checksum)
+    except ChecksumMismatch as e:
+        # Some chunk was corrupted on the way; the client has to start over
+        print(f"Resumable upload {session_id} failed verification: {e}")
+        upload_sessions.delete(session_id)
+        return tus_response({'error': 'Checksum mismatch, upload discarded'}, 422)
+    except QueueFull:
+        # Keep the session so the client can retry completing it
+        return queue_full_response()
+    except Exception as e:
+        print(f"Error completing upload {session_id}: {str(e)}")
+        return tus_response({'error': 'Error uploading file', 'message': str(e)}, 500)
+
+    upload_sessions.delete(session_id)
+    print(f"Saved resumable upload {session_id} as: {filename}")
+    return uploaded_response(filename)
+
+@app.route('/api/upload/resumable/<session_id>', methods=['DELETE'])
+@token_required
+def cancel_resumable_upload(current_user, session_id):
+    try:
+        upload_sessions.status(session_id, current_user['id'])
+    except UploadError as e:
+        return upload_error_response(e)
+    upload_sessions.delete(session_id)
+    return tus_response(None, 204)
+
+# Direct uploads: the client hashes the file, asks for a presigned PUT,
+# sends the bytes straight to storage, then reports completion so the
+# upload is processed like one made through /api/upload.
+@app.route('/api/upload/presign', methods=['POST'])
+@token_required
+def presign_upload(current_user):
+    data = request.get_json(silent=True) or {}
+    original_name = str(data.get('filename', ''))
+    sha256 = str(data.get('sha256', '')).strip().lower()
+    content_type = str(data.get('content_type') or 'application/octet-stream')
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+
+    if not allowed_file(original_name):
+        return jsonify({'error': f'File type not allowed. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        return jsonify({'error': 'sha256 of the file is required'}), 400
+    if size <= 0 or size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': f"size must be between 1 and {app.config['MAX_CONTENT_LENGTH']} bytes"}), 400
+
+    filename = blob_filename(sha256, os.path.splitext(original_name)[1])
+    complete_url = get_full_url('/api/upload/presign/complete')
+    key = storage_path(filename)
+    if storage.exists(key):
+        # Identical content is already stored; nothing to send
+        return jsonify({'name': filename, 'exists': True, 'complete_url': complete_url})
+
+    upload_url, headers = storage.presign_put(key, content_type, sha256, size, PRESIGN_EXPIRES_SECONDS)
+    return jsonify({
+        'name': filename,
+        'exists': False,
+        'upload_url': get_full_url(upload_url),
+        'method': 'PUT',
+        'headers': headers,
+        'expires_in': PRESIGN_EXPIRES_SECONDS,
+        'complete_url': complete_url
+    })
+
+@app.route('/api/upload/presign/complete', methods=['POST'])
+@token_required
+def complete_presigned_upload(current_user):
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('name', ''))
+    if not blob_name(filename) or not allowed_file(filename):
+        return jsonify({'error': 'Invalid upload name'}), 400
+    if not upload_exists(filename):
+        return jsonify({'error': 'Upload not found in storage'}), 409
+
+    upload_index.add(filename)
+    # Content uploaded before was processed then; only queue new content
+    if image_worker.status(filename) is None and load_image_metadata(filename) is None:
+        try:
+            queue_image_processing(filename)
+        except QueueFull:
+            return queue_full_response()
+    return uploaded_response(filename)
+
+@app.route('/api/storage/<path:key>', methods=['PUT'])
+def put_presigned_upload(key):
+    """Target of presigned PUTs with local storage; the signature is the auth"""
+    if not storage.is_local:
+        return jsonify({'error': 'Not found'}), 404
+    signed = storage.verify_put(key, request.args)
+    if not signed:
+        return jsonify({'error': 'Invalid or expired upload URL'}), 403
+    sha256, size = signed
+    if request.content_length != size:
+        return jsonify({'error': f'Content-Length must be {size}'}), 400
+
+    name = blob_name(key.rsplit('/', 1)[-1])
+    if not name or storage_path(name) != key:
+        return jsonify({'error': 'Invalid upload URL'}), 403
+    try:
+        store_blob(app.config['UPLOAD_FOLDER'], request.stream, os.path.splitext(name)[1], expected=sha256)
+    except ChecksumMismatch:
+        return jsonify({'error': 'Body does not match the signed sha256'}), 400
+    return jsonify({'message': 'Upload stored'}), 200
+
+@app.route('/uploads/<int:width>x<int:height>/<filename>')
+def resized_file(width, height, filename):
+    if (width, height) not in RESIZE_SIZES:
+        return jsonify({'error': 'Size not available'}), 404
+    
+    name = secure_filename(filename)
+    if storage.is_local:
+        source, load = upload_path(name), None
+        if not os.path.exists(source):
+            return jsonify({'error': 'File not found'}), 404
+    else:
+        # Only fetched from storage when the size isn't cached on this node
+        source, load = name, lambda: BytesIO(read_upload(name))
+    
+    try:
+        path = resize_cache.get(source, width, height, load=load)
+        return file_server.send(app.config['UPLOAD_FOLDER'], os.path.relpath(path, app.config['UPLOAD_FOLDER']), mimetype='image/jpeg')
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        print(f"Error resizing {filename} to {width}x{height}: {str(e)}")
+        return jsonify({'error': 'Error serving file'}), 500
+
+# Uploads whose processing is known to have finished; it never un-finishes
+processed_uploads = set()
+
+def upload_processed(name):
+    """Whether name has been processed, i.e. its optimized bytes are in place for good
+
+    Decided from the metadata processing saves, not this process's job
+    status, which knows nothing of jobs run by other workers or before a
+    restart.
+    """
+    if name in processed_uploads:
+        return True
+    if load_image_metadata(name) is None:
+        return False
+    processed_uploads.add(name)
+    return True
+
+def cache_upload(response, filename):
+    """Let clients cache content-addressed uploads forever, once processed"""
+    name = blob_name(filename)
+    if not name:
+        return response
+    if not upload_processed(name):
+        # The optimized file hasn't been swapped in yet (or processing failed)
+        response.cache_control.no_cache = True
+        return response
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
 # Add this to serve uploaded files
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     try:
-        # First try to serve from the uploads directory
-        if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
-            return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-        
-        # If not found, try to serve default images from a static directory
-        static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-        if filename in ['default-avatar.png', 'default-food.jpg', 'jollof.jpg', 'mountain.jpg']:
-            if os.path.exists(os.path.join(static_dir, filename)):
-                return send_from_directory(static_dir, filename)
+        upload_folder = app.config['UPLOAD_FOLDER']
+        
+        # Serve AVIF/WebP variants to browsers that accept them
+        variant = negotiate(filename, request.headers.get('Accept'), upload_exists)
+        if variant:
+            path, mimetype = variant
+        elif filename in upload_index:
+            path, mimetype = filename, None
+        else:
+            path = None
+        
+        # Flask only resolves the file; in accel mode nginx sends it, and
+        # remote storage serves it to the client directly
+        if path and not storage.is_local:
+            response = redirect(storage.url(storage_path(path)))
+            response.vary.add('Accept')
+            # Presigned URLs expire; only a stable public URL may be cached
+            return cache_upload(response, filename) if storage.public_url else response
+        if path:
+            response = file_server.send(upload_folder, storage_path(path), mimetype=mimetype)
+            response.vary.add('Accept')
+            return cache_upload(response, filename)
+        
+        # If not found, try to serve default images from the static directory
+        if filename in DEFAULT_IMAGES:
+            return file_server.send(STATIC_FOLDER, filename)
         
         # If neither found, return 404
         return jsonify({'error': 'File not found'}), 404
+    except NotFound:
+        return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         print(f"Error serving file {filename}: {str(e)}")
         return jsonify({'error': 'Error serving file'}), 500
 
+# Response shapers for the listing endpoints, compiled once at import.
+# Handlers build slot records from tuple rows and hand them to these.
+shape_food_experience_list = compile_shaper({
+    **columns_spec(FOOD_EXPERIENCE_COLUMNS),
+    'location_name': "r.location_name or 'Location not specified'",
+    'cuisine_type': "r.cuisine_type or 'Various'",
+    'description': "r.description or 'No description available'",
+    'images': "[{'url': upload_url(image.path), 'srcset': image_srcset(image.path, image.widths), 'placeholder': image_placeholder(image.blurhash, image.color)} for image in r.images]",
+    'host': {
+        'name': "r.host.name or 'Unknown Host'",
+        'rating': 'r.host.rating or 0',
+        'reviews': 'r.host.reviews or 0'
+    }
+}, {'upload_url': upload_url, 'image_srcset': image_srcset, 'image_placeholder': image_placeholder},
+   name='shape_food_experience_list')
+
+shape_stay_list = compile_shaper({
+    **columns_spec(STAY_COLUMNS),
+    'details': 'r.details',
+    'host': 'r.host',
+    'review_count': 'r.review_count',
+    'images': '[image.path for image in r.images]',
+    'image_srcsets': '[image_srcset(image.path, image.widths) for image in r.images]',
+    'image_placeholders': '[image_placeholder(image.blurhash, image.color) for image in r.images]',
+    'amenities': 'r.amenities'
+}, {'image_srcset': image_srcset, 'image_placeholder': image_placeholder}, name='shape_stay_list')
+
 @app.route('/api/food-experiences', methods=['GET'])
+@deadlines.limit(2000)
 def get_food_experiences():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(read_only=True)
         
         # Base query
-        query = """
-            SELECT 
-                fe.*,
+        query = f"""
+            SELECT {GROUP_CONCAT_HINT}
+                {select_columns('fe', FOOD_EXPERIENCE_COLUMNS)},
                 u.name as host_name,
                 COALESCE(AVG(r.rating), 0) as rating,
                 COUNT(DISTINCT r.id) as reviews_count,
-                GROUP_CONCAT(DISTINCT fei.image_path) as image_paths
+                {image_list_sql('fei')} as image_paths
             FROM food_experiences fe
             LEFT JOIN users u ON fe.host_id = u.id
             LEFT JOIN reviews r ON fe.id = r.experience_id
@@ -1275,46 +2002,17 @@ def get_food_experiences():
         elif sort == 'price_desc':
             query += " ORDER BY fe.price_per_person DESC"
 
-        cursor.execute(query, params)
-        experiences = cursor.fetchall()
-        
         # Process the results
-        for exp in experiences:
-            # Handle images
-            image_paths = exp.pop('image_paths', '')
-            
-            if image_paths and image_paths.strip():
-                # Only include images that exist in the uploads folder
-                valid_images = []
-                for path in image_paths.split(','):
-                    # Clean the path by removing any order numbers after ':'
-                    clean_path = path.split(':')[0].strip()
-                    if clean_path:
-                        full_path = os.path.join(UPLOAD_FOLDER, clean_path)
-                        if os.path.exists(full_path):
-                            valid_images.append({
-                                'url': get_full_url(f"/uploads/{clean_path}")
-                            })
-                exp['images'] = valid_images
-            else:
-                exp['images'] = []  # Empty array if no images
+        experiences = []
+        for row in statements.fetchall(conn, query, params):
+            host_name, rating, reviews_count, image_paths = row[len(FOOD_EXPERIENCE_COLUMNS):]
+            exp = FoodExperience.from_row(row)
+            exp.host = Host(host_name, None, rating, reviews_count)
             
-            # Format host info
-            exp['host'] = {
-                'name': exp.pop('host_name', 'Unknown Host'),
-                'rating': float(exp.pop('rating', 0)),
-                'reviews': int(exp.pop('reviews_count', 0))
-            }
-            
-            # Convert decimal values to float/int
-            exp['price_per_person'] = float(exp['price_per_person'])
-            exp['latitude'] = float(exp['latitude']) if exp['latitude'] else 0
-            exp['longitude'] = float(exp['longitude']) if exp['longitude'] else 0
+            # Only include images that exist in the uploads folder
+            exp.images = [image for image in parse_image_list(image_paths) if image.path in upload_index]
             
-            # Ensure all required fields have default values
-            exp['location_name'] = exp['location_name'] or 'Location not specified'
-            exp['cuisine_type'] = exp['cuisine_type'] or 'Various'
-            exp['description'] = exp['description'] or 'No description available'
+            experiences.append(shape_food_experience_list(exp))
         
         return jsonify(experiences)
         
@@ -1323,44 +2021,11 @@ def get_food_experiences():
         return jsonify({'error': 'Failed to fetch food experiences'}), 500
         
     finally:
-        if 'cursor' in locals():
-            cursor.close()
         if 'conn' in locals():
             conn.close()
 
-@lru_cache(maxsize=100)
-def get_optimized_image_path(original_path):
-    """Create and cache optimized thumbnails for images"""
-    try:
-        if not original_path:
-            return None
-            
-        # Check if original image exists
-        original_full_path = os.path.join(UPLOAD_FOLDER, original_path)
-        if not os.path.exists(original_full_path):
-            return None
-            
-        # Create thumbnails directory if it doesn't exist
-        thumb_dir = os.path.join(UPLOAD_FOLDER, 'thumbnails')
-        os.makedirs(thumb_dir, exist_ok=True)
-        
-        # Generate thumbnail path
-        filename = os.path.basename(original_path)
-        thumb_path = os.path.join(thumb_dir, f'thumb_{filename}')
-        
-        # If thumbnail doesn't exist, create it
-        if not os.path.exists(thumb_path):
-            with Image.open(original_full_path) as img:
-                img.thumbnail(THUMBNAIL_SIZE)
-                img.save(thumb_path, 'JPEG', quality=85, optimize=True)
-        
-        return get_full_url(f"uploads/thumbnails/thumb_{filename}")
-        
-    except Exception as e:
-        print(f"Error optimizing image {original_path}: {str(e)}")
-        return None
-
 @app.route('/api/stays', methods=['GET'])
+@deadlines.limit(2000)
 def get_stays():
     try:
         # Get query parameters
@@ -1372,25 +2037,23 @@ def get_stays():
         max_price = request.args.get('max_price', 1000, type=float)
         min_guests = request.args.get('min_guests', 1, type=int)
         amenities = request.args.getlist('amenities')
+        if lat and lng and not 0 < radius <= MAX_RADIUS_KM:
+            return jsonify({'error': f'radius must be between 0 and {MAX_RADIUS_KM:g} km'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(read_only=True)
 
         # Check if reviews table exists
-        cursor.execute("""
+        reviews_exist = statements.fetchone(conn, """
             SELECT COUNT(*)
             FROM information_schema.tables 
             WHERE table_schema = 'platform2025' 
             AND table_name = 'reviews'
-        """)
-        reviews_exist = cursor.fetchone()['COUNT(*)'] > 0
+        """)[0] > 0
 
         # Base query
-        query = """
+        query = f"""
             SELECT 
-                s.*,
-                u.name as host_name,
-                '' as host_image,
+                {select_columns('s', STAY_COLUMNS)},
                 JSON_OBJECT(
                     'bedrooms', s.bedrooms,
                     'bathrooms', s.bedrooms,  /* Use bedrooms as fallback for bathrooms */
@@ -1414,15 +2077,14 @@ def get_stays():
                 0 as review_count
             """
 
-        # Add distance calculation if location is provided
+        # Add distance calculation if location is provided; its placeholders
+        # come first in the statement, so its parameters go first too
+        params = []
         if lat and lng:
             query += f""",
-                (6371 * acos(
-                    cos(radians({lat})) * cos(radians(latitude)) *
-                    cos(radians(longitude) - radians({lng})) +
-                    sin(radians({lat})) * sin(radians(latitude))
-                )) as distance
+                {DISTANCE_SQL} as distance
             """
+            params.extend([lat, lng, lat])
 
         query += """
             FROM stays s
@@ -1445,7 +2107,7 @@ def get_stays():
             AND s.max_guests >= %s
         """
 
-        params = [min_price, max_price, min_guests]
+        params.extend([min_price, max_price, min_guests])
 
         if amenities:
             query += f" AND a.name IN ({','.join(['%s'] * len(amenities))})"
@@ -1455,7 +2117,8 @@ def get_stays():
 
         # Add distance filter if location is provided
         if lat and lng:
-            query += f" HAVING distance <= {radius}"
+            query += " HAVING distance <= %s"
+            params.append(radius)
 
         # Add sorting
         if sort_by == 'price_asc':
@@ -1469,38 +2132,36 @@ def get_stays():
         else:
             query += " ORDER BY s.created_at DESC"
 
-        cursor.execute(query, params)
-        stays = cursor.fetchall()
-
         # Process the results
-        for stay in stays:
-            # Convert decimal values to float for JSON serialization
-            stay['price_per_night'] = float(stay['price_per_night'])
-            stay['created_at'] = stay['created_at'].isoformat()
-            stay['updated_at'] = stay['updated_at'].isoformat()
-            stay['details'] = json.loads(stay['details'])
-            stay['host'] = json.loads(stay['host_data'])
-            del stay['host_data']  # Clean up temporary field
-            del stay['host_name']  # Clean up redundant field
-            del stay['host_image']  # Clean up redundant field
-
-            # Fetch images
-            cursor.execute("""
-                SELECT image_path 
-                FROM stay_images 
-                WHERE stay_id = %s 
-                ORDER BY display_order
-            """, (stay['id'],))
-            stay['images'] = [row['image_path'] for row in cursor.fetchall()]
-
-            # Fetch amenities
-            cursor.execute("""
-                SELECT a.name, a.category
-                FROM amenities a
-                JOIN stay_amenities sa ON a.id = sa.amenity_id
-                WHERE sa.stay_id = %s
-            """, (stay['id'],))
-            stay['amenities'] = cursor.fetchall()
+        found = []
+        for row in statements.fetchall(conn, query, params):
+            details, host_data, review_count, *distance = row[len(STAY_COLUMNS):]
+            stay = Stay.from_row(row)
+            # JSON_OBJECT columns are already encoded, embed them as-is
+            stay.details = raw_json(details)
+            stay.host = raw_json(host_data)
+            stay.review_count = review_count
+            if distance:
+                stay.distance, = distance
+            found.append(stay)
+
+        # Fetch images and amenities for all stays at once
+        by_id = {stay.id: stay for stay in found}
+        if by_id:
+            ids = list(by_id)
+            for stay_id, path, widths, blurhash, color in statements.fetchall(conn, stay_images_sql(len(ids)), ids):
+                by_id[stay_id].images.append(
+                    ImageRecord(path, widths=parse_widths(widths), blurhash=blurhash, color=color)
+                )
+            for stay_id, name, category in statements.fetchall(conn, stay_amenities_sql(len(ids)), ids):
+                by_id[stay_id].amenities.append({'name': name, 'category': category})
+
+        stays = []
+        for stay in found:
+            shaped = shape_stay_list(stay)
+            if stay.distance is not None:
+                shaped['distance'] = stay.distance
+            stays.append(shaped)
 
         return jsonify(stays)
 
@@ -1508,42 +2169,44 @@ def get_stays():
         print("Error fetching stays:", str(e))
         return jsonify({'error': 'Failed to fetch stays'}), 500
     finally:
-        if 'cursor' in locals():
-            cursor.close()
         if 'conn' in locals():
             conn.close()
 
 @app.route('/api/food-experiences/<int:id>', methods=['GET'])
+@deadlines.limit(1000)
 def get_food_experience(id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(read_only=True)
         
         # Get food experience details
-        cursor.execute("""
-            SELECT 
+        experience = statements.fetchone(conn, f"""
+            SELECT {GROUP_CONCAT_HINT}
                 fe.*,
                 u.name as host_name,
                 u.image as host_image,
                 COALESCE(AVG(r.rating), 0) as rating,
                 COUNT(DISTINCT r.id) as reviews_count,
-                GROUP_CONCAT(DISTINCT fei.image_path) as image_paths
+                {image_list_sql('fei')} as image_paths
             FROM food_experiences fe
             LEFT JOIN users u ON fe.host_id = u.id
             LEFT JOIN reviews r ON fe.id = r.experience_id
             LEFT JOIN food_experience_images fei ON fe.id = fei.experience_id
             WHERE fe.id = %s AND fe.status = 'published'
             GROUP BY fe.id
-        """, (id,))
-        
-        experience = cursor.fetchone()
+        """, (id,), dictionary=True)
         
         if not experience:
             return jsonify({'message': 'Experience not found'}), 404
             
         # Handle image paths
-        image_paths = experience['image_paths'].split(',') if experience['image_paths'] else []
-        images = [{'url': get_full_url(f"/uploads/{img}"} for img in image_paths if img]
+        images = [
+            {
+                'url': get_full_url(f"/uploads/{image.path}"),
+                'srcset': image_srcset(image.path, image.widths),
+                'placeholder': image_placeholder(image.blurhash, image.color)
+            }
+            for image in parse_image_list(experience['image_paths'])
+        ]
         
         # Format the response
         response = {
@@ -1551,13 +2214,13 @@ def get_food_experience(id):
             'title': experience['title'],
             'description': experience['description'],
             'menu_description': experience['menu_description'],
-            'price_per_person': float(experience['price_per_person']),
+            'price_per_person': experience['price_per_person'],
             'cuisine_type': experience['cuisine_type'],
             'images': images,
             'host': {
                 'name': experience['host_name'],
                 'image': get_full_url(f"/uploads/{experience['host_image']}") if experience['host_image'] else '/images/jollof.jpg',
-                'rating': float(experience['rating']),
+                'rating': experience['rating'],
                 'reviews': experience['reviews_count']
             },
             'details': {
@@ -1575,11 +2238,15 @@ def get_food_experience(id):
         print("Error fetching food experience:", str(e))
         return jsonify({'message': 'Internal server error'}), 500
 
+    finally:
+        if 'conn' in locals():
+            conn.close()
+
 @app.route('/api/host/food-experiences/<int:id>', methods=['GET'])
 @token_required
 def get_host_food_experience_by_id(current_user, id):
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -1625,18 +2292,24 @@ def get_host_food_experience_by_id(current_user, id):
         print("Error fetching host food experience:", str(e))
         return jsonify({'message': 'Internal server error'}), 500
 
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
 @app.route('/api/stays', methods=['GET'])
 def get_published_stays():
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         # Get all published stays with their first image and host info
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT 
                 s.*,
                 u.name as host_name,
-                MIN(si.image_path) as image_path,
+                {first_image_sql('si')} as image_path,
                 GROUP_CONCAT(DISTINCT sa.amenity_id) as amenities
             FROM stays s
             JOIN users u ON s.host_id = u.id
@@ -1651,13 +2324,10 @@ def get_published_stays():
         
         # Process the results
         for stay in stays:
-            stay['price_per_night'] = float(stay['price_per_night'])
-            stay['created_at'] = stay['created_at'].isoformat()
-            stay['updated_at'] = stay['updated_at'].isoformat()
-            
             # Format image URL
-            if stay['image_path']:
-                stay['image'] = get_full_url(f"/uploads/{stay['image_path']}")
+            image_path, stay['image_placeholder'] = parse_first_image(stay['image_path'])
+            if image_path:
+                stay['image'] = get_full_url(f"/uploads/{image_path}")
             else:
                 stay['image'] = None
                 
@@ -1701,17 +2371,18 @@ def get_published_stays():
 @app.route('/api/featured-food', methods=['GET'])
 def get_featured_food():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(read_only=True)
+        cursor = conn.cursor(named_tuple=True)
         
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
-                fe.*,
+                fe.id, fe.title, fe.description, fe.price_per_person,
+                fe.cuisine_type, fe.city, fe.state,
                 u.name as host_name,
                 u.image as host_image,
                 COALESCE(AVG(r.rating), 0) as rating,
                 COUNT(DISTINCT r.id) as reviews_count,
-                MIN(fei.image_path) as first_image
+                {first_image_sql('fei')} as first_image
             FROM food_experiences fe
             LEFT JOIN users u ON fe.host_id = u.id
             LEFT JOIN reviews r ON fe.id = r.experience_id
@@ -1728,22 +2399,24 @@ def get_featured_food():
         response = []
         for exp in experiences:
             # Get the first image for the card
-            image_url = get_full_url(f"/uploads/{exp['first_image']}") if exp['first_image'] else '/default-food.jpg'
+            first_image, placeholder = parse_first_image(exp.first_image)
+            image_url = get_full_url(f"/uploads/{first_image}") if first_image else '/default-food.jpg'
             
             response.append({
-                'id': exp['id'],
-                'title': exp['title'],
-                'description': exp['description'],
-                'price_per_person': float(exp['price_per_person']),
-                'cuisine_type': exp['cuisine_type'],
+                'id': exp.id,
+                'title': exp.title,
+                'description': exp.description,
+                'price_per_person': exp.price_per_person,
+                'cuisine_type': exp.cuisine_type,
                 'image': image_url,  # Single image for the card
+                'image_placeholder': placeholder,
                 'host': {
-                    'name': exp['host_name'],
-                    'image': get_full_url(f"/uploads/{exp['host_image']}") if exp['host_image'] else '/image/mountain.jpg',
-                    'rating': float(exp['rating']),
-                    'reviews': exp['reviews_count']
+                    'name': exp.host_name,
+                    'image': get_full_url(f"/uploads/{exp.host_image}") if exp.host_image else '/image/mountain.jpg',
+                    'rating': exp.rating,
+                    'reviews': exp.reviews_count
                 },
-                'location': f"{exp['city']}, {exp['state']}"
+                'location': f"{exp.city}, {exp.state}"
             })
         
         return jsonify(response)
@@ -1752,18 +2425,24 @@ def get_featured_food():
         print("Error fetching featured food:", str(e))
         return jsonify({'message': 'Internal server error'}), 500
 
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
 @app.route('/api/featured-stays', methods=['GET'])
 def get_featured_stays():
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         # Get featured stays (limit to 4)
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT 
                 s.*,
                 u.name as host_name,
-                MIN(si.image_path) as image_path,
+                {first_image_sql('si')} as image_path,
                 GROUP_CONCAT(DISTINCT sa.amenity_id) as amenities
             FROM stays s
             JOIN users u ON s.host_id = u.id
@@ -1779,12 +2458,9 @@ def get_featured_stays():
         
         # Process the results (similar to get_published_stays)
         for stay in stays:
-            stay['price_per_night'] = float(stay['price_per_night'])
-            stay['created_at'] = stay['created_at'].isoformat()
-            stay['updated_at'] = stay['updated_at'].isoformat()
-            
-            if stay['image_path']:
-                stay['image'] = get_full_url(f"/uploads/{stay['image_path']}")
+            image_path, stay['image_placeholder'] = parse_first_image(stay['image_path'])
+            if image_path:
+                stay['image'] = get_full_url(f"/uploads/{image_path}")
             else:
                 stay['image'] = None
                 
@@ -1849,7 +2525,7 @@ def get_food_categories():
 @token_required
 def get_host_stay(current_user, id):
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         cursor = conn.cursor(dictionary=True)
         
         # Check if the stay exists and belongs to the host
@@ -1881,11 +2557,6 @@ def get_host_stay(current_user, id):
         if not stay:
             return jsonify({'message': 'Stay not found or unauthorized'}), 404
             
-        # Process the results
-        stay['price_per_night'] = float(stay['price_per_night'])
-        stay['created_at'] = stay['created_at'].isoformat()
-        stay['updated_at'] = stay['updated_at'].isoformat()
-        
         # Process images
         images = []
         if stay['image_data']:
@@ -1925,65 +2596,39 @@ def get_host_stay(current_user, id):
             'error': str(e)
         }), 500
 
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
 @app.route('/api/listings/nearby', methods=['GET'])
+@deadlines.limit(1500)
 def get_nearby_listings():
     try:
         lat = float(request.args.get('lat'))
         lng = float(request.args.get('lng'))
         radius = float(request.args.get('radius', 10))
+        if not 0 < radius <= MAX_RADIUS_KM:
+            return jsonify({'error': f'radius must be between 0 and {MAX_RADIUS_KM:g} km'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(read_only=True)
 
-        # Query food experiences
-        cursor.execute("""
-            SELECT 
-                id, 
-                title,
-                'food' as type,
-                latitude,
-                longitude,
-                (6371 * acos(
-                    cos(radians(%s)) * cos(radians(latitude)) *
-                    cos(radians(longitude) - radians(%s)) +
-                    sin(radians(%s)) * sin(radians(latitude))
-                )) as distance
-            FROM food_experiences
-            WHERE status = 'published'
-            HAVING distance <= %s
-            ORDER BY distance
-        """, (lat, lng, lat, radius))
-        
-        food_listings = cursor.fetchall()
-
-        # Query stays with same parameters
-        cursor.execute("""
-            SELECT 
-                id, 
-                title,
-                'stay' as type,
-                latitude,
-                longitude,
-                (6371 * acos(
-                    cos(radians(%s)) * cos(radians(latitude)) *
-                    cos(radians(longitude) - radians(%s)) +
-                    sin(radians(%s)) * sin(radians(latitude))
-                )) as distance
-            FROM stays
-            WHERE status = 'published'
-            HAVING distance <= %s
-            ORDER BY distance
-        """, (lat, lng, lat, radius))
-        
-        stay_listings = cursor.fetchall()
+        # Query food experiences, then stays with the same parameters
+        params = (lat, lng, lat, radius)
+        food_listings = statements.fetchall(conn, NEARBY_FOOD_SQL, params, dictionary=True)
+        try:
+            stay_listings = statements.fetchall(conn, NEARBY_STAYS_SQL, params, dictionary=True)
+        except DeadlineExceeded:
+            # Out of time, but the experiences found are still worth showing
+            deadlines.partial()
+            stay_listings = []
 
         return jsonify(food_listings + stay_listings)
     except Exception as e:
         print("Error fetching nearby listings:", str(e))
         return jsonify({'error': 'Failed to fetch nearby listings'}), 500
     finally:
-        if 'cursor' in locals():
-            cursor.close()
         if 'conn' in locals():
             conn.close()
 
@@ -1993,54 +2638,148 @@ def get_nearby_listings():
 #     images/
 #       placeholder-food.jpg
 
-@app.route('/api/host/food-experiences/<int:experience_id>/images', methods=['POST'])
-@token_required
-def upload_food_experience_images(current_user, experience_id):
+# Listing type in the batch upload URL -> (listing table, image table, key column)
+LISTING_IMAGE_TABLES = {
+    'food-experiences': ('food_experiences', 'food_experience_images', 'experience_id'),
+    'stays': ('stays', 'stay_images', 'stay_id')
+}
+MAX_BATCH_IMAGES = int(os.getenv('UPLOAD_BATCH_MAX', 20))
+
+def save_listing_images(current_user, listing_type, listing_id):
+    """Add the uploaded images to a listing: process them in parallel, insert
+    every row in one transaction and report per-file results"""
+    listing_table, image_table, key_column = LISTING_IMAGE_TABLES[listing_type]
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({'message': 'No images provided'}), 400
+    if len(files) > MAX_BATCH_IMAGES:
+        return jsonify({'message': f'At most {MAX_BATCH_IMAGES} images per upload'}), 400
+
     try:
-        if 'images' not in request.files:
-            return jsonify({'message': 'No images provided'}), 400
-            
-        files = request.files.getlist('images')
-        uploaded_images = []
-        
-        for file in files:
-            if file and allowed_file(file.filename):
-                # Generate a secure filename without order numbers
-                filename = secure_filename(file.filename)
-                base, ext = os.path.splitext(filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                new_filename = f"{base}_{timestamp}{ext}"
-                
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-                file.save(file_path)
-                
-                # Save image info to database without order number
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO food_experience_images 
-                    (experience_id, image_path) 
-                    VALUES (%s, %s)
-                """, (experience_id, new_filename))
-                
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(f'SELECT host_id FROM {listing_table} WHERE id = %s', (listing_id,))
+        listing = cursor.fetchone()
+        if not listing or listing[0] != current_user['id']:
+            return jsonify({'message': 'Listing not found or unauthorized'}), 404
+        # End the transaction the check opened rather than hold its read
+        # view through the image processing below
+        conn.rollback()
+
+        try:
+            results, images = process_image_batch(files)
+        except QueueFull:
+            response = jsonify({'message': 'Image processing queue is full, please retry shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        if images:
+            try:
+                # Append after the listing's existing images
+                cursor.execute(f'''
+                    SELECT COALESCE(MAX(display_order), -1) FROM {image_table}
+                    WHERE {key_column} = %s FOR UPDATE
+                ''', (listing_id,))
+                insert_listing_images(cursor, image_table, key_column, listing_id, images,
+                                      first_order=cursor.fetchone()[0] + 1)
                 conn.commit()
-                uploaded_images.append(new_filename)
-                
+            except Exception:
+                conn.rollback()
+                # The rows were rolled back, so nothing references the new files
+                discard_uploads([filename for filename, _, created in images if created])
+                raise
+
+        uploaded = len(images)
+        if uploaded == len(files):
+            status = 201
+        elif uploaded:
+            status = 207
+        else:
+            status = 422
         return jsonify({
-            'message': 'Images uploaded successfully',
-            'images': uploaded_images
-        })
-        
+            'message': f'Uploaded {uploaded} of {len(files)} images',
+            'images': [filename for filename, _, _ in images],
+            'results': results
+        }), status
+
     except Exception as e:
         print("Error uploading images:", str(e))
+        if 'conn' in locals():
+            conn.rollback()
         return jsonify({
             'message': 'Failed to upload images',
             'error': str(e)
         }), 500
-    
 
-    
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+@app.route('/api/host/<listing_type>/<int:listing_id>/images/batch', methods=['POST'])
+@token_required
+def upload_listing_images(current_user, listing_type, listing_id):
+    if listing_type not in LISTING_IMAGE_TABLES:
+        return jsonify({'message': 'Unknown listing type'}), 404
+    return save_listing_images(current_user, listing_type, listing_id)
+
+@app.route('/api/host/food-experiences/<int:experience_id>/images', methods=['POST'])
+@token_required
+def upload_food_experience_images(current_user, experience_id):
+    return save_listing_images(current_user, 'food-experiences', experience_id)
+
+@app.route('/api/admin/db', methods=['GET'])
+@admin_required
+def get_db_stats(current_user):
+    """Prepared statement cache, replica routing, deadline and transaction retry counters"""
+    return jsonify({
+        'statements': statements.stats(),
+        'routing': db_router.stats(),
+        'deadlines': deadlines.stats(),
+        'transactions': transactions.stats()
+    })
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries(current_user):
+    """Slow statements grouped by fingerprint, most total time first
+
+    ?source=table reads the slow_queries table (last ?hours, default 24)
+    instead of this process's ring buffer.
+    """
+    if slow_query_log is None:
+        return jsonify({'message': 'Slow query log is disabled (SLOW_QUERY_MS=0)'}), 404
+
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    source = request.args.get('source', 'memory')
+    try:
+        if source == 'table':
+            if not slow_query_log.table:
+                return jsonify({'message': 'Slow query table is disabled (SLOW_QUERY_TABLE=0)'}), 400
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            queries = slow_query_log.top_from_table(cursor, limit, request.args.get('hours', 24, type=int))
+        else:
+            queries = slow_query_log.top(limit)
+
+        return jsonify({
+            'threshold_ms': slow_query_log.threshold_ms,
+            'source': source,
+            'dropped': slow_query_log.dropped,
+            'queries': queries
+        })
+
+    except Exception as e:
+        print(f"Error fetching slow queries: {str(e)}")
+        return jsonify({'message': 'Failed to fetch slow queries'}), 500
+
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""Compute BlurHash placeholders and dominant colors for existing images
+
+Fills blurhash/dominant_color on image rows that predate placeholders,
+computing each distinct upload once across a process pool, and records
+them in the image's metadata file so rows inserted later pick them up.
+Safe to re-run: only rows still missing a placeholder are selected.
+
+Run from the backend directory after migration 0007_image_placeholders:
+    python backfill_placeholders.py [workers]
+"""
+import mysql.connector
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import os
+import sys
+
+from utils.blob_store import storage_path
+from utils.image_variants import read_image_metadata, save_image_metadata
+from utils.placeholders import compute_placeholder
+from utils.storage import require_local_storage
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER'),
+    'password': os.getenv('MYSQL_PASSWORD'),
+    'database': os.getenv('MYSQL_DATABASE')
+}
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+IMAGE_TABLES = ('food_experience_images', 'stay_images')
+
+def placeholder_for(filename):
+    """Pool task: compute and save the placeholder for one upload"""
+    path = os.path.join(UPLOAD_FOLDER, storage_path(filename))
+    placeholder = compute_placeholder(path)
+    folder = os.path.dirname(path)
+    metadata = read_image_metadata(folder, filename) or {}
+    metadata.update(placeholder)
+    save_image_metadata(folder, filename, metadata)
+    return placeholder
+
+def backfill_placeholders(workers=None):
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        filenames = set()
+        for table in IMAGE_TABLES:
+            cursor.execute(f"SELECT DISTINCT image_path FROM {table} WHERE blurhash IS NULL")
+            filenames.update(row[0] for row in cursor.fetchall() if row[0])
+        print(f"{len(filenames)} images need placeholders")
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {filename: pool.submit(placeholder_for, filename) for filename in sorted(filenames)}
+            for filename, future in futures.items():
+                try:
+                    placeholder = future.result()
+                except Exception as e:
+                    print(f"Skipping {filename}: {e}")
+                    failed += 1
+                    continue
+
+                for table in IMAGE_TABLES:
+                    cursor.execute(f"""
+                        UPDATE {table} SET blurhash = %s, dominant_color = %s
+                        WHERE image_path = %s
+                    """, (placeholder['blurhash'], placeholder['dominant_color'], filename))
+                # Commit per image so an interrupted run keeps its progress
+                conn.commit()
+                done += 1
+
+        print(f"Backfill complete: {done} updated, {failed} skipped")
+
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    require_local_storage('backfill_placeholders.py')
+    backfill_placeholders(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,100 @@
+"""Benchmark: pure Python protocol + WireConverter vs the C extension
+
+WireConverter only works with the pure Python protocol (use_pure=True),
+which gives up mysql-connector's C extension for parsing result rows.
+This times the hot listing statements both ways, each producing what
+the handlers send out:
+
+  pure      use_pure=True with WireConverter: rows arrive as floats, ISO
+            strings and bools
+  cext      the C extension with its default conversion, followed by the
+            per-field fix-ups WireConverter replaced (Decimal to float,
+            datetime to ISO string, TINYINT to bool)
+
+and reports the median and p95 per statement execution, rows included.
+Needs the C extension (a mysql-connector-python build that ships it) and
+the database from .env with listings in it (python index_advisor.py
+--seed 2000 on an empty one).
+
+Run from the backend directory:
+    python -m benchmarks.bench_driver [--iterations N]
+"""
+import argparse
+import statistics
+from datetime import date, datetime
+from decimal import Decimal
+
+import mysql.connector
+from mysql.connector.constants import FieldType
+
+from app import DB_CONFIG
+from benchmarks.bench_prepared import p95, timings
+from index_advisor import QUERIES
+
+STATEMENTS = ('food_experiences.list', 'stays.search', 'stays.search_nearby', 'listings.nearby_stays')
+
+
+def fix_row(row, tiny):
+    """What WireConverter does in the driver, done per field afterwards"""
+    fixed = []
+    for value, is_tiny in zip(row, tiny):
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif is_tiny and value is not None:
+            value = bool(value)
+        fixed.append(value)
+    return tuple(fixed)
+
+
+def pure(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def cext(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    tiny = [column[1] == FieldType.TINY for column in cursor.description]
+    cursor.close()
+    return [fix_row(row, tiny) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pure Python protocol against the C extension')
+    parser.add_argument('--iterations', type=int, default=200, help='executions per statement and driver')
+    args = parser.parse_args()
+
+    connections = {'pure': mysql.connector.connect(**DB_CONFIG)}
+    config = {key: value for key, value in DB_CONFIG.items() if key != 'converter_class'}
+    try:
+        connections['cext'] = mysql.connector.connect(**dict(config, use_pure=False))
+    except (ImportError, mysql.connector.errors.NotSupportedError) as e:
+        raise SystemExit(f"The C extension isn't available in this install: {e}")
+
+    try:
+        print(f"Per execution, {args.iterations} runs (median / p95 us)")
+        print(f"  {'statement':<26}{'rows':>6}{'pure':>18}{'cext':>18}{'cext speedup':>14}")
+        for name in STATEMENTS:
+            sql, params = QUERIES[name]
+            results = {}
+            for driver, fn in (('pure', pure), ('cext', cext)):
+                conn = connections[driver]
+                rows = len(fn(conn, sql, params))
+                times = timings(lambda: fn(conn, sql, params), args.iterations)
+                results[driver] = (statistics.median(times), p95(times))
+            (pure_median, pure_p95), (cext_median, cext_p95) = results['pure'], results['cext']
+            print(f"  {name:<26}{rows:>6}{pure_median:>10.0f}/{pure_p95:<7.0f}{cext_median:>10.0f}/{cext_p95:<7.0f}"
+                  f"{pure_median / cext_median:>13.2f}x")
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""Benchmark: the upload image pipeline, stage by stage
+
+Generates a reproducible corpus of synthetic photos (large and medium
+JPEGs, a PNG with alpha, a palette GIF) and runs each through the steps
+of utils.images._optimize, timing decode, resize and encode separately.
+The production settings (LANCZOS with reducing_gap=2.0, JPEG quality 85
+with optimize=True) are the baseline; each other resampling filter is
+run with the baseline encoder, and each other encoder with the baseline
+filter. For every case it reports output bytes, PSNR against the resized
+image and peak RSS (measured in a fresh process, as in bench_uploads).
+
+It then runs process_upload(), the image worker task, over copies of the
+corpus with 1, 2, 4, ... processes up to --workers to show multi-core
+scaling.
+
+--json writes the results for later comparison; --compare prints the
+change in time and bytes against such a file.
+
+Run from the backend directory:
+    python -m benchmarks.bench_image_pipeline [--repeat N] [--workers N] [--quick]
+                                              [--json OUT] [--compare OLD]
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import PIL
+from PIL import Image, ImageChops, ImageStat, features
+
+from benchmarks.bench_uploads import _reset_peak, _peak_kib
+from utils.images import MAX_IMAGE_SIZE, JPEG_QUALITY
+from utils.image_variants import process_upload
+
+SEED = 2025
+
+# name: (size, format, mode)
+CORPUS = {
+    'photo-24mp.jpg': ((6000, 4000), 'JPEG', 'RGB'),
+    'photo-12mp.jpg': ((4000, 3000), 'JPEG', 'RGB'),
+    'photo-2mp.jpg': ((1600, 1200), 'JPEG', 'RGB'),
+    'alpha-4mp.png': ((2400, 1600), 'PNG', 'RGBA'),
+    'palette.gif': ((1200, 900), 'GIF', 'P')
+}
+QUICK_CORPUS = ('photo-12mp.jpg', 'alpha-4mp.png', 'palette.gif')
+
+# name: (filter, reducing_gap); the first is what _optimize uses
+FILTERS = {
+    'lanczos': (Image.Resampling.LANCZOS, 2.0),
+    'lanczos-nogap': (Image.Resampling.LANCZOS, None),
+    'bicubic': (Image.Resampling.BICUBIC, 2.0),
+    'bilinear': (Image.Resampling.BILINEAR, 2.0)
+}
+
+# name: (format, save options); the first is what _optimize uses
+ENCODERS = {
+    'jpeg-q85-opt': ('JPEG', {'quality': JPEG_QUALITY, 'optimize': True}),
+    'jpeg-q85': ('JPEG', {'quality': JPEG_QUALITY}),
+    'jpeg-q85-prog': ('JPEG', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}),
+    'jpeg-q75-opt': ('JPEG', {'quality': 75, 'optimize': True}),
+    'jpeg-q90-opt': ('JPEG', {'quality': 90, 'optimize': True}),
+    'webp-q80': ('WEBP', {'quality': 80, 'method': 4}),
+    'webp-q80-m6': ('WEBP', {'quality': 80, 'method': 6}),
+}
+if features.check('avif'):
+    ENCODERS['avif-q60'] = ('AVIF', {'quality': 60, 'speed': 6})
+
+BASE_FILTER = next(iter(FILTERS))
+BASE_ENCODER = next(iter(ENCODERS))
+MiB = 1024 * 1024
+
+
+def make_image(size, mode, seed):
+    """A photo-like image: smooth seeded noise over a gradient and fractal detail"""
+    width, height = size
+    rng = random.Random(seed)
+    small = (max(1, width // 16), max(1, height // 16))
+
+    def noise():
+        return Image.frombytes('L', small, rng.randbytes(small[0] * small[1])).resize(
+            size, Image.Resampling.BICUBIC
+        )
+
+    gradient = Image.linear_gradient('L').resize(size)
+    detail = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64)
+    img = Image.merge('RGB', (
+        Image.blend(noise(), gradient, 0.5), Image.blend(noise(), detail, 0.3), noise()
+    ))
+    if mode == 'RGBA':
+        img.putalpha(Image.radial_gradient('L').resize(size))
+    elif mode == 'P':
+        img = img.quantize(256)
+    return img
+
+
+def build_corpus(directory, names):
+    """Write the corpus files; returns {name: path}"""
+    paths = {}
+    for index, name in enumerate(names):
+        size, fmt, mode = CORPUS[name]
+        path = os.path.join(directory, name)
+        options = {'quality': 92} if fmt == 'JPEG' else {}
+        make_image(size, mode, SEED + index).save(path, format=fmt, **options)
+        paths[name] = path
+    return paths
+
+
+def decode(data):
+    """Open and load, as _optimize does: palette to RGB, JPEG draft scaling"""
+    img = Image.open(BytesIO(data))
+    if img.mode in ('P', '1'):
+        img = img.convert('RGB')
+    ratio = min(MAX_IMAGE_SIZE / float(img.size[0]), MAX_IMAGE_SIZE / float(img.size[1]))
+    if ratio < 1:
+        img.draft('RGB', tuple(max(1, int(x * ratio)) for x in img.size))
+    img.load()
+    return img
+
+
+def resize(img, resample, reducing_gap):
+    """Fit within MAX_IMAGE_SIZE and convert to RGB, as _optimize does"""
+    ratio = min(MAX_IMAGE_SIZE / float(img.size[0]), MAX_IMAGE_SIZE / float(img.size[1]))
+    if ratio < 1:
+        new_size = tuple(max(1, int(x * ratio)) for x in img.size)
+        img = img.resize(new_size, resample, reducing_gap=reducing_gap)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img
+
+
+def encode(img, fmt, options):
+    output = BytesIO()
+    img.save(output, format=fmt, **options)
+    return output.getvalue()
+
+
+def psnr(reference, data):
+    """Peak signal-to-noise ratio of the encoded bytes against reference, in dB"""
+    with Image.open(BytesIO(data)) as decoded:
+        diff = ImageChops.difference(reference, decoded.convert(reference.mode))
+    pixels = reference.width * reference.height
+    mse = sum(ImageStat.Stat(diff).sum2) / (pixels * len(reference.getbands()))
+    return round(10 * math.log10(255 ** 2 / mse), 2) if mse else None
+
+
+def measure_case(path, filter_name, encoder_name, repeat):
+    """Run in a child process: best-of-repeat stage times, bytes, PSNR, peak RSS"""
+    resample, reducing_gap = FILTERS[filter_name]
+    fmt, options = ENCODERS[encoder_name]
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    _reset_peak()
+    baseline = _peak_kib()
+    best = {'decode': float('inf'), 'resize': float('inf'), 'encode': float('inf')}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        img = decode(data)
+        decoded = time.perf_counter()
+        img = resize(img, resample, reducing_gap)
+        resized = time.perf_counter()
+        output = encode(img, fmt, options)
+        encoded = time.perf_counter()
+        best['decode'] = min(best['decode'], decoded - start)
+        best['resize'] = min(best['resize'], resized - decoded)
+        best['encode'] = min(best['encode'], encoded - resized)
+    peak = (_peak_kib() - baseline) / 1024
+
+    return {
+        **{f"{stage}_ms": round(seconds * 1000, 2) for stage, seconds in best.items()},
+        'total_ms': round(sum(best.values()) * 1000, 2),
+        'bytes': len(output),
+        'psnr_db': psnr(img, output),
+        'peak_mib': round(peak, 1),
+        'output_size': list(img.size)
+    }
+
+
+def run_case(path, filter_name, encoder_name, repeat):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(measure_case, (path, filter_name, encoder_name, repeat))
+
+
+def stage_cases():
+    """(filter, encoder) pairs: every encoder at the base filter, every filter at the base encoder"""
+    cases = [(BASE_FILTER, encoder) for encoder in ENCODERS]
+    cases += [(name, BASE_ENCODER) for name in FILTERS if name != BASE_FILTER]
+    return cases
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def scaling(paths, max_workers, workdir, copies):
+    """Images per second through process_upload() with 1, 2, 4, ... workers"""
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    results = []
+    for workers in counts:
+        jobs = []
+        run_dir = tempfile.mkdtemp(dir=workdir)
+        for copy in range(max(copies, workers)):
+            for name, source in paths.items():
+                target = os.path.join(run_dir, f"{copy}-{name}")
+                shutil.copyfile(source, target)
+                jobs.append(target)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Start every worker before timing
+            list(pool.map(_warm_up, range(workers)))
+            start = time.perf_counter()
+            list(pool.map(process_upload, jobs))
+            elapsed = time.perf_counter() - start
+        shutil.rmtree(run_dir)
+
+        rate = len(jobs) / elapsed
+        single = results[0]['images_per_s'] if results else rate
+        results.append({
+            'workers': workers,
+            'images': len(jobs),
+            'seconds': round(elapsed, 3),
+            'images_per_s': round(rate, 2),
+            'speedup': round(rate / single, 2),
+            'efficiency': round(rate / single / workers, 2)
+        })
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'features': {name: features.check(name) for name in ('jpg', 'webp', 'avif', 'libimagequant')}
+    }
+
+
+def print_cases(results):
+    print(f"Pipeline stages to {MAX_IMAGE_SIZE}px (best of {results['repeat']})")
+    header = ('decode', 'resize', 'encode', 'total ms', 'KiB', 'PSNR', 'peak MiB')
+    print(f"  {'image':<16}{'filter':<15}{'encoder':<15}" + ''.join(f"{h:>10}" for h in header))
+    for case in results['cases']:
+        psnr_db = f"{case['psnr_db']:.1f}" if case['psnr_db'] is not None else 'inf'
+        print(f"  {case['image']:<16}{case['filter']:<15}{case['encoder']:<15}"
+              f"{case['decode_ms']:>10.1f}{case['resize_ms']:>10.1f}{case['encode_ms']:>10.1f}"
+              f"{case['total_ms']:>10.1f}{case['bytes'] / 1024:>10.0f}{psnr_db:>10}{case['peak_mib']:>10.1f}")
+
+
+def print_scaling(results):
+    print(f"process_upload() scaling ({results['environment']['cpu_count']} CPUs)")
+    print(f"  {'workers':<10}{'images':>8}{'s':>10}{'images/s':>10}{'speedup':>10}{'efficiency':>12}")
+    for row in results['scaling']:
+        print(f"  {row['workers']:<10}{row['images']:>8}{row['seconds']:>10.2f}{row['images_per_s']:>10.2f}"
+              f"{row['speedup']:>10.2f}{row['efficiency']:>12.0%}")
+
+
+def print_comparison(results, previous):
+    """Change in total time and bytes per case against an earlier --json run"""
+    def key(case):
+        return case['image'], case['filter'], case['encoder']
+
+    before = {key(case): case for case in previous.get('cases', [])}
+    print(f"Compared with run of {previous.get('timestamp', 'unknown date')}")
+    print(f"  {'image':<16}{'filter':<15}{'encoder':<15}{'time':>10}{'bytes':>10}")
+    for case in results['cases']:
+        old = before.get(key(case))
+        if not old:
+            continue
+        time_change = (case['total_ms'] - old['total_ms']) / old['total_ms'] if old['total_ms'] else 0
+        bytes_change = (case['bytes'] - old['bytes']) / old['bytes'] if old['bytes'] else 0
+        print(f"  {case['image']:<16}{case['filter']:<15}{case['encoder']:<15}"
+              f"{time_change:>+10.1%}{bytes_change:>+10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the upload image pipeline')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the best is kept')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='largest worker count for the scaling run')
+    parser.add_argument('--copies', type=int, default=2, help='copies of the corpus per scaling run')
+    parser.add_argument('--quick', action='store_true', help='smaller corpus')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    try:
+        names = QUICK_CORPUS if args.quick else tuple(CORPUS)
+        paths = build_corpus(workdir, names)
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': environment(),
+            'repeat': args.repeat,
+            'corpus': {
+                name: {'size': list(CORPUS[name][0]), 'format': CORPUS[name][1],
+                       'mode': CORPUS[name][2], 'bytes': os.path.getsize(path)}
+                for name, path in paths.items()
+            },
+            'cases': []
+        }
+        for name, path in paths.items():
+            for filter_name, encoder_name in stage_cases():
+                case = run_case(path, filter_name, encoder_name, args.repeat)
+                results['cases'].append({'image': name, 'filter': filter_name, 'encoder': encoder_name, **case})
+        print_cases(results)
+
+        results['scaling'] = scaling(paths, max(1, args.workers), workdir, args.copies)
+        print_scaling(results)
+
+        if args.compare:
+            with open(args.compare) as f:
+                print_comparison(results, json.load(f))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.json}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark: text protocol vs server-side prepared statements on the hot queries
+
+For each statement the listing and detail endpoints run, times
+executions three ways on one connection:
+
+  text      cursor.execute(): parameters interpolated client side, the
+            server parses and plans the full text every time
+  prepare   a new prepared statement per execution (prepare, execute,
+            deallocate), i.e. prepared=True without a cache
+  cached    StatementCache: prepared once, then only executed
+
+and reports the median and p95 per execution plus the server's
+Com_stmt_prepare/Com_stmt_execute counters, so the cached run can be
+seen to prepare each statement once. With --endpoints the same is done
+per request through the Flask test client with PREPARED_STATEMENTS on
+and off, after checking each endpoint stays within its query budget
+(assert_max_queries). Needs the database from .env with listings in it
+(python index_advisor.py --seed 2000 on an empty one).
+
+Run from the backend directory:
+    python -m benchmarks.bench_prepared [--iterations N] [--endpoints]
+"""
+import argparse
+import statistics
+import time
+
+import mysql.connector
+
+import app
+from index_advisor import QUERIES
+from utils.query_stats import assert_max_queries
+from utils.statement_cache import PreparedCursor, StatementCache
+
+STATEMENTS = (
+    'food_experiences.list', 'food_experiences.detail', 'stays.search', 'stays.search_nearby',
+    'stays.images', 'stays.amenities', 'listings.nearby_stays'
+)
+COUNTERS = ('Com_stmt_prepare', 'Com_stmt_execute', 'Com_select')
+
+
+def text(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    cursor.close()
+
+
+def prepare(conn, sql, params):
+    cursor = PreparedCursor(conn)
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    cursor.release()
+
+
+def cached(conn, sql, params, cache=StatementCache()):
+    cache.fetchall(conn, sql, params)
+
+
+def counters(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SHOW SESSION STATUS WHERE Variable_name IN ({', '.join(['%s'] * len(COUNTERS))})", COUNTERS)
+    values = {name: int(value) for name, value in cursor.fetchall()}
+    cursor.close()
+    return values
+
+
+def timings(fn, iterations):
+    """Per-call times in microseconds, after a warm-up call"""
+    fn()
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e6)
+    return times
+
+
+def p95(times):
+    return sorted(times)[int(len(times) * 0.95) - 1]
+
+
+def bench_statements(iterations):
+    conn = mysql.connector.connect(**app.DB_CONFIG)
+    try:
+        print(f"Per execution, {iterations} runs (median / p95 us; server counters)")
+        print(f"  {'statement':<26}{'mode':<9}{'median':>9}{'p95':>9}{'vs text':>9}   prepare/execute/select")
+        for name in STATEMENTS:
+            sql, params = QUERIES[name]
+            baseline = None
+            for mode, fn in (('text', text), ('prepare', prepare), ('cached', cached)):
+                before = counters(conn)
+                times = timings(lambda: fn(conn, sql, params), iterations)
+                after = counters(conn)
+                median = statistics.median(times)
+                baseline = baseline or median
+                deltas = '/'.join(str(after[counter] - before[counter]) for counter in COUNTERS)
+                print(f"  {name:<26}{mode:<9}{median:>9.0f}{p95(times):>9.0f}{baseline / median:>8.2f}x   {deltas}")
+    finally:
+        conn.close()
+
+
+def bench_endpoints(iterations):
+    # One pool for both runs, created without session resets so the only
+    # difference between them is the prepared statements
+    app.statements.enabled = True
+    app.get_db_pool()
+
+    conn = mysql.connector.connect(**app.DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM food_experiences WHERE status = 'published' LIMIT 1")
+    experience = cursor.fetchone()
+    conn.close()
+
+    # Path -> most queries a request may run, so an N+1 creeping back into
+    # an endpoint fails here instead of skewing its timings
+    paths = {
+        '/api/food-experiences': 1,
+        '/api/stays?min_guests=2': 4,
+        '/api/stays?lat=-1.29&lng=36.82&radius=10&sort=distance_asc': 4,
+        '/api/listings/nearby?lat=-1.29&lng=36.82&radius=10': 2,
+    }
+    if experience:
+        paths[f'/api/food-experiences/{experience[0]}'] = 1
+
+    client = app.app.test_client()
+    for path, max_queries in paths.items():
+        assert_max_queries(client, max_queries, path)
+
+    print(f"\nPer request, {iterations} runs (median / p95 ms)")
+    print(f"  {'path':<62}{'text':>14}{'prepared':>14}{'speedup':>9}")
+    for path in paths:
+        results = {}
+        for enabled in (False, True):
+            app.statements.enabled = enabled
+            times = timings(lambda: client.get(path), iterations)
+            results[enabled] = (statistics.median(times) / 1000, p95(times) / 1000)
+        (text_median, text_p95), (prepared_median, prepared_p95) = results[False], results[True]
+        print(f"  {path:<62}{text_median:>7.1f}/{text_p95:<6.1f}{prepared_median:>7.1f}/{prepared_p95:<6.1f}"
+              f"{text_median / prepared_median:>8.2f}x")
+    print(f"  statement cache: {app.statements.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prepared statements on the hot queries')
+    parser.add_argument('--iterations', type=int, default=200, help='executions per statement and mode')
+    parser.add_argument('--endpoints', action='store_true', help='also time the endpoints end to end')
+    args = parser.parse_args()
+
+    bench_statements(args.iterations)
+    if args.endpoints:
+        bench_endpoints(max(args.iterations // 4, 10))
+
+
+if __name__ == '__main__':
+    main()
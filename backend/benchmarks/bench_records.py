@@ -0,0 +1,121 @@
+"""Benchmark: allocations per 1k listing rows, dict rows vs slot records
+
+The old path fetched dictionary rows and mutated them in place (pop the
+joined columns, build nested host/images dicts). The new path builds
+FoodExperience/Host/Image slot records from tuple rows and runs the
+compiled shaper. Reports allocated blocks/bytes (tracemalloc), memory
+held by the intermediate rows, and time per 1k rows.
+
+Run from the backend directory:
+    python -m benchmarks.bench_records [rows]
+"""
+import sys
+import time
+import tracemalloc
+
+from app import shape_food_experience_list, get_full_url, parse_image_list
+from utils.records import FoodExperience, Host, FOOD_EXPERIENCE_COLUMNS
+
+EXTRA_COLUMNS = ('host_name', 'rating', 'reviews_count', 'image_paths')
+
+
+def make_rows(count):
+    """Tuple rows as returned by the get_food_experiences query"""
+    rows = []
+    for i in range(count):
+        rows.append((
+            i, i % 50, f'Experience {i}', 'Cook jollof rice with a local host. ' * 3,
+            'Nairobi', 45.0 + i, 'West African', 'Jollof, plantain, suya',
+            '2025-02-07T09:02:03', '2025-02-08T10:00:00', 'published',
+            '12 Example Road', '00100', 'Nairobi', 'Nairobi',
+            -1.286389, 36.817223, '2 hours', 8, 'English',
+            'Host name', 4.5, 12,
+            f'exp_{i}_a.jpg\t\t\t\nexp_{i}_b.jpg\t\t\t\nexp_{i}_c.jpg\t\t\t'
+        ))
+    return rows
+
+
+def dict_rows(rows):
+    names = FOOD_EXPERIENCE_COLUMNS + EXTRA_COLUMNS
+    return [dict(zip(names, row)) for row in rows]
+
+
+def legacy(rows):
+    """Dictionary cursor rows mutated in place, as the handlers used to"""
+    experiences = dict_rows(rows)
+    for exp in experiences:
+        image_paths = exp.pop('image_paths', '')
+        exp['images'] = [
+            {'url': get_full_url('/uploads/' + entry.split('\t')[0]), 'srcset': None, 'placeholder': None}
+            for entry in image_paths.split('\n')
+        ]
+        exp['host'] = {
+            'name': exp.pop('host_name', 'Unknown Host'),
+            'rating': exp.pop('rating', 0),
+            'reviews': int(exp.pop('reviews_count', 0))
+        }
+        exp['location_name'] = exp['location_name'] or 'Location not specified'
+        exp['cuisine_type'] = exp['cuisine_type'] or 'Various'
+        exp['description'] = exp['description'] or 'No description available'
+    return experiences
+
+
+def build_records(rows):
+    records = []
+    offset = len(FOOD_EXPERIENCE_COLUMNS)
+    for row in rows:
+        host_name, rating, reviews_count, image_paths = row[offset:]
+        exp = FoodExperience.from_row(row)
+        exp.host = Host(host_name, None, rating, reviews_count)
+        exp.images = parse_image_list(image_paths)
+        records.append(exp)
+    return records
+
+
+def record_rows(rows):
+    return [FoodExperience.from_row(row) for row in rows]
+
+
+def current(rows):
+    return [shape_food_experience_list(exp) for exp in build_records(rows)]
+
+
+def allocations(fn, rows):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn(rows)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del result
+    return blocks, size
+
+
+def timing(fn, rows, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = make_rows(count)
+    assert legacy(make_rows(5)) == current(make_rows(5))
+
+    per_k = 1000 / count
+    print(f"{count} food experience rows, figures per 1k rows")
+    print(f"  {'':<22}{'blocks':>10}{'KiB':>10}{'ms':>10}")
+    for name, fn in (('dict rows (old)', dict_rows), ('slot records', record_rows),
+                     ('full path (old)', legacy), ('full path (records)', current)):
+        blocks, size = allocations(fn, rows)
+        elapsed = timing(fn, rows)
+        print(f"  {name:<22}{blocks * per_k:>10.0f}{size * per_k / 1024:>10.1f}{elapsed * 1000 * per_k:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
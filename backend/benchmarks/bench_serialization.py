@@ -0,0 +1,102 @@
+"""Micro-benchmark: per-row cost of serializing listing rows
+
+Compares the old path (convert Decimal/datetime by hand, json.loads the
+JSON_OBJECT columns, then json.dumps with a Decimal-aware encoder) against
+utils.serialization.dumps with raw_json fragments.
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization [rows]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from utils.serialization import dumps, raw_json
+
+
+class LegacyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super().default(obj)
+
+
+def make_rows(count):
+    """Rows shaped like the get_stays result set"""
+    created = datetime(2025, 2, 7, 9, 2, 3)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'id': i,
+            'host_id': i % 50,
+            'title': f'Stay number {i}',
+            'description': 'A quiet place near the mountains with a view of the lake. ' * 3,
+            'location_name': 'Nairobi',
+            'price_per_night': Decimal('120.50') + i,
+            'max_guests': 4,
+            'bedrooms': 2,
+            'bathrooms': 1,
+            'status': 'published',
+            'address': '12 Example Road',
+            'zipcode': '00100',
+            'city': 'Nairobi',
+            'state': 'Nairobi',
+            'latitude': Decimal('-1.28638900'),
+            'longitude': Decimal('36.81722300'),
+            'created_at': created + timedelta(minutes=i),
+            'updated_at': created + timedelta(minutes=i, seconds=30),
+            'details': '{"bedrooms": 2, "location": "Nairobi", "bathrooms": 2, "maxGuests": 4}',
+            'host_data': '{"name": "Host", "image": "", "rating": 4.5, "reviews": 10}',
+            'review_count': 10,
+        })
+    return rows
+
+
+def legacy(rows):
+    for stay in rows:
+        stay['price_per_night'] = float(stay['price_per_night'])
+        stay['latitude'] = float(stay['latitude'])
+        stay['longitude'] = float(stay['longitude'])
+        stay['created_at'] = stay['created_at'].isoformat()
+        stay['updated_at'] = stay['updated_at'].isoformat()
+        stay['details'] = json.loads(stay['details'])
+        stay['host'] = json.loads(stay.pop('host_data'))
+    return json.dumps(rows, cls=LegacyEncoder).encode('utf-8')
+
+
+def current(rows):
+    for stay in rows:
+        stay['details'] = raw_json(stay['details'])
+        stay['host'] = raw_json(stay.pop('host_data'))
+    return dumps(rows)
+
+
+def measure(fn, count, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        rows = make_rows(count)
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    # Both paths must produce the same document
+    assert json.loads(legacy(make_rows(10))) == json.loads(current(make_rows(10)))
+
+    print(f"Serializing {count} listing rows (best of 5)")
+    results = {}
+    for name, fn in (('legacy', legacy), ('orjson', current)):
+        elapsed = measure(fn, count)
+        results[name] = elapsed
+        print(f"  {name:<8} {elapsed * 1000:8.2f} ms total  {elapsed / count * 1e6:6.2f} us/row")
+    print(f"  speedup  {results['legacy'] / results['orjson']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark: peak RSS and time to optimize large camera photos
+
+Compares the old optimize path (decode the full image, convert to RGB,
+then resize) against utils.images.optimize_file, which downscales during
+decode via JPEG draft mode. Each measurement runs in a fresh process and
+reports peak RSS above that process's baseline after imports. On Linux
+the peak is VmHWM, reset through /proc/self/clear_refs; elsewhere it
+falls back to ru_maxrss, which Linux would carry over from the parent.
+
+Run from the backend directory:
+    python -m benchmarks.bench_uploads [repeat]
+"""
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from PIL import Image
+
+from utils.images import MAX_IMAGE_SIZE, JPEG_QUALITY, optimize_file
+
+SIZES = {
+    '12 MP': (4000, 3000),
+    '24 MP': (6000, 4000)
+}
+
+
+def make_photo(path, size):
+    """Noisy gradient JPEG, so it compresses roughly like a real photo"""
+    width, height = size
+    noise = Image.effect_noise((width // 4, height // 4), 48).resize(size)
+    gradient = Image.linear_gradient('L').resize(size)
+    Image.merge('RGB', (noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(
+        path, format='JPEG', quality=92
+    )
+
+
+def legacy_optimize(path):
+    """The pre-draft path: full decode and RGB conversion before resizing"""
+    img = Image.open(path)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    ratio = min(MAX_IMAGE_SIZE / float(img.size[0]), MAX_IMAGE_SIZE / float(img.size[1]))
+    if ratio < 1:
+        new_size = tuple([int(x * ratio) for x in img.size])
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+    img.save(path, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+
+
+def _reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_kib():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(fn, path):
+    """Run in a child process: (peak RSS above baseline in MiB, seconds)"""
+    _reset_peak()
+    baseline = _peak_kib()
+    start = time.perf_counter()
+    fn(path)
+    elapsed = time.perf_counter() - start
+    return (_peak_kib() - baseline) / 1024, elapsed
+
+
+def run(fn, source, workdir):
+    path = os.path.join(workdir, 'photo.jpg')
+    shutil.copyfile(source, path)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(measure, (fn, path))
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    workdir = tempfile.mkdtemp(prefix='bench-uploads-')
+    try:
+        print(f"Optimize to {MAX_IMAGE_SIZE}px, best of {repeat}")
+        print(f"  {'':<8}{'file MiB':>10}{'':<12}{'peak MiB':>10}{'ms':>10}")
+        for label, size in SIZES.items():
+            source = os.path.join(workdir, f"{label.replace(' ', '')}.jpg")
+            make_photo(source, size)
+            file_mib = os.path.getsize(source) / 1024 / 1024
+            for name, fn in (('old', legacy_optimize), ('draft', optimize_file)):
+                results = [run(fn, source, workdir) for _ in range(repeat)]
+                peak = min(result[0] for result in results)
+                elapsed = min(result[1] for result in results)
+                print(f"  {label:<8}{file_mib:>10.1f}  {name:<10}{peak:>10.1f}{elapsed * 1000:>10.0f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
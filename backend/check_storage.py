@@ -0,0 +1,178 @@
+"""Round-trip check of remote upload storage (STORAGE_BACKEND=s3)
+
+Takes one upload through the path a presigned upload takes in the app:
+presign a PUT, send the bytes to that URL, process the stored upload
+(process_stored_upload), then check that variants and metadata were
+written back, that processing it again leaves the upload alone, and that
+the bucket listing indexes it. Finally bytes that don't match their blob
+name are stored and must be rejected and deleted. Everything written is
+removed at the end; any failed check exits with status 1.
+
+By default it runs against the S3_* settings from .env, e.g. a local
+MinIO (S3_ENDPOINT_URL=http://localhost:9000), and S3_BUCKET must exist.
+--moto starts an in-process moto S3 server instead (pip install
+"moto[server]"), so no service is needed.
+
+Run from the backend directory:
+    python check_storage.py [--moto]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import posixpath
+import random
+import sys
+import tempfile
+import urllib.request
+from io import BytesIO
+
+from dotenv import load_dotenv
+from PIL import Image
+
+from utils.blob_store import ChecksumMismatch, blob_filename, storage_path
+from utils.image_variants import VARIANT_FORMATS, VARIANT_WIDTHS, VARIANTS_DIR, variant_path
+from utils.storage import S3Storage, process_stored_upload, stored_metadata
+from utils.upload_index import UploadIndex
+
+load_dotenv()
+
+MOTO_BUCKET = 'fiat-storage-check'
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+    print(f"  ok  {message}")
+
+
+def sample_jpeg():
+    """A JPEG no other run has uploaded, wider than the largest variant"""
+    img = Image.new('RGB', (2400, 1600), tuple(random.randrange(256) for _ in range(3)))
+    for _ in range(200):
+        img.putpixel((random.randrange(img.width), random.randrange(img.height)), (255, 255, 255))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def remove(storage, name):
+    key = storage_path(name)
+    if storage.exists(key):
+        storage.delete(key)
+    storage.delete_prefix(posixpath.join(posixpath.dirname(key), VARIANTS_DIR, name))
+
+
+def presigned_upload(storage, name, data):
+    digest = name.split('.')[0]
+    url, headers = storage.presign_put(storage_path(name), 'image/jpeg', digest, len(data), 300)
+    request = urllib.request.Request(url, data=data, method='PUT', headers=headers)
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+
+def check_round_trip(storage, name, data):
+    key = storage_path(name)
+    expect(presigned_upload(storage, name, data) == 200, "presigned PUT accepted")
+    expect(storage.exists(key) and storage.size(key) == len(data), "upload stored under its blob key")
+
+    metadata = process_stored_upload(storage, name)
+    expect(metadata and len(metadata['widths']) == len(VARIANT_WIDTHS), "upload processed")
+    missing = [
+        variant_path(name, variant, fmt)
+        for variant in VARIANT_WIDTHS for fmt in VARIANT_FORMATS
+        if not storage.exists(storage_path(variant_path(name, variant, fmt)))
+    ]
+    expect(not missing, f"{len(VARIANT_WIDTHS) * len(VARIANT_FORMATS)} variants written back")
+    expect(stored_metadata(storage, name) == metadata, "metadata written back")
+    optimized = storage.read(key)
+    expect(optimized != data, "original replaced by its optimized version")
+
+    expect(process_stored_upload(storage, name) == metadata, "processing again returns the saved metadata")
+    expect(storage.read(key) == optimized, "processing again leaves the upload alone")
+
+    with tempfile.TemporaryDirectory() as empty:
+        index = UploadIndex(empty)
+        index.build(storage.keys())
+        expect(name in index, "bucket listing indexes the upload")
+        expect(not any(indexed.endswith(('.webp', '.avif', '.json')) for indexed in index._names),
+               "bucket listing skips variants and metadata")
+
+
+def check_mismatch(storage, data):
+    # Stored as-is, like a presigned PUT to a service that ignores the checksum
+    name = blob_filename(hashlib.sha256(b'other content').hexdigest(), 'jpg')
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+        f.write(data)
+    try:
+        storage.save(storage_path(name), f.name)
+    finally:
+        os.remove(f.name)
+    try:
+        process_stored_upload(storage, name)
+        rejected = False
+    except ChecksumMismatch:
+        rejected = True
+    expect(rejected, "bytes not matching the blob name are rejected")
+    expect(not storage.exists(storage_path(name)), "mismatched upload deleted")
+    return name
+
+
+def moto_storage():
+    from moto.server import ThreadedMotoServer
+    import boto3
+
+    for variable in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        os.environ.setdefault(variable, 'check')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    # Its request log would drown out the checks
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    boto3.client('s3', endpoint_url=endpoint).create_bucket(Bucket=MOTO_BUCKET)
+    return S3Storage(MOTO_BUCKET, endpoint_url=endpoint), server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Round-trip an upload through remote storage')
+    parser.add_argument('--moto', action='store_true', help='use an in-process moto S3 server')
+    args = parser.parse_args()
+
+    server = None
+    if args.moto:
+        storage, server = moto_storage()
+    else:
+        if not os.getenv('S3_BUCKET'):
+            sys.exit("Set S3_BUCKET (and S3_ENDPOINT_URL for a local stand-in), or use --moto")
+        storage = S3Storage(
+            os.getenv('S3_BUCKET'),
+            endpoint_url=os.getenv('S3_ENDPOINT_URL') or None,
+            region=os.getenv('S3_REGION') or None
+        )
+
+    data = sample_jpeg()
+    name = blob_filename(hashlib.sha256(data).hexdigest(), 'jpg')
+    written = [name]
+    print(f"Checking {storage.endpoint_url or 'AWS'} bucket {storage.bucket} with {name}")
+    try:
+        check_round_trip(storage, name, data)
+        written.append(check_mismatch(storage, data))
+        print("All storage checks passed")
+    except CheckFailed as e:
+        print(f"  FAILED  {e}")
+        sys.exit(1)
+    finally:
+        for written_name in written:
+            remove(storage, written_name)
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
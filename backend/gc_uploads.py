@@ -0,0 +1,192 @@
+"""Mark-and-sweep garbage collection of unreferenced uploads
+
+Mark: reads every image_path in food_experience_images and stay_images
+and every users.image, in primary-key batches, into the referenced set.
+Sweep: walks the upload folder (legacy files at its root and the blob
+shards) and deletes originals that aren't referenced and haven't been
+modified for --grace seconds, along with their variants and resized
+copies. Each candidate is checked against the database once more right
+before it is deleted, so rows inserted after the mark phase are safe.
+Variant directories whose original is gone are removed too.
+
+The resized cache, spool and session folders, and dotfiles, are left
+alone.
+
+Run from the backend directory:
+    python gc_uploads.py [--dry-run] [--grace SECONDS] [--rate FILES/s] [--batch-size N]
+"""
+import argparse
+import mysql.connector
+from dotenv import load_dotenv
+import os
+import shutil
+import time
+
+from utils.blob_store import BLOBS_DIR, is_blob, remove as remove_upload
+from utils.image_cache import ResizeCache
+from utils.image_variants import VARIANTS_DIR
+from utils.storage import require_local_storage
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER'),
+    'password': os.getenv('MYSQL_PASSWORD'),
+    'database': os.getenv('MYSQL_DATABASE')
+}
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+RESIZED_DIR = 'resized'
+# (table, column) pairs that reference uploads by name
+REFERENCES = (
+    ('food_experience_images', 'image_path'),
+    ('stay_images', 'image_path'),
+    ('users', 'image')
+)
+MiB = 1024 * 1024
+
+def referenced_uploads(cursor, batch_size):
+    """Mark phase: every upload name referenced by any row"""
+    names = set()
+    for table, column in REFERENCES:
+        last_id = 0
+        while True:
+            cursor.execute(f"""
+                SELECT id, {column} FROM {table}
+                WHERE id > %s AND {column} IS NOT NULL
+                ORDER BY id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            # Tolerate values stored as paths rather than bare names
+            names.update(value.rsplit('/', 1)[-1] for _, value in rows if value)
+            last_id = rows[-1][0]
+    return names
+
+def still_referenced(cursor, name):
+    cursor.execute("""
+        SELECT EXISTS(SELECT 1 FROM food_experience_images WHERE image_path = %s)
+            OR EXISTS(SELECT 1 FROM stay_images WHERE image_path = %s)
+            OR EXISTS(SELECT 1 FROM users WHERE image = %s)
+    """, (name, name, name))
+    return bool(cursor.fetchone()[0])
+
+def stored_uploads(upload_folder):
+    """Yield (name, path) for every original in the upload folder"""
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            # Legacy uploads sit at the root, beside the managed folders
+            if entry.is_file() and not entry.name.startswith('.'):
+                yield entry.name, entry.path
+
+    for dirpath, dirnames, filenames in os.walk(os.path.join(upload_folder, BLOBS_DIR)):
+        dirnames[:] = [name for name in dirnames if name != VARIANTS_DIR]
+        for filename in filenames:
+            # Skips store()'s in-progress .tmp- files
+            if is_blob(filename):
+                yield filename, os.path.join(dirpath, filename)
+
+def orphaned_variants(upload_folder):
+    """Yield variant directories whose original no longer exists"""
+    variant_roots = [os.path.join(upload_folder, VARIANTS_DIR)]
+    for dirpath, dirnames, _ in os.walk(os.path.join(upload_folder, BLOBS_DIR)):
+        if VARIANTS_DIR in dirnames:
+            variant_roots.append(os.path.join(dirpath, VARIANTS_DIR))
+        dirnames[:] = [name for name in dirnames if name != VARIANTS_DIR]
+
+    for root in variant_roots:
+        if not os.path.isdir(root):
+            continue
+        with os.scandir(root) as entries:
+            for entry in entries:
+                original = os.path.join(os.path.dirname(root), entry.name)
+                if entry.is_dir() and not os.path.exists(original):
+                    yield entry.path
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(path) for filename in filenames
+    )
+
+def gc_uploads(dry_run=False, grace=3600, rate=None, batch_size=1000):
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        start = time.monotonic()
+        referenced = referenced_uploads(cursor, batch_size)
+        print(f"Marked {len(referenced)} referenced uploads in {time.monotonic() - start:.1f}s")
+
+        resize_cache = None if dry_run else ResizeCache(os.path.join(UPLOAD_FOLDER, RESIZED_DIR), max_bytes=0)
+        scanned = kept_young = swept = 0
+        swept_bytes = 0
+        delay = 1 / rate if rate else 0
+        cutoff = time.time() - grace
+
+        def throttle():
+            if delay:
+                time.sleep(delay)
+
+        for name, path in stored_uploads(UPLOAD_FOLDER):
+            scanned += 1
+            if name in referenced:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                kept_young += 1
+                continue
+
+            age_days = (time.time() - stat.st_mtime) / 86400
+            if dry_run:
+                print(f"  would remove {name} ({stat.st_size / 1024:.0f} KiB, {age_days:.0f} days old)")
+            else:
+                if still_referenced(cursor, name) or not remove_upload(UPLOAD_FOLDER, name, grace=grace):
+                    continue
+                resize_cache.discard(name)
+                print(f"  removed {name} ({stat.st_size / 1024:.0f} KiB)")
+                throttle()
+            swept += 1
+            swept_bytes += stat.st_size
+
+        orphans = 0
+        for path in orphaned_variants(UPLOAD_FOLDER):
+            if os.path.getmtime(path) > cutoff:
+                continue
+            size = directory_size(path)
+            if dry_run:
+                print(f"  would remove orphaned variants {os.path.relpath(path, UPLOAD_FOLDER)}")
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+                throttle()
+            orphans += 1
+            swept_bytes += size
+
+        verb = 'would remove' if dry_run else 'removed'
+        print(f"Scanned {scanned} uploads in {time.monotonic() - start:.1f}s: {verb} {swept} "
+              f"unreferenced and {orphans} orphaned variant sets ({swept_bytes / MiB:.1f} MiB); "
+              f"{kept_young} unreferenced uploads younger than {grace}s kept")
+
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    require_local_storage('gc_uploads.py')
+    parser = argparse.ArgumentParser(description='Delete uploads nothing references')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be removed')
+    parser.add_argument('--grace', type=int, default=int(os.getenv('UPLOAD_GRACE_SECONDS', 3600)),
+                        help='keep files modified within this many seconds')
+    parser.add_argument('--rate', type=float, default=None, help='max deletions per second')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows per mark query')
+    args = parser.parse_args()
+    gc_uploads(args.dry_run, args.grace, args.rate, args.batch_size)
@@ -0,0 +1,328 @@
+"""Check the query plans of the app's hot queries
+
+Runs EXPLAIN FORMAT=JSON for every query in QUERIES (the SQL of the
+listing, detail, host dashboard, image and login endpoints, with sample
+parameters) and reports, per table, the access type, index and rows
+examined, flagging full table scans, filesorts and temporary tables.
+
+Plans are compared with a baseline file (query_plans.json, written with
+--update-baseline). A query regresses when a table's access gets worse
+(e.g. ref -> ALL), it stops using an index, its rows examined grow past
+--rows-factor times the baseline, or a filesort or temporary table
+appears that the baseline didn't have. Any regression exits with status
+1, so CI can run this after migrations.
+
+Plans depend on data, so run it against a seeded database. --seed N
+fills an empty database with N synthetic stays and food experiences
+(with hosts, images, reviews and amenities) and runs ANALYZE TABLE; it
+refuses to touch a database that already has listings.
+
+Run from the backend directory, after python migrate.py up:
+    python index_advisor.py [--seed N] [--update-baseline] [--strict] [--rows-factor X]
+"""
+import argparse
+import json
+import mysql.connector
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import os
+import random
+import sys
+
+from utils.listing_sql import (
+    DISTANCE_SQL, GROUP_CONCAT_HINT, NEARBY_STAYS_SQL,
+    image_list_sql, first_image_sql, stay_images_sql, stay_amenities_sql
+)
+from utils.query_plans import ACCESS_TYPES, plan_summary
+from utils.records import FOOD_EXPERIENCE_COLUMNS, STAY_COLUMNS, select_columns
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER'),
+    'password': os.getenv('MYSQL_PASSWORD'),
+    'database': os.getenv('MYSQL_DATABASE')
+}
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_plans.json')
+
+# name: (sql, params); keep in step with the handlers in app.py
+QUERIES = {
+    'login': (
+        "SELECT id, email, name, password, is_host FROM users WHERE email = %s",
+        ('host1@example.com',)
+    ),
+    'food_experiences.list': (f"""
+        SELECT {GROUP_CONCAT_HINT}
+            {select_columns('fe', FOOD_EXPERIENCE_COLUMNS)},
+            u.name as host_name,
+            COALESCE(AVG(r.rating), 0) as rating,
+            COUNT(DISTINCT r.id) as reviews_count,
+            {image_list_sql('fei')} as image_paths
+        FROM food_experiences fe
+        LEFT JOIN users u ON fe.host_id = u.id
+        LEFT JOIN reviews r ON fe.id = r.experience_id
+        LEFT JOIN food_experience_images fei ON fe.id = fei.experience_id
+        WHERE fe.status = 'published' AND fe.zipcode = %s
+        GROUP BY fe.id
+        ORDER BY fe.price_per_person ASC
+    """, ('00100',)),
+    'food_experiences.detail': (f"""
+        SELECT {GROUP_CONCAT_HINT}
+            fe.*, u.name as host_name, u.image as host_image,
+            COALESCE(AVG(r.rating), 0) as rating,
+            COUNT(DISTINCT r.id) as reviews_count,
+            {image_list_sql('fei')} as image_paths
+        FROM food_experiences fe
+        LEFT JOIN users u ON fe.host_id = u.id
+        LEFT JOIN reviews r ON fe.id = r.experience_id
+        LEFT JOIN food_experience_images fei ON fe.id = fei.experience_id
+        WHERE fe.id = %s AND fe.status = 'published'
+        GROUP BY fe.id
+    """, (1,)),
+    'food_experiences.featured': (f"""
+        SELECT fe.id, fe.title, fe.description, fe.price_per_person,
+            fe.cuisine_type, fe.city, fe.state,
+            u.name as host_name, u.image as host_image,
+            COALESCE(AVG(r.rating), 0) as rating,
+            COUNT(DISTINCT r.id) as reviews_count,
+            {first_image_sql('fei')} as first_image
+        FROM food_experiences fe
+        LEFT JOIN users u ON fe.host_id = u.id
+        LEFT JOIN reviews r ON fe.id = r.experience_id
+        LEFT JOIN food_experience_images fei ON fe.id = fei.experience_id
+        WHERE fe.status = 'published'
+        GROUP BY fe.id
+        ORDER BY rating DESC, reviews_count DESC
+        LIMIT 6
+    """, ()),
+    'food_experiences.host': ("""
+        SELECT fe.*, GROUP_CONCAT(DISTINCT fei.image_path) as image_paths
+        FROM food_experiences fe
+        LEFT JOIN food_experience_images fei ON fe.id = fei.experience_id
+        WHERE fe.host_id = %s
+        GROUP BY fe.id
+        ORDER BY fe.created_at DESC
+    """, (1,)),
+    'stays.search': (f"""
+        SELECT {select_columns('s', STAY_COLUMNS)}, u.name,
+            COALESCE(AVG(r.rating), 4.5), COUNT(DISTINCT r.id) as review_count
+        FROM stays s
+        JOIN users u ON s.host_id = u.id
+        LEFT JOIN reviews r ON s.id = r.stay_id
+        WHERE s.status = 'published'
+        AND s.price_per_night BETWEEN %s AND %s
+        AND s.max_guests >= %s
+        GROUP BY s.id
+        ORDER BY s.price_per_night ASC
+    """, (50, 150, 2)),
+    'stays.search_nearby': (f"""
+        SELECT {select_columns('s', STAY_COLUMNS)}, u.name,
+            COALESCE(AVG(r.rating), 4.5), COUNT(DISTINCT r.id) as review_count,
+            {DISTANCE_SQL} as distance
+        FROM stays s
+        JOIN users u ON s.host_id = u.id
+        LEFT JOIN reviews r ON s.id = r.stay_id
+        WHERE s.status = 'published'
+        AND s.price_per_night BETWEEN %s AND %s
+        AND s.max_guests >= %s
+        GROUP BY s.id
+        HAVING distance <= %s
+        ORDER BY distance ASC
+    """, (-1.29, 36.82, -1.29, 50, 150, 2, 10)),
+    'stays.images': (stay_images_sql(3), (1, 2, 3)),
+    'stays.amenities': (stay_amenities_sql(3), (1, 2, 3)),
+    'stays.published': (f"""
+        SELECT s.*, u.name as host_name,
+            {first_image_sql('si')} as image_path,
+            GROUP_CONCAT(DISTINCT sa.amenity_id) as amenities
+        FROM stays s
+        JOIN users u ON s.host_id = u.id
+        LEFT JOIN stay_images si ON s.id = si.stay_id
+        LEFT JOIN stay_amenities sa ON s.id = sa.stay_id
+        WHERE s.status = 'published'
+        GROUP BY s.id
+        ORDER BY s.created_at DESC
+    """, ()),
+    'stays.host': ("""
+        SELECT s.*,
+            GROUP_CONCAT(CONCAT(si.image_path, ':', COALESCE(si.display_order, 0))
+                         ORDER BY si.display_order ASC) as image_data,
+            GROUP_CONCAT(DISTINCT sa.amenity_id) as amenities
+        FROM stays s
+        LEFT JOIN stay_images si ON s.id = si.stay_id
+        LEFT JOIN stay_amenities sa ON s.id = sa.stay_id
+        WHERE s.host_id = %s
+        GROUP BY s.id
+        ORDER BY s.created_at DESC
+    """, (1,)),
+    'listings.nearby_stays': (NEARBY_STAYS_SQL, (-1.29, 36.82, -1.29, 10)),
+    'images.in_use': ("""
+        SELECT EXISTS(SELECT 1 FROM food_experience_images WHERE image_path = %s)
+            OR EXISTS(SELECT 1 FROM stay_images WHERE image_path = %s)
+    """, ('photo.jpg', 'photo.jpg'))
+}
+
+def explain(cursor, sql, params):
+    cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+    return plan_summary(json.loads(cursor.fetchone()[0]))
+
+def regressions(name, summary, baseline, rows_factor):
+    """Why summary is worse than baseline, as a list of messages"""
+    problems = []
+    before = {table['table']: table for table in baseline['tables']}
+    for table in summary['tables']:
+        old = before.get(table['table'])
+        if old is None or not table['access'] or not old['access']:
+            continue
+        label = f"{name}: {table['table']}"
+        if ACCESS_TYPES.index(table['access']) > ACCESS_TYPES.index(old['access']):
+            problems.append(f"{label} access {old['access']} -> {table['access']}")
+        if old['key'] and not table['key']:
+            problems.append(f"{label} stopped using index {old['key']}")
+        if old['covering'] and not table['covering']:
+            problems.append(f"{label} is no longer covered by {old['key']}")
+        if old['rows'] and table['rows'] and table['rows'] > old['rows'] * rows_factor:
+            problems.append(f"{label} examines {table['rows']} rows (was {old['rows']})")
+    for flag in summary['flags']:
+        if flag not in baseline['flags']:
+            problems.append(f"{name}: new {flag}")
+    return problems
+
+def seed(conn, cursor, count):
+    """Fill an empty database with count stays and food experiences"""
+    cursor.execute("SELECT (SELECT COUNT(*) FROM stays) + (SELECT COUNT(*) FROM food_experiences)")
+    if cursor.fetchone()[0]:
+        raise SystemExit("Refusing to seed: the database already has listings")
+
+    rng = random.Random(44)
+    now = datetime.now()
+    hosts = max(1, count // 10)
+    print(f"Seeding {hosts * 2} users, {count} stays and {count} food experiences...")
+
+    cursor.executemany(
+        "INSERT INTO users (email, password, name, created_at, is_host) VALUES (%s, %s, %s, %s, %s)",
+        [(f"{'host' if i < hosts else 'guest'}{i}@example.com", 'x' * 60, f"User {i}", now, i < hosts)
+         for i in range(hosts * 2)]
+    )
+    cursor.execute("SELECT MIN(id) FROM users")
+    first_user = cursor.fetchone()[0]
+
+    def listing(i):
+        created = now - timedelta(minutes=i)
+        status = rng.choice(('published', 'published', 'published', 'draft', 'archived'))
+        return (first_user + i % hosts, f"Listing {i}", 'A seeded listing.', 'Nairobi', created, created, status,
+                f"{rng.randint(100, 199):05d}", rng.uniform(-1.5, -1.0), rng.uniform(36.6, 37.0))
+
+    stays = [listing(i) + (rng.randint(20, 500), rng.randint(1, 10), rng.randint(1, 5)) for i in range(count)]
+    cursor.executemany("""
+        INSERT INTO stays (host_id, title, description, location_name, created_at, updated_at, status,
+                           zipcode, latitude, longitude, price_per_night, max_guests, bedrooms)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, stays)
+    foods = [listing(i) + (rng.randint(10, 200), 'Local', 'Seeded menu') for i in range(count)]
+    cursor.executemany("""
+        INSERT INTO food_experiences (host_id, title, description, location_name, created_at, updated_at, status,
+                                      zipcode, latitude, longitude, price_per_person, cuisine_type, menu_description)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, foods)
+
+    for table, image_table, key, review_type in (('stays', 'stay_images', 'stay_id', 'stay'),
+                                                 ('food_experiences', 'food_experience_images', 'experience_id', 'food')):
+        cursor.execute(f"SELECT id FROM {table}")
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            f"INSERT INTO {image_table} ({key}, image_path, is_primary, created_at, display_order) VALUES (%s, %s, %s, %s, %s)",
+            [(listing_id, f"{listing_id}-{n}.jpg", n == 0, now, n) for listing_id in ids for n in range(5)]
+        )
+        cursor.executemany(
+            f"INSERT INTO reviews (user_id, {key}, rating, comment, created_at, type) VALUES (%s, %s, %s, %s, %s, %s)",
+            [(first_user + hosts + rng.randrange(hosts), listing_id, rng.randint(1, 5), 'Seeded', now, review_type)
+             for listing_id in ids for _ in range(rng.randint(0, 6))]
+        )
+        if table == 'stays':
+            cursor.execute("SELECT id FROM amenities WHERE type IN ('stay', 'both')")
+            amenities = [row[0] for row in cursor.fetchall()]
+            cursor.executemany(
+                "INSERT INTO stay_amenities (stay_id, amenity_id) VALUES (%s, %s)",
+                [(listing_id, amenity) for listing_id in ids for amenity in rng.sample(amenities, min(3, len(amenities)))]
+            )
+    conn.commit()
+
+    for table in ('users', 'stays', 'food_experiences', 'stay_images', 'food_experience_images',
+                  'reviews', 'stay_amenities', 'amenities'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    print("Seeded and analyzed.")
+
+def print_summary(name, summary):
+    print(name)
+    for table in summary['tables']:
+        covering = ', covering' if table['covering'] else ''
+        print(f"  {table['table']:<24}{table['access'] or '-':<8}{table['key'] or '(no index)':<28}"
+              f"{table['rows'] or 0:>8} rows{covering}")
+    for flag in summary['flags']:
+        print(f"  ! {flag}")
+
+def advise(seed_count=None, update_baseline=False, strict=False, rows_factor=2.0):
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        if seed_count:
+            seed(conn, cursor, seed_count)
+
+        plans = {}
+        for name, (sql, params) in QUERIES.items():
+            plans[name] = explain(cursor, sql, params)
+            print_summary(name, plans[name])
+
+        if update_baseline:
+            with open(BASELINE_FILE, 'w') as f:
+                json.dump(plans, f, indent=2, sort_keys=True)
+            print(f"Baseline written to {BASELINE_FILE}")
+            return True
+
+        problems = []
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                baseline = json.load(f)
+            for name, summary in plans.items():
+                if name in baseline:
+                    problems += regressions(name, summary, baseline[name], rows_factor)
+                else:
+                    print(f"No baseline for {name}; run with --update-baseline to record it")
+        else:
+            print("No baseline yet; run with --update-baseline to record one")
+
+        if strict:
+            problems += [f"{name}: {flag}" for name, summary in plans.items() for flag in summary['flags']]
+
+        if problems:
+            print(f"{len(problems)} plan problems:")
+            for problem in problems:
+                print(f"  {problem}")
+            return False
+        print("No plan regressions.")
+        return True
+
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return False
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the query plans of the app's hot queries")
+    parser.add_argument('--seed', type=int, default=None, metavar='N',
+                        help='first fill an empty database with N stays and N food experiences')
+    parser.add_argument('--update-baseline', action='store_true', help=f'save these plans to {os.path.basename(BASELINE_FILE)}')
+    parser.add_argument('--strict', action='store_true', help='also fail on any full scan, filesort or temporary table')
+    parser.add_argument('--rows-factor', type=float, default=2.0,
+                        help='rows examined may grow this much over the baseline')
+    args = parser.parse_args()
+    sys.exit(0 if advise(args.seed, args.update_baseline, args.strict, args.rows_factor) else 1)
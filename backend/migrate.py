@@ -1,6 +1,21 @@
+"""Apply the versioned migrations in migrations/
+
+Each migration is a file NNNN_name.py with an up(schema) function; see
+utils.migrations.Schema for the helpers it gets. Applied versions and the
+checksums of their files are kept in the schema_migrations table.
+
+Run from the backend directory:
+    python migrate.py status
+    python migrate.py up [--to VERSION] [--dry-run] [--alter-strategy fail|copy|pt-osc]
+    python migrate.py mark VERSION    # record as applied without running it
+"""
+import argparse
 import mysql.connector
 from dotenv import load_dotenv
 import os
+import sys
+
+from utils.migrations import ALTER_STRATEGIES, MigrationError, Migrator
 
 load_dotenv()
 
@@ -11,44 +26,46 @@ DB_CONFIG = {
     'database': os.getenv('MYSQL_DATABASE')
 }
 
-def run_migration():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def run_migrations(args):
     try:
         conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        # Drop food_experience_availability table if it exists
-        cursor.execute("""
-            DROP TABLE IF EXISTS food_experience_availability;
-        """)
-        
-        print("Dropped food_experience_availability table")
-
-        # Remove availability-related columns from food_experiences if they exist
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE()
-            AND table_name = 'food_experiences' 
-            AND column_name = 'availability'
-        """)
-        
-        if cursor.fetchone()[0] > 0:
-            cursor.execute("""
-                ALTER TABLE food_experiences
-                DROP COLUMN availability
-            """)
-            print("Removed availability column from food_experiences")
-
-        conn.commit()
-        print("Migration completed successfully!")
-
-    except mysql.connector.Error as err:
+        migrator = Migrator(conn, MIGRATIONS_DIR, DB_CONFIG)
+
+        if args.command == 'status':
+            migrator.ensure_table()
+            pending = migrator.status()
+            print(f"{len(pending)} pending migrations.")
+        elif args.command == 'up':
+            applied = migrator.up(args.to, dry_run=args.dry_run, alter_strategy=args.alter_strategy,
+                                  lock_wait_timeout=args.lock_wait_timeout)
+            if applied and not args.dry_run:
+                print(f"Applied {len(applied)} migrations.")
+        elif args.command == 'mark':
+            migrator.mark(args.version)
+        return True
+
+    except (mysql.connector.Error, MigrationError) as err:
         print(f"Error: {err}")
+        return False
     finally:
-        if 'cursor' in locals():
-            cursor.close()
         if 'conn' in locals():
             conn.close()
 
 if __name__ == "__main__":
-    run_migration() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Apply database migrations')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='list applied and pending migrations')
+    up = commands.add_parser('up', help='apply pending migrations')
+    up.add_argument('--to', type=int, default=None, help='stop after this version')
+    up.add_argument('--dry-run', action='store_true', help='print changes instead of making them')
+    up.add_argument('--alter-strategy', choices=ALTER_STRATEGIES,
+                    default=os.getenv('MIGRATION_ALTER_STRATEGY', 'fail'),
+                    help="for ALTERs MySQL can't run online (default: fail)")
+    up.add_argument('--lock-wait-timeout', type=int, default=5,
+                    help='seconds each DDL waits for its table lock before retrying')
+    mark = commands.add_parser('mark', help='record a migration as applied without running it')
+    mark.add_argument('version', type=int)
+    args = parser.parse_args()
+    sys.exit(0 if run_migrations(args) else 1)
@@ -0,0 +1,5 @@
+"""Food experiences no longer track availability (was migrate.py)"""
+
+def up(schema):
+    schema.drop_table('food_experience_availability')
+    schema.drop_column('food_experiences', 'availability')
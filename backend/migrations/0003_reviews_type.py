@@ -0,0 +1,4 @@
+"""Reviews say whether they are for a food experience or a stay (was migrate_reviews.py)"""
+
+def up(schema):
+    schema.add_column('reviews', 'type', "ENUM('food', 'stay') NOT NULL DEFAULT 'food'")
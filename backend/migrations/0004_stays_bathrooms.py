@@ -0,0 +1,12 @@
+"""Stays get a bathrooms count (was migrate_bathrooms.py)
+
+Existing stays start with as many bathrooms as bedrooms. The column is
+added without a default so those rows can be told apart, filled in
+primary-key batches rather than one UPDATE that locks every row, and
+only then given its default of 1 for new stays.
+"""
+
+def up(schema):
+    if schema.add_column('stays', 'bathrooms', 'INT DEFAULT NULL'):
+        schema.backfill('stays', 'bathrooms = bedrooms', where='bathrooms IS NULL')
+        schema.alter('stays', 'ALTER COLUMN bathrooms SET DEFAULT 1')
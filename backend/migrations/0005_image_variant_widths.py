@@ -0,0 +1,8 @@
+"""Widths of the thumb/card/full variants generated for each image, e.g. '320 768 1920'
+
+NULL until generated (was migrate_image_variants.py).
+"""
+
+def up(schema):
+    for table in ('food_experience_images', 'stay_images'):
+        schema.add_column(table, 'variant_widths', 'VARCHAR(64) DEFAULT NULL')
@@ -0,0 +1,8 @@
+"""Uploads are shared by content hash; deletes count references by image_path
+
+Was migrate_image_path_index.py.
+"""
+
+def up(schema):
+    for table in ('food_experience_images', 'stay_images'):
+        schema.add_index(table, 'image_path_idx', 'image_path')
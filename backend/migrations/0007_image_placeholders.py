@@ -0,0 +1,10 @@
+"""BlurHash string and '#rrggbb' dominant color, computed once per image
+
+NULL until processed; run backfill_placeholders.py afterwards to fill in
+existing images (was migrate_image_placeholders.py).
+"""
+
+def up(schema):
+    for table in ('food_experience_images', 'stay_images'):
+        schema.add_column(table, 'blurhash', 'VARCHAR(64) DEFAULT NULL')
+        schema.add_column(table, 'dominant_color', 'CHAR(7) DEFAULT NULL')
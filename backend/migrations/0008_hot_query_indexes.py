@@ -0,0 +1,50 @@
+"""Composite and covering indexes for the listing, image and login queries
+
+Listings filter on status, then on price or zipcode, or sort by
+created_at; host dashboards filter on host_id and sort by created_at.
+Image lists are read per listing in display_order, so those indexes
+carry every column the queries select (no row lookups). The login
+lookup is covered too. Indexes these make redundant are dropped after
+their replacements exist; each new one keeps its foreign key column
+first so the constraints stay backed by an index.
+"""
+
+IMAGE_COLUMNS = 'display_order, image_path, variant_widths, blurhash, dominant_color'
+
+ADD = [
+    ('stays', 'status_price_idx', 'status, price_per_night'),
+    ('stays', 'status_created_idx', 'status, created_at'),
+    ('stays', 'status_location_idx', 'status, latitude, longitude'),
+    ('stays', 'host_created_idx', 'host_id, created_at'),
+    ('food_experiences', 'status_price_idx', 'status, price_per_person'),
+    ('food_experiences', 'status_zipcode_idx', 'status, zipcode'),
+    ('food_experiences', 'status_location_idx', 'status, latitude, longitude'),
+    ('food_experiences', 'host_created_idx', 'host_id, created_at'),
+    ('stay_images', 'stay_order_idx', f'stay_id, {IMAGE_COLUMNS}'),
+    ('food_experience_images', 'experience_order_idx', f'experience_id, {IMAGE_COLUMNS}'),
+    ('reviews', 'experience_rating_idx', 'experience_id, rating'),
+    ('reviews', 'stay_rating_idx', 'stay_id, rating'),
+    # SELECT id, email, name, password, is_host FROM users WHERE email = %s
+    ('users', 'login_idx', 'email, password, name, is_host')
+]
+
+# Left-prefixes of the indexes above, or duplicates
+DROP = [
+    ('stays', 'status_idx'),
+    ('stays', 'host_idx'),
+    ('stays', 'location_idx'),
+    ('food_experiences', 'status_idx'),
+    ('food_experiences', 'host_idx'),
+    ('food_experiences', 'location_idx'),
+    ('food_experiences', 'zipcode_idx'),
+    ('reviews', 'idx_experience_reviews'),
+    ('reviews', 'idx_stay_reviews'),
+    # Same as the UNIQUE index on email
+    ('users', 'email_idx')
+]
+
+def up(schema):
+    for table, index, columns in ADD:
+        schema.add_index(table, index, columns)
+    for table, index in DROP:
+        schema.drop_index(table, index)
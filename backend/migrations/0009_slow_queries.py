@@ -0,0 +1,24 @@
+"""Statements recorded by the slow query log when SLOW_QUERY_TABLE=1
+
+One row per slow execution; the plan is EXPLAIN FORMAT=JSON reduced to
+utils.query_plans.plan_summary, and plan_signature its hash, compared per
+fingerprint to spot plan changes.
+"""
+
+def up(schema):
+    schema.create_table('slow_queries', """
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        fingerprint CHAR(16) NOT NULL,
+        normalized_sql TEXT NOT NULL,
+        params TEXT DEFAULT NULL,
+        endpoint VARCHAR(128) DEFAULT NULL,
+        duration_ms DECIMAL(10, 1) NOT NULL,
+        rows_sent INT NOT NULL DEFAULT 0,
+        rows_examined_est BIGINT DEFAULT NULL,
+        plan TEXT DEFAULT NULL,
+        plan_signature CHAR(16) DEFAULT NULL,
+        plan_changed BOOLEAN NOT NULL DEFAULT FALSE,
+        recorded_at DATETIME NOT NULL,
+        INDEX fingerprint_idx (fingerprint, id),
+        INDEX recorded_at_idx (recorded_at)
+    """)
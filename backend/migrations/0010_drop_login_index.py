@@ -0,0 +1,10 @@
+"""Drop the covering login index added in 0008
+
+It copied every password hash into a secondary index to save one row
+lookup on a single-row UNIQUE lookup. Login uses the UNIQUE index on
+email alone. 0008 is left as it ran, since migrate.py refuses edited
+migrations.
+"""
+
+def up(schema):
+    schema.drop_index('users', 'login_idx')
@@ -0,0 +1,242 @@
+"""Re-encode existing uploads and move legacy files into the blob store
+
+Walks every image referenced by food_experience_images, stay_images and
+users.image and brings it up to what /api/upload produces today:
+
+- Legacy uploads (flat names saved before content addressing, often
+  never optimized and with .png/.jpeg extensions for what may be any
+  format) are stored as <sha256>.jpg blobs, optimized, given variants and
+  a placeholder, and every row pointing at the old name is switched to
+  the new one in a single transaction. The old file is deleted once no
+  row references it.
+- Blobs that were never processed (no variants) are processed in place.
+- Blobs with variants but no metadata file just get their metadata.
+
+Work runs in a process pool at low CPU priority, with at most
+--io-limit MB/s read plus written. Finished names are appended to a
+checkpoint file, so an interrupted run picks up where it stopped;
+failures are not checkpointed and are retried on the next run.
+
+Run from the backend directory:
+    python reencode_uploads.py [--workers N] [--io-limit MB/s] [--dry-run] [--restart]
+"""
+import argparse
+import json
+import mysql.connector
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+import os
+import time
+
+from utils.blob_store import is_blob, storage_path, store as store_blob, remove as remove_upload
+from utils.image_variants import (
+    VARIANTS_DIR, METADATA_FILE, process_upload, read_variant_widths, save_image_metadata, format_widths
+)
+from utils.placeholders import compute_placeholder
+from utils.storage import require_local_storage
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER'),
+    'password': os.getenv('MYSQL_PASSWORD'),
+    'database': os.getenv('MYSQL_DATABASE')
+}
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+CHECKPOINT_FILE = os.path.join(UPLOAD_FOLDER, '.reencode-checkpoint')
+IMAGE_TABLES = ('food_experience_images', 'stay_images')
+MiB = 1024 * 1024
+
+def _lower_priority():
+    # Leave the CPU to the web workers
+    os.nice(10)
+
+def _is_processed(path, name):
+    return os.path.exists(os.path.join(os.path.dirname(path), VARIANTS_DIR, name, METADATA_FILE))
+
+def reencode(name, defer=True):
+    """Pool task: bring one upload up to date; returns a result dict
+
+    'name' is the referenced name and 'new_name' what rows should point at
+    afterwards. 'before'/'after' are the bytes on disk it took before and
+    takes after. With
+    defer, a legacy file whose blob another task created but hasn't
+    processed yet comes back with 'deferred' set instead, so identical
+    files are never processed twice at once.
+    """
+    path = os.path.join(UPLOAD_FOLDER, storage_path(name))
+    before = os.path.getsize(path)
+
+    if not is_blob(name):
+        # Hash the file as uploaded, like /api/upload; the optimized
+        # output is always JPEG, so the blob gets a .jpg name
+        with open(path, 'rb') as f:
+            new_name, created = store_blob(UPLOAD_FOLDER, f, 'jpg')
+        new_path = os.path.join(UPLOAD_FOLDER, storage_path(new_name))
+        if _is_processed(new_path, new_name):
+            # Processed by an earlier, interrupted run or a duplicate
+            with open(os.path.join(os.path.dirname(new_path), VARIANTS_DIR, new_name, METADATA_FILE)) as f:
+                metadata = json.load(f)
+        elif defer and not created:
+            return {'name': name, 'new_name': new_name, 'deferred': True}
+        else:
+            metadata = process_upload(new_path)
+        # A duplicate adds nothing on disk; it shares the existing blob
+        return {'name': name, 'new_name': new_name, 'before': before,
+                'after': os.path.getsize(new_path) if created else 0, 'metadata': metadata}
+
+    folder = os.path.dirname(path)
+    widths = read_variant_widths(folder, name)
+    if widths:
+        # Already optimized when its variants were made; don't re-encode
+        metadata = {'widths': widths, **compute_placeholder(path)}
+        save_image_metadata(folder, name, metadata)
+    else:
+        metadata = process_upload(path)
+    return {'name': name, 'new_name': name, 'before': before,
+            'after': os.path.getsize(path), 'metadata': metadata}
+
+def referenced_images(cursor):
+    names = set()
+    for table in IMAGE_TABLES:
+        cursor.execute(f"SELECT DISTINCT image_path FROM {table}")
+        names.update(row[0] for row in cursor.fetchall())
+    cursor.execute("SELECT DISTINCT image FROM users WHERE image IS NOT NULL AND image != ''")
+    names.update(row[0] for row in cursor.fetchall())
+    return {name for name in names if name}
+
+def needs_work(name):
+    path = os.path.join(UPLOAD_FOLDER, storage_path(name))
+    return not is_blob(name) or not _is_processed(path, name)
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_FILE) as f:
+            return {json.loads(line)['name'] for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+def save_result(conn, cursor, result):
+    """Point every row at the processed image, in one transaction"""
+    name, new_name = result['name'], result['new_name']
+    metadata = result['metadata']
+    widths = metadata.get('widths')
+    columns = (format_widths(widths) if widths else None, metadata.get('blurhash'), metadata.get('dominant_color'))
+    for table in IMAGE_TABLES:
+        cursor.execute(f"""
+            UPDATE {table}
+            SET image_path = %s, variant_widths = %s, blurhash = %s, dominant_color = %s
+            WHERE image_path = %s
+        """, (new_name, *columns, name))
+    if new_name != name:
+        cursor.execute("UPDATE users SET image = %s WHERE image = %s", (new_name, name))
+    conn.commit()
+
+def still_referenced(cursor, name):
+    cursor.execute("""
+        SELECT EXISTS(SELECT 1 FROM food_experience_images WHERE image_path = %s)
+            OR EXISTS(SELECT 1 FROM stay_images WHERE image_path = %s)
+            OR EXISTS(SELECT 1 FROM users WHERE image = %s)
+    """, (name, name, name))
+    return bool(cursor.fetchone()[0])
+
+def reencode_uploads(workers=None, io_limit=None, dry_run=False, restart=False):
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        if restart and os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+        done = load_checkpoint()
+        names = sorted(
+            name for name in referenced_images(cursor) - done
+            if os.path.exists(os.path.join(UPLOAD_FOLDER, storage_path(name))) and needs_work(name)
+        )
+        legacy = sum(1 for name in names if not is_blob(name))
+        print(f"{len(names)} images to process ({legacy} legacy), {len(done)} already checkpointed")
+        if dry_run:
+            for name in names:
+                print(f"  {name}")
+            return
+
+        processed = failed = 0
+        bytes_before = bytes_after = io_bytes = 0
+        start = time.monotonic()
+        workers = workers or os.cpu_count() or 1
+        pending = iter((name, True) for name in names)
+        deferred = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) as pool, \
+                open(CHECKPOINT_FILE, 'a') as checkpoint:
+            # Keep a small window in flight so the I/O limit paces submission
+            in_flight = set()
+            while True:
+                for task in pending:
+                    in_flight.add(pool.submit(reencode, *task))
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    if not deferred:
+                        break
+                    # Duplicates of files processed in the first pass
+                    pending = iter((name, False) for name in deferred)
+                    deferred = []
+                    continue
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        result = future.result()
+                        if result.get('deferred'):
+                            deferred.append(result['name'])
+                            continue
+                        save_result(conn, cursor, result)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Failed: {e}")
+                        failed += 1
+                        continue
+
+                    name, new_name = result['name'], result['new_name']
+                    if new_name != name and not still_referenced(cursor, name):
+                        remove_upload(UPLOAD_FOLDER, name)
+                    checkpoint.write(json.dumps({'name': name, 'new_name': new_name}) + '\n')
+                    checkpoint.flush()
+
+                    processed += 1
+                    bytes_before += result['before']
+                    bytes_after += result['after']
+                    io_bytes += result['before'] + result['after']
+                    arrow = f" -> {new_name}" if new_name != name else ''
+                    print(f"  {name}{arrow}: {result['before'] / 1024:.0f} KiB -> {result['after'] / 1024:.0f} KiB")
+
+                if io_limit:
+                    # Sleep off any lead over the allowed rate
+                    ahead = io_bytes / (io_limit * MiB) - (time.monotonic() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+        elapsed = max(time.monotonic() - start, 1e-9)
+        saved = bytes_before - bytes_after
+        print(f"Re-encode complete: {processed} processed, {failed} failed in {elapsed:.1f}s")
+        print(f"  {bytes_before / MiB:.1f} MiB -> {bytes_after / MiB:.1f} MiB, saved {saved / MiB:.1f} MiB "
+              f"({saved / bytes_before * 100 if bytes_before else 0:.0f}%)")
+        print(f"  {processed / elapsed:.1f} images/s, {bytes_before / MiB / elapsed:.1f} MiB/s read")
+
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    require_local_storage('reencode_uploads.py')
+    parser = argparse.ArgumentParser(description='Re-encode existing uploads')
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: CPU count)')
+    parser.add_argument('--io-limit', type=float, default=None, help='MB/s read plus written')
+    parser.add_argument('--dry-run', action='store_true', help='list the images that would be processed')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    args = parser.parse_args()
+    reencode_uploads(args.workers, args.io_limit, args.dry_run, args.restart)
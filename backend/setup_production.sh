@@ -17,6 +17,32 @@ chmod 755 /home/app/fiat/backend/static
 echo "FLASK_ENV=production" >> /etc/environment
 echo "BASE_URL=http://167.99.157.245" >> /etc/environment
 
+# Let nginx send uploads and default images itself: Flask resolves the path
+# and answers with X-Accel-Redirect to these internal locations.
+# Include the snippet in the site's server block:
+#     include snippets/fiat-uploads.conf;
+mkdir -p /etc/nginx/snippets
+cat > /etc/nginx/snippets/fiat-uploads.conf <<'NGINX'
+location /_uploads/ {
+    internal;
+    alias /home/app/fiat/backend/uploads/;
+    sendfile on;
+    tcp_nopush on;
+}
+
+location /_static/ {
+    internal;
+    alias /home/app/fiat/backend/static/;
+    sendfile on;
+}
+NGINX
+echo "UPLOAD_SERVE_MODE=accel" >> /etc/environment
+
+# Sweep unreferenced uploads nightly, at most 20 deletions a second
+cat > /etc/cron.d/fiat-uploads-gc <<'CRON'
+30 3 * * * www-data cd /home/app/fiat/backend && python3 gc_uploads.py --rate 20 >> /var/log/fiat-uploads-gc.log 2>&1
+CRON
+
 # Restart nginx and your Flask application
 systemctl restart nginx
 # Replace 'your-flask-service' with your actual service name
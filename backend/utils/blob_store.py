@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from utils.image_variants import VARIANTS_DIR
+
+BLOBS_DIR = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+_EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+class ChecksumMismatch(ValueError):
+    """Raised by store() when the content doesn't hash to the expected digest"""
+
+
+def is_blob(name):
+    """True for content-addressed names (<sha256>.<ext>)"""
+    return bool(_BLOB_NAME.match(name))
+
+
+def blob_filename(digest, ext):
+    """Blob name for content with this SHA-256 hex digest, uploaded as ext"""
+    ext = ext.lower().lstrip('.')
+    return f"{digest.lower()}.{_EXTENSION_ALIASES.get(ext, ext)}"
+
+
+def blob_dir(name):
+    """Shard directory for a blob, two levels deep: blobs/ab/cd"""
+    return f"{BLOBS_DIR}/{name[:2]}/{name[2:4]}"
+
+
+def blob_name(path):
+    """Blob a path under /uploads belongs to (the blob or one of its variants), or None"""
+    parts = path.split('/')
+    if len(parts) == 1 and is_blob(path):
+        return path
+    if len(parts) == 3 and parts[0] == VARIANTS_DIR and is_blob(parts[1]):
+        return parts[1]
+    return None
+
+
+def storage_path(path):
+    """Where a path served under /uploads lives, relative to the upload folder
+
+    URLs and the image tables use the flat blob name; on disk blobs are
+    sharded, with their variants stored beside them. Legacy uploads and
+    anything else map to themselves.
+    """
+    name = blob_name(path)
+    return f"{blob_dir(name)}/{path}" if name else path
+
+
+def store(upload_folder, stream, ext, expected=None):
+    """Write an uploaded stream into the store, returning (name, created)
+
+    The name is the SHA-256 of the uploaded bytes. When an identical upload
+    already exists the new copy is discarded and created is False. If an
+    expected hex digest is given and doesn't match, nothing is stored and
+    ChecksumMismatch is raised.
+    """
+    tmp_dir = os.path.join(upload_folder, BLOBS_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        os.chmod(tmp_path, 0o644)
+
+        if expected is not None and digest.hexdigest() != expected.lower():
+            raise ChecksumMismatch(f"SHA-256 is {digest.hexdigest()}, expected {expected}")
+
+        name = blob_filename(digest.hexdigest(), ext)
+        path = os.path.join(upload_folder, storage_path(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # link() fails if the blob exists, so concurrent identical
+            # uploads can't both think they created it
+            os.link(tmp_path, path)
+            created = True
+        except FileExistsError:
+            # Restart the grace period so a concurrent release() keeps it
+            os.utime(path)
+            created = False
+        return name, created
+    finally:
+        os.remove(tmp_path)
+
+
+def remove(upload_folder, name, grace=0):
+    """Delete an upload and its variants; the caller checks it is unreferenced
+
+    Files stored or re-uploaded within the last `grace` seconds are kept,
+    since a row referencing them may be about to be inserted. Returns
+    whether the file was removed.
+    """
+    path = os.path.join(upload_folder, storage_path(name))
+    try:
+        if time.time() - os.path.getmtime(path) < grace:
+            return False
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    shutil.rmtree(os.path.join(os.path.dirname(path), VARIANTS_DIR, name), ignore_errors=True)
+    return True
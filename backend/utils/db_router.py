@@ -0,0 +1,201 @@
+import itertools
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+from flask import has_request_context, request
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def parse_replicas(value, primary_config):
+    """Connection configs from MYSQL_REPLICAS, e.g. "10.0.0.2,10.0.0.3:3307"
+
+    Replicas take the primary's user, password and database.
+    """
+    configs = []
+    for address in value.split(','):
+        address = address.strip()
+        if not address:
+            continue
+        host, _, port = address.partition(':')
+        config = dict(primary_config, host=host)
+        if port:
+            config['port'] = int(port)
+        configs.append(config)
+    return configs
+
+
+class Replica:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.pool = None
+        # Skipped until this time after a failed connect or too much lag
+        self.down_until = 0
+        self.lag = None
+        self.lag_checked = 0
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """Sends read-only requests to replicas, everything else to the primary
+
+    Handlers that only read ask for a replica connection; replicas are
+    used in turn, and one that can't be reached, or whose replication lag
+    exceeds max_lag seconds (checked every lag_check seconds; needs the
+    REPLICATION CLIENT privilege), is skipped for retry_after seconds.
+    With no replica available, reads go to the primary.
+
+    Read your writes: a successful POST/PUT/PATCH/DELETE sets a cookie
+    that keeps that client's reads on the primary for sticky_seconds, so a
+    host sees their own changes (e.g. on the dashboard) even while the
+    replicas catch up. sticky_seconds should be above the usual lag; the
+    lag check keeps replicas further behind than max_lag out of rotation.
+
+    make_pool(name, config) creates the connection pool for a replica.
+    """
+
+    def __init__(self, replicas, make_pool, sticky_seconds=10, max_lag=None,
+                 lag_check=5, retry_after=30, cookie='db_primary_until', secure_cookie=False):
+        self.replicas = [Replica(f"replica{index}", config) for index, config in enumerate(replicas, 1)]
+        self.make_pool = make_pool
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = sticky_seconds if max_lag is None else max_lag
+        self.lag_check = lag_check
+        self.retry_after = retry_after
+        self.cookie = cookie
+        self.secure_cookie = secure_cookie
+        self.sticky_reads = 0
+        self.primary_fallbacks = 0
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self._stick)
+
+    def _stick(self, response):
+        if self.replicas and request.method not in READ_METHODS and response.status_code < 400:
+            until = int(time.time() + self.sticky_seconds)
+            response.set_cookie(self.cookie, str(until), max_age=self.sticky_seconds,
+                                httponly=True, samesite='Lax', secure=self.secure_cookie)
+        return response
+
+    def sticky(self):
+        """Whether this request's client wrote recently"""
+        try:
+            until = int(request.cookies.get(self.cookie, 0))
+        except ValueError:
+            return False
+        now = time.time()
+        # A value further out than one window wasn't set by us
+        return now < until <= now + self.sticky_seconds + 1
+
+    def connection(self):
+        """A replica connection for a read-only request, or None to use the primary"""
+        if not self.replicas or not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if self.sticky():
+            self.sticky_reads += 1
+            return None
+
+        start = next(self._turn)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.down_until > time.time():
+                continue
+            conn = self._connect(replica)
+            if conn is not None:
+                replica.reads += 1
+                return conn
+        self.primary_fallbacks += 1
+        return None
+
+    def _connect(self, replica):
+        try:
+            if replica.pool is None:
+                with self._lock:
+                    if replica.pool is None:
+                        replica.pool = self.make_pool(replica.name, replica.config)
+            try:
+                conn = replica.pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                # Pool exhausted, fall back to a one-off connection
+                conn = mysql.connector.connect(**replica.config)
+        except mysql.connector.Error as err:
+            self._down(replica, err)
+            return None
+
+        try:
+            if self.lag_check is not None and time.time() - replica.lag_checked >= self.lag_check:
+                if not self._lag_ok(replica, conn):
+                    conn.close()
+                    return None
+        except mysql.connector.Error as err:
+            try:
+                conn.close()
+            except mysql.connector.Error:
+                pass
+            self._down(replica, err)
+            return None
+        return conn
+
+    def _down(self, replica, err):
+        replica.failures += 1
+        replica.down_until = time.time() + self.retry_after
+        print(f"Warning: {replica.name} ({replica.config['host']}) unavailable, "
+              f"reading from the primary for {self.retry_after}s: {err}")
+
+    def _lag_ok(self, replica, conn):
+        replica.lag_checked = time.time()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.errors.ProgrammingError as err:
+                if err.errno != errorcode.ER_PARSE_ERROR:
+                    raise
+                # Before MySQL 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            channels = cursor.fetchall()
+        except mysql.connector.errors.ProgrammingError as err:
+            if err.errno != errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR:
+                raise
+            print(f"Warning: can't check replica lag without the REPLICATION CLIENT privilege, "
+                  f"relying on the {self.sticky_seconds}s read-your-writes window alone")
+            self.lag_check = None
+            return True
+        finally:
+            cursor.close()
+        if not channels:
+            # Not replicating (e.g. a local stand-in): nothing to lag behind
+            replica.lag = 0
+            return True
+
+        # NULL while a channel's SQL thread isn't running
+        lags = [status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master')) for status in channels]
+        replica.lag = None if None in lags else max(lags)
+        if replica.lag is None or replica.lag > self.max_lag:
+            replica.down_until = time.time() + self.retry_after
+            print(f"Warning: {replica.name} lag is {replica.lag}s (max {self.max_lag}s), "
+                  f"skipping it for {self.retry_after}s")
+            return False
+        return True
+
+    def stats(self):
+        now = time.time()
+        return {
+            'sticky_seconds': self.sticky_seconds,
+            'sticky_reads': self.sticky_reads,
+            'primary_fallbacks': self.primary_fallbacks,
+            'replicas': [{
+                'name': replica.name,
+                'host': replica.config['host'],
+                'up': replica.down_until <= now,
+                'lag': replica.lag,
+                'reads': replica.reads,
+                'failures': replica.failures
+            } for replica in self.replicas]
+        }
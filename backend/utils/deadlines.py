@@ -0,0 +1,204 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+import mysql.connector
+from flask import g, has_request_context, make_response, request
+from mysql.connector import errorcode
+
+from utils.serialization import jsonify
+
+# Leading SELECT, and the optimizer hint comment right after it if any;
+# MySQL reads only one hint comment per query block, so ours joins it
+_SELECT = re.compile(r'^(\s*SELECT\s+)(/\*\+)?', re.I)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Time budget of one request"""
+
+    def __init__(self, ms):
+        self.ms = ms
+        self.expires = time.monotonic() + ms / 1000
+        self.exceeded = False
+        self.partial = False
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def check(self):
+        if self.remaining() <= 0:
+            self.exceeded = True
+            raise DeadlineExceeded(f"Deadline of {self.ms}ms exceeded")
+
+    def hint(self, sql):
+        """sql with a MAX_EXECUTION_TIME hint if it's a SELECT
+
+        The hint carries the route's whole budget rather than what's left,
+        so the statement text stays the same and prepared statements are
+        reused; check() before each statement keeps the total in bounds.
+        """
+        if not isinstance(sql, str):
+            return sql
+        match = _SELECT.match(sql)
+        if match is None:
+            return sql
+        hint = f"MAX_EXECUTION_TIME({self.ms})"
+        if match.group(2):
+            return f"{sql[:match.end()]} {hint}{sql[match.end():]}"
+        return f"{match.group(1)}/*+ {hint} */ {sql[match.end():]}"
+
+    @contextmanager
+    def translate(self):
+        """Turn the server stopping a statement at its time limit into DeadlineExceeded"""
+        try:
+            yield
+        except mysql.connector.Error as err:
+            if err.errno != errorcode.ER_QUERY_TIMEOUT:
+                raise
+            self.exceeded = True
+            raise DeadlineExceeded(f"Statement stopped by MAX_EXECUTION_TIME({self.ms})") from err
+
+
+class DeadlineCursor:
+    """Cursor proxy enforcing the request's Deadline on every statement"""
+
+    def __init__(self, cursor, deadline):
+        self._cursor = cursor
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._deadline.check()
+        with self._deadline.translate():
+            return self._cursor.execute(self._deadline.hint(operation), params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._deadline.check()
+        with self._deadline.translate():
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        with self._deadline.translate():
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with self._deadline.translate():
+            return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with self._deadline.translate():
+            return self._cursor.fetchall()
+
+
+class DeadlineConnection:
+    """Connection proxy whose cursors are DeadlineCursors"""
+
+    def __init__(self, conn, deadline):
+        self._conn = conn
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return DeadlineCursor(self._conn.cursor(*args, **kwargs), self._deadline)
+
+    def wrap_cursor(self, cursor):
+        return DeadlineCursor(cursor, self._deadline)
+
+
+class Deadlines:
+    """Per-route time budgets for database work
+
+    A route decorated with limit(ms) gets a Deadline. Connections handed
+    out through wrap() during the request add a MAX_EXECUTION_TIME hint
+    to every SELECT, so MySQL stops a runaway statement itself, and
+    refuse to start a statement once the budget is spent. Either way the
+    route answers 503 with Retry-After instead of holding a worker and a
+    connection; a handler that can still return something useful catches
+    DeadlineExceeded and calls partial(), which sends what it has with an
+    X-Partial-Result header.
+
+    overrides maps endpoint names to budgets in ms, replacing the ones in
+    the code (see DEADLINES_MS); a budget of 0 turns the limit off.
+    """
+
+    def __init__(self, overrides=None, retry_after=2):
+        self.overrides = overrides or {}
+        self.retry_after = retry_after
+        self.requests = Counter()
+        self.timeouts = Counter()
+        self.partials = Counter()
+
+    def limit(self, ms):
+        def decorator(f):
+            budget = self.overrides.get(f.__name__, ms)
+
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if not budget:
+                    return f(*args, **kwargs)
+                deadline = g.deadline = Deadline(budget)
+                self.requests[request.endpoint] += 1
+                try:
+                    response = f(*args, **kwargs)
+                except DeadlineExceeded:
+                    response = None
+                if deadline.partial and response is not None:
+                    self.partials[request.endpoint] += 1
+                    response = make_response(response)
+                    response.headers['X-Partial-Result'] = 'true'
+                elif deadline.exceeded:
+                    self.timeouts[request.endpoint] += 1
+                    print(f"Warning: {request.method} {request.path} exceeded its {budget}ms deadline")
+                    response = make_response(jsonify({'message': 'The request took too long, please try again'}), 503)
+                    response.headers['Retry-After'] = str(self.retry_after)
+                return response
+
+            return decorated
+        return decorator
+
+    def wrap(self, conn):
+        deadline = g.get('deadline') if has_request_context() else None
+        return DeadlineConnection(conn, deadline) if deadline is not None else conn
+
+    def partial(self):
+        """Mark this request's response as a partial result after DeadlineExceeded"""
+        g.deadline.partial = True
+
+    def check(self):
+        """Raise DeadlineExceeded if this request's budget is spent (for long Python loops)"""
+        deadline = g.get('deadline')
+        if deadline is not None:
+            deadline.check()
+
+    def stats(self):
+        return {
+            endpoint: {
+                'requests': count,
+                'timeouts': self.timeouts[endpoint],
+                'partials': self.partials[endpoint]
+            }
+            for endpoint, count in self.requests.items()
+        }
+
+
+def parse_overrides(value):
+    """{endpoint: ms} from DEADLINES_MS, e.g. "get_stays=3000,get_nearby_listings=0" """
+    overrides = {}
+    for item in value.split(','):
+        endpoint, _, ms = item.partition('=')
+        if endpoint.strip() and ms.strip():
+            overrides[endpoint.strip()] = int(ms)
+    return overrides
@@ -0,0 +1,44 @@
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import safe_join
+
+SERVE_MODES = ('direct', 'accel', 'sendfile')
+
+
+class FileServer:
+    """Sends files from known directories, optionally through the front proxy
+
+    'direct' streams from Python with Range and conditional request support
+    (and the server's sendfile via wsgi.file_wrapper). 'sendfile' sets
+    X-Sendfile with the absolute path (Apache, lighttpd). 'accel' sets
+    nginx's X-Accel-Redirect to the directory's internal location, so the
+    bytes never pass through a Python worker; nginx then handles Range,
+    ETag and If-Modified-Since itself.
+    """
+
+    def __init__(self, mode='direct', locations=None):
+        if mode not in SERVE_MODES:
+            raise ValueError(f"Unknown serve mode: {mode}")
+        self.mode = mode
+        # directory -> internal nginx location prefix, for 'accel'
+        self.locations = locations or {}
+
+    def init_app(self, app):
+        if self.mode == 'sendfile':
+            app.config['USE_X_SENDFILE'] = True
+
+    def send(self, directory, path, mimetype=None):
+        """Response for path inside directory; raises NotFound for unsafe paths"""
+        if self.mode != 'accel' or directory not in self.locations:
+            # Flask 2.0's add_etags default suppresses ETags unless asked
+            return send_from_directory(directory, path, mimetype=mimetype, etag=True, conditional=True)
+
+        if safe_join(directory, path) is None:
+            raise NotFound()
+        response = current_app.response_class(
+            mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = self.locations[directory] + quote(path)
+        return response
@@ -0,0 +1,222 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+from utils.images import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class ResizeCache:
+    """Disk cache of on-demand resized images, bounded by total bytes
+
+    Entries live at <root>/<w>x<h>/<filename>. When a store pushes the
+    total over max_bytes, entries are evicted least recently used first
+    ('lru') or least frequently used first ('lfu'). Rendering holds a
+    per-entry lock (thread lock plus flock across processes) so concurrent
+    requests for the same variant render it once.
+
+    The byte total is tracked per process, from what that process has
+    rendered or found at startup, so between full passes N worker
+    processes can grow the directory to about N * max_bytes.
+    enforce_budget() (cleanup_thumbnails) rescans the directory first and
+    brings the whole of it back under max_bytes; entries rendered by
+    other processes count as least recently used.
+    """
+
+    def __init__(self, root, max_bytes, policy='lru'):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._entries = OrderedDict()  # relpath -> [size, hits], oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+        self._render_locks = {}  # relpath -> [lock, threads using it]
+        self._scan()
+
+    def _walk(self):
+        """(mtime, relpath, size) of every entry on disk"""
+        found = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.startswith('.'):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:  # Evicted by another process meanwhile
+                        continue
+                    relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    found.append((stat.st_mtime, relpath, stat.st_size))
+        return found
+
+    def _scan(self):
+        """Index what's already on disk, oldest modification first"""
+        for _, relpath, size in sorted(self._walk()):
+            self._entries[relpath] = [size, 0]
+            self._total += size
+
+    def _sync(self):
+        """Bring the index in line with the disk, which other processes write to too"""
+        found = {relpath: (mtime, size) for mtime, relpath, size in self._walk()}
+        with self._lock:
+            for relpath in [relpath for relpath in self._entries if relpath not in found]:
+                self._total -= self._entries.pop(relpath)[0]
+            new = sorted((mtime, relpath, size) for relpath, (mtime, size) in found.items()
+                         if relpath not in self._entries)
+            # Newest first onto the front, leaving them oldest first ahead of ours
+            for _, relpath, size in reversed(new):
+                self._entries[relpath] = [size, 0]
+                self._entries.move_to_end(relpath, last=False)
+                self._total += size
+
+    @staticmethod
+    def key(width, height, filename):
+        return f"{width}x{height}/{filename}"
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def _touch(self, relpath):
+        with self._lock:
+            entry = self._entries.get(relpath)
+            if entry is None:
+                return False
+            entry[1] += 1
+            self._entries.move_to_end(relpath)
+            return True
+
+    def _add(self, relpath, size):
+        with self._lock:
+            old = self._entries.pop(relpath, None)
+            if old:
+                self._total -= old[0]
+            self._entries[relpath] = [size, 1]
+            self._total += size
+            victims = self._select_victims(keep=relpath)
+        for victim in victims:
+            self._remove_file(victim)
+
+    def _select_victims(self, keep=None):
+        # Caller holds self._lock
+        if self._total <= self.max_bytes:
+            return []
+        if self.policy == 'lfu':
+            # Ties go to the least recently used entry
+            order = sorted(self._entries, key=lambda relpath: self._entries[relpath][1])
+        else:
+            order = list(self._entries)
+        victims = []
+        for relpath in order:
+            if self._total <= self.max_bytes:
+                break
+            if relpath == keep:
+                continue
+            self._total -= self._entries.pop(relpath)[0]
+            victims.append(relpath)
+        return victims
+
+    def _remove_file(self, relpath):
+        try:
+            os.remove(os.path.join(self.root, relpath))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error evicting cached image {relpath}: {e}")
+
+    def enforce_budget(self, max_bytes=None):
+        """Evict until the cache fits max_bytes (defaults to the configured budget)"""
+        self._sync()
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            victims = self._select_victims()
+        for victim in victims:
+            self._remove_file(victim)
+        return victims
+
+    def discard(self, filename):
+        """Drop every cached size of filename, e.g. once the original is deleted"""
+        # Check the disk, not just the index: other processes may have
+        # rendered sizes this one hasn't seen
+        sizes = os.listdir(self.root) if os.path.isdir(self.root) else []
+        victims = [f"{size}/{filename}" for size in sizes]
+        with self._lock:
+            for relpath in victims:
+                entry = self._entries.pop(relpath, None)
+                if entry:
+                    self._total -= entry[0]
+        for victim in victims:
+            self._remove_file(victim)
+
+    def _acquire_render_lock(self, relpath):
+        with self._lock:
+            entry = self._render_locks.get(relpath)
+            if entry is None:
+                entry = self._render_locks[relpath] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _release_render_lock(self, relpath):
+        # Dropped only once no thread holds or waits on it, so a late
+        # arrival can't create a second lock for the same entry
+        with self._lock:
+            entry = self._render_locks[relpath]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._render_locks[relpath]
+
+    def get(self, source_path, width, height, load=None):
+        """Return the cached path for source_path resized to fit width x height
+
+        Renders and stores the variant on a miss. If given, load() is called
+        on a miss for the image to render (a path or file object), e.g. to
+        fetch it from remote storage; source_path then only names the entry.
+        """
+        relpath = self.key(width, height, os.path.basename(source_path))
+        path = os.path.join(self.root, relpath)
+        if self._touch(relpath) and os.path.exists(path):
+            return path
+
+        lock = self._acquire_render_lock(relpath)
+        try:
+            with lock:
+                directory, filename = os.path.split(path)
+                os.makedirs(directory, exist_ok=True)
+                lock_file = None
+                try:
+                    if fcntl:
+                        # Dot-prefixed so _scan never indexes it. Left in
+                        # place afterwards: removing it would let another
+                        # process lock a new file while one still holds this
+                        lock_file = open(os.path.join(directory, f".{filename}.lock"), 'w')
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    # Another thread or process may have rendered it meanwhile
+                    if not os.path.exists(path):
+                        render(load() if load else source_path, path, width, height)
+                finally:
+                    if lock_file:
+                        lock_file.close()
+                self._add(relpath, os.path.getsize(path))
+        finally:
+            self._release_render_lock(relpath)
+        return path
+
+
+def render(source_path, target_path, width, height):
+    """Resize source_path (or an open file) to fit within width x height and write it atomically"""
+    with Image.open(source_path) as img:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        img.draft('RGB', (width, height))
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail((width, height), Image.Resampling.LANCZOS)
+        atomic_write(target_path, lambda f: img.save(f, format='JPEG', quality=85, optimize=True))
@@ -0,0 +1,176 @@
+import json
+import os
+from PIL import Image, features
+
+from utils.images import atomic_write, optimize_file
+from utils.placeholders import compute_placeholder
+
+# Named widths generated for every upload, smallest first. Images narrower
+# than a width get that variant at their own width instead of upscaled.
+VARIANT_WIDTHS = {
+    'thumb': 320,
+    'card': 768,
+    'full': 1920
+}
+
+# Preferred first; AVIF needs Pillow 11.2+ (the pinned wheels bundle libavif)
+VARIANT_FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)] + ['jpeg']
+
+FORMAT_EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+FORMAT_MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 60, 'speed': 6},
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True}
+}
+
+VARIANTS_DIR = 'variants'
+# Written beside the variants: {'widths': [...], 'blurhash': ..., 'dominant_color': ...}
+METADATA_FILE = 'image.json'
+
+
+def variant_path(filename, name, fmt):
+    """Relative path of a variant inside the upload folder
+
+    Deterministic, so URLs can be built from the image row alone:
+    variants/<original filename>/<name>.<ext>
+    """
+    return f"{VARIANTS_DIR}/{filename}/{name}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def variant_widths(source_width):
+    """Actual width of each named variant for an image source_width pixels wide"""
+    return [min(width, source_width) for width in VARIANT_WIDTHS.values()]
+
+
+def generate_variants(path, formats=None):
+    """Write every named variant of the image at path in each format
+
+    Returns the variant widths in VARIANT_WIDTHS order; the same widths
+    apply to every format.
+    """
+    formats = formats or VARIANT_FORMATS
+    upload_folder, filename = os.path.split(path)
+    os.makedirs(os.path.join(upload_folder, VARIANTS_DIR, filename), exist_ok=True)
+
+    with Image.open(path) as source:
+        img = source.convert('RGB') if source.mode not in ('RGB', 'L') else source
+        widths = variant_widths(img.width)
+        # Largest first so each step downsamples an already smaller image
+        for name, width in reversed(list(zip(VARIANT_WIDTHS, widths))):
+            if width < img.width:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                target = os.path.join(upload_folder, variant_path(filename, name, fmt))
+                atomic_write(target, lambda f: img.save(f, format=fmt.upper(), **SAVE_OPTIONS[fmt]))
+    return widths
+
+
+def process_upload(path):
+    """Image worker task: optimize the upload in place, then build its variants
+
+    Returns the image's metadata (variant widths, BlurHash and dominant
+    color), which is also saved beside the variants for image rows that
+    are inserted after the job finished.
+    """
+    optimize_file(path)
+    metadata = {'widths': generate_variants(path), **compute_placeholder(path)}
+    save_image_metadata(*os.path.split(path), metadata)
+    return metadata
+
+
+def parse_widths(value):
+    """Parse the variant_widths column ('320 768 1920') into ints"""
+    return [int(width) for width in value.split()] if value else []
+
+
+def format_widths(widths):
+    return ' '.join(str(width) for width in widths)
+
+
+def build_srcset(filename, widths, url_for):
+    """Map each format to a srcset string, e.g. {'webp': '/u/a 320w, /u/b 768w'}"""
+    if not widths:
+        return None
+    # Small originals repeat the same width under several names; list it once
+    candidates = {}
+    for name, width in zip(VARIANT_WIDTHS, widths):
+        candidates.setdefault(width, name)
+    return {
+        fmt: ', '.join(
+            f"{url_for(variant_path(filename, name, fmt))} {width}w"
+            for width, name in candidates.items()
+        )
+        for fmt in VARIANT_FORMATS
+    }
+
+
+def negotiate(filename, accept, exists):
+    """Pick the best stored variant for a request, based on its Accept header
+
+    filename is the requested path relative to the upload folder: either an
+    original upload (served as its 'full' variant) or a JPEG variant (served
+    as the same variant in a better format). exists(path) checks the store.
+    Returns (path, mimetype) or None to serve the file as requested.
+    """
+    accept = accept or ''
+    candidates = [fmt for fmt in VARIANT_FORMATS if fmt != 'jpeg' and FORMAT_MIMETYPES[fmt] in accept]
+    if not candidates:
+        return None
+
+    parts = filename.split('/')
+    if len(parts) == 3 and parts[0] == VARIANTS_DIR:
+        original = parts[1]
+        name, _, ext = parts[2].partition('.')
+        if ext != FORMAT_EXTENSIONS['jpeg'] or name not in VARIANT_WIDTHS:
+            return None
+    elif len(parts) == 1:
+        original, name = filename, 'full'
+    else:
+        return None
+
+    for fmt in candidates:
+        path = variant_path(original, name, fmt)
+        if exists(path):
+            return path, FORMAT_MIMETYPES[fmt]
+    return None
+
+
+def save_image_metadata(upload_folder, filename, metadata):
+    folder = os.path.join(upload_folder, VARIANTS_DIR, filename)
+    os.makedirs(folder, exist_ok=True)
+    atomic_write(
+        os.path.join(folder, METADATA_FILE),
+        lambda f: f.write(json.dumps(metadata).encode())
+    )
+
+
+def read_image_metadata(upload_folder, filename):
+    """Metadata saved by process_upload for filename, or None if not processed
+
+    Images processed before metadata files existed only report widths.
+    """
+    try:
+        with open(os.path.join(upload_folder, VARIANTS_DIR, filename, METADATA_FILE), 'rb') as f:
+            return json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        widths = read_variant_widths(upload_folder, filename)
+        return {'widths': widths} if widths else None
+
+
+def read_variant_widths(upload_folder, filename):
+    """Widths of the variants already on disk for filename, or None
+
+    Only reads image headers. Used when an image row is inserted after its
+    worker job finished, so the job callback had no row to update.
+    """
+    widths = []
+    for name in VARIANT_WIDTHS:
+        path = os.path.join(upload_folder, variant_path(filename, name, 'jpeg'))
+        try:
+            with Image.open(path) as img:
+                widths.append(img.width)
+        except (FileNotFoundError, OSError):
+            return None
+    return widths
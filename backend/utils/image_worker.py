@@ -0,0 +1,178 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.images import optimize_file
+
+
+class QueueFull(Exception):
+    """Raised when the image worker already has max_pending jobs in flight"""
+
+
+class ImageWorker:
+    """Runs image re-encoding in a process pool, off the request path
+
+    Jobs are keyed by upload filename. At most max_pending jobs may be
+    queued or running at once; submit() raises QueueFull beyond that so the
+    caller can shed load instead of queueing unbounded work. Failed jobs
+    are retried with exponential backoff up to max_attempts times.
+    """
+
+    def __init__(self, max_workers=None, max_pending=32, max_attempts=3,
+                 retry_delay=1.0, history=1000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.history = history
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, job_id, path, task=optimize_file, on_done=None):
+        """Queue task(path) and return the job's status dict
+
+        on_done(job_id, result) is called from a pool thread after success.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"Image queue is full ({job_id})")
+
+        job = {
+            'id': job_id, 'status': 'queued', 'attempts': 0, 'error': None,
+            'future': None, 'on_done': on_done
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._trim()
+        self._dispatch(job, path, task)
+        return self.status(job_id)
+
+    def _trim(self):
+        # Forget the oldest finished jobs once we hold more than `history`
+        excess = len(self._jobs) - self.history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]['status'] in ('done', 'failed'):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _dispatch(self, job, path, task):
+        job['attempts'] += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(task, path)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # A crashed child poisons the whole pool; start a fresh one
+            self._reset_executor(executor)
+            self._finish(job, path, task, None, e)
+            return
+        job['future'] = future
+        future.add_done_callback(lambda f: self._finish(job, path, task, f, f.exception()))
+
+    def _finish(self, job, path, task, future, error):
+        if isinstance(error, BrokenProcessPool) and self._executor is not None:
+            self._reset_executor(self._executor)
+
+        if error is None:
+            job['status'] = 'done'
+            job['error'] = None
+            if job['on_done']:
+                try:
+                    job['on_done'](job['id'], future.result())
+                except Exception as e:
+                    print(f"Image job {job['id']} callback failed: {e}")
+        elif job['attempts'] < self.max_attempts:
+            job['status'] = 'retrying'
+            job['error'] = str(error)
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1) * random.uniform(0.5, 1.5)
+            timer = threading.Timer(delay, self._dispatch, (job, path, task))
+            timer.daemon = True
+            timer.start()
+            return
+        else:
+            job['status'] = 'failed'
+            job['error'] = str(error)
+            print(f"Image job {job['id']} failed after {job['attempts']} attempts: {error}")
+
+        job['future'] = None
+        job['finished_at'] = time.time()
+        self._slots.release()
+
+    def run_batch(self, paths, task=optimize_file):
+        """Run task(path) for every path in parallel and wait for all of them
+
+        Returns a (result, error) pair per path, in order. The batch takes
+        one queue slot per path, so it can't overrun max_pending; if there
+        isn't room for all of it, raises QueueFull without running anything.
+        Failures are reported rather than retried.
+        """
+        acquired = 0
+        try:
+            for _ in paths:
+                if not self._slots.acquire(blocking=False):
+                    raise QueueFull(f"Image queue has no room for {len(paths)} images")
+                acquired += 1
+
+            executor = self._get_executor()
+            try:
+                futures = [executor.submit(task, path) for path in paths]
+            except (BrokenProcessPool, RuntimeError):
+                self._reset_executor(executor)
+                raise
+            results = []
+            for future in futures:
+                try:
+                    results.append((future.result(), None))
+                except Exception as e:
+                    results.append((None, e))
+            if any(isinstance(error, BrokenProcessPool) for _, error in results):
+                self._reset_executor(executor)
+            return results
+        finally:
+            for _ in range(acquired):
+                self._slots.release()
+
+    def status(self, job_id):
+        """Return a JSON-friendly snapshot of a job, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = job['status']
+            future = job['future']
+            if status == 'queued' and future is not None and future.running():
+                status = 'processing'
+            return {
+                'id': job_id,
+                'status': status,
+                'attempts': job['attempts'],
+                'error': job['error']
+            }
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] not in ('done', 'failed'))
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,74 @@
+import os
+import tempfile
+from io import BytesIO
+from PIL import Image
+
+MAX_IMAGE_SIZE = 1920
+JPEG_QUALITY = 85
+
+
+def _optimize(img):
+    """Downscale to fit within MAX_IMAGE_SIZE and convert to RGB
+
+    Expects a freshly opened, not yet loaded image. JPEGs are decoded
+    straight at 1/2, 1/4 or 1/8 scale (draft mode) when that still covers
+    the target size, so a 24 MP photo is never held in memory at full
+    size. Other formats are reduced by an integer factor before resampling.
+    """
+    # Palette and bilevel images only resize with NEAREST; convert first
+    if img.mode in ('P', '1'):
+        img = img.convert('RGB')
+
+    # Calculate new dimensions while maintaining aspect ratio
+    ratio = min(MAX_IMAGE_SIZE/float(img.size[0]), MAX_IMAGE_SIZE/float(img.size[1]))
+    if ratio < 1:
+        new_size = tuple([max(1, int(x*ratio)) for x in img.size])
+        img.draft('RGB', new_size)
+        img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    # Convert to RGB if necessary (JPEG can't store alpha)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img
+
+
+def optimize_image(image_file):
+    try:
+        img = _optimize(Image.open(image_file))
+
+        # Save optimized image
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        output.seek(0)
+        return output
+
+    except Exception as e:
+        print(f"Error optimizing image: {e}")
+        return image_file
+
+
+def atomic_write(path, write):
+    """Write a file via a temp file in the same directory, then swap it in"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def optimize_file(path):
+    """Re-encode an uploaded file in place; runs in the image worker processes
+
+    Readers see either the original upload or the finished file, never a
+    partial write. Errors propagate so the worker can retry.
+    """
+    with Image.open(path) as original:
+        img = _optimize(original)
+        atomic_write(path, lambda f: img.save(f, format='JPEG', quality=JPEG_QUALITY, optimize=True))
+    return os.path.getsize(path)
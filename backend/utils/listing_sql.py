@@ -0,0 +1,65 @@
+# SQL shared by the listing handlers in app.py and by index_advisor.py,
+# kept here so the advisor can EXPLAIN it without importing the app.
+
+# Image lists are aggregated with GROUP_CONCAT as newline-separated rows of
+# tab-separated fields, since BlurHash strings can contain ',' and ':'.
+# The hint lifts MySQL's 1 KiB default for group_concat_max_len.
+GROUP_CONCAT_HINT = '/*+ SET_VAR(group_concat_max_len = 65536) */'
+
+# Great-circle distance in km from (%s, %s) to a row's latitude/longitude;
+# takes the parameters (lat, lng, lat)
+DISTANCE_SQL = """(6371 * acos(
+    cos(radians(%s)) * cos(radians(latitude)) *
+    cos(radians(longitude) - radians(%s)) +
+    sin(radians(%s)) * sin(radians(latitude))
+))"""
+
+
+def image_list_sql(alias):
+    fields = ', '.join(
+        f"COALESCE({alias}.{column}, '')" for column in ('variant_widths', 'blurhash', 'dominant_color')
+    )
+    return f"GROUP_CONCAT(DISTINCT CONCAT_WS('\\t', {alias}.image_path, {fields}) SEPARATOR '\\n')"
+
+
+def first_image_sql(alias):
+    """Aggregate for a listing's first image with its placeholder fields"""
+    # Tab sorts before any filename character, so MIN still picks the first path
+    return f"MIN(CONCAT_WS('\\t', {alias}.image_path, COALESCE({alias}.blurhash, ''), COALESCE({alias}.dominant_color, '')))"
+
+
+def stay_images_sql(count):
+    """Images of count stays in display order; takes the stay ids"""
+    return f"""
+    SELECT stay_id, image_path, variant_widths, blurhash, dominant_color
+    FROM stay_images
+    WHERE stay_id IN ({', '.join(['%s'] * count)})
+    ORDER BY stay_id, display_order
+"""
+
+
+def stay_amenities_sql(count):
+    """Amenities of count stays; takes the stay ids"""
+    return f"""
+    SELECT sa.stay_id, a.name, a.category
+    FROM amenities a
+    JOIN stay_amenities sa ON a.id = sa.amenity_id
+    WHERE sa.stay_id IN ({', '.join(['%s'] * count)})
+"""
+
+
+NEARBY_FOOD_SQL = f"""
+    SELECT id, title, 'food' as type, latitude, longitude, {DISTANCE_SQL} as distance
+    FROM food_experiences
+    WHERE status = 'published'
+    HAVING distance <= %s
+    ORDER BY distance
+"""
+
+NEARBY_STAYS_SQL = f"""
+    SELECT id, title, 'stay' as type, latitude, longitude, {DISTANCE_SQL} as distance
+    FROM stays
+    WHERE status = 'published'
+    HAVING distance <= %s
+    ORDER BY distance
+"""
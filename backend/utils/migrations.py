@@ -0,0 +1,411 @@
+import hashlib
+import importlib.util
+import os
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import mysql.connector
+from mysql.connector import errorcode
+
+MIGRATIONS_TABLE = 'schema_migrations'
+# Held while migrating, so two deploys can't run migrations at once
+LOCK_NAME = 'fiat_schema_migrations'
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# How to run an ALTER that MySQL can't do online (INSTANT or INPLACE with
+# LOCK=NONE): 'fail' refuses, 'copy' runs a blocking table copy,
+# 'pt-osc' hands it to pt-online-schema-change
+ALTER_STRATEGIES = ('fail', 'copy', 'pt-osc')
+ONLINE_ALTER_UNSUPPORTED = (
+    errorcode.ER_ALTER_OPERATION_NOT_SUPPORTED,
+    errorcode.ER_ALTER_OPERATION_NOT_SUPPORTED_REASON,
+    # ALGORITHM=INSTANT on servers older than 8.0.12
+    errorcode.ER_UNKNOWN_ALTER_ALGORITHM
+)
+
+
+class MigrationError(Exception):
+    """Raised when migrations can't be run safely"""
+
+
+class Migration:
+    """One versioned file in the migrations directory: NNNN_name.py with up(schema)"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'rb') as f:
+            # Line endings don't change a migration
+            self.checksum = hashlib.sha256(f.read().replace(b'\r\n', b'\n')).hexdigest()
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f"migrations.{self!r}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not callable(getattr(module, 'up', None)):
+            raise MigrationError(f"{self!r} has no up(schema) function")
+        return module
+
+
+def discover(directory):
+    """Migrations in directory, ordered by version"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Two migrations have version {version:04d}: {migrations[version]!r} and {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+class Schema:
+    """What a migration's up() works with
+
+    Every helper checks information_schema first, so migrations can run
+    against databases that already have the change (those set up from the
+    old schema.sql and migrate_*.py scripts). DDL commits implicitly in
+    MySQL, so a migration that fails halfway is finished by re-running it.
+
+    ALTERs are tried as ALGORITHM=INSTANT, then ALGORITHM=INPLACE with
+    LOCK=NONE, so reads and writes continue while they run; anything else
+    goes to alter_strategy. Each DDL waits at most lock_wait_timeout
+    seconds for its metadata lock, then backs off and retries, so a long
+    query holding the table can't queue all traffic behind the ALTER.
+    With dry_run, statements that change anything are printed instead.
+    """
+
+    def __init__(self, conn, db_config, dry_run=False, alter_strategy='fail',
+                 lock_wait_timeout=5, ddl_retries=5):
+        if alter_strategy not in ALTER_STRATEGIES:
+            raise MigrationError(f"Unknown ALTER strategy {alter_strategy} (expected one of {', '.join(ALTER_STRATEGIES)})")
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.db_config = db_config
+        self.dry_run = dry_run
+        self.alter_strategy = alter_strategy
+        self.ddl_retries = ddl_retries
+        self.cursor.execute("SET SESSION lock_wait_timeout = %s", (lock_wait_timeout,))
+
+    def close(self):
+        self.cursor.close()
+
+    # Inspection
+
+    def query(self, sql, params=None):
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
+
+    def table_exists(self, table):
+        return self.query("""
+            SELECT COUNT(*) FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = %s
+        """, (table,))[0][0] > 0
+
+    def column_exists(self, table, column):
+        return self.query("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))[0][0] > 0
+
+    def index_exists(self, table, index):
+        return self.query("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, index))[0][0] > 0
+
+    # Changes
+
+    def execute(self, sql, params=None):
+        if self.dry_run:
+            print(f"    would run: {' '.join(sql.split())}")
+            return
+        self.cursor.execute(sql, params)
+        self.conn.commit()
+
+    def _ddl(self, sql):
+        """Run DDL, retrying when it can't get its metadata lock in time"""
+        for attempt in range(self.ddl_retries + 1):
+            try:
+                return self.execute(sql)
+            except mysql.connector.Error as err:
+                if err.errno != errorcode.ER_LOCK_WAIT_TIMEOUT or attempt == self.ddl_retries:
+                    raise
+                wait = 2 ** attempt
+                print(f"    table is busy, retrying in {wait}s")
+                time.sleep(wait)
+
+    def create_table(self, table, definition):
+        if self.table_exists(table):
+            return False
+        print(f"  Creating table {table}")
+        self._ddl(f"CREATE TABLE {table} ({definition}) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci")
+        return True
+
+    def drop_table(self, table):
+        if not self.table_exists(table):
+            return False
+        print(f"  Dropping table {table}")
+        self._ddl(f"DROP TABLE {table}")
+        return True
+
+    def alter(self, table, clause):
+        """ALTER TABLE without blocking writes; returns how it was run"""
+        print(f"  ALTER TABLE {table} {' '.join(clause.split())}")
+        if self.dry_run:
+            return 'dry-run'
+        for algorithm, lock in (('INSTANT', None), ('INPLACE', 'NONE')):
+            options = f", ALGORITHM={algorithm}" + (f", LOCK={lock}" if lock else '')
+            try:
+                self._ddl(f"ALTER TABLE {table} {clause}{options}")
+                print(f"    done with ALGORITHM={algorithm}")
+                return algorithm.lower()
+            except mysql.connector.Error as err:
+                if err.errno not in ONLINE_ALTER_UNSUPPORTED:
+                    raise
+
+        if self.alter_strategy == 'copy':
+            print(f"    can't run online; copying {table}, writes to it block until done")
+            self._ddl(f"ALTER TABLE {table} {clause}, ALGORITHM=COPY")
+            return 'copy'
+        if self.alter_strategy == 'pt-osc':
+            self._pt_online_schema_change(table, clause)
+            return 'pt-osc'
+        raise MigrationError(
+            f"ALTER TABLE {table} {clause} can't run online; rerun with --alter-strategy pt-osc "
+            f"(or copy, which blocks writes to {table})"
+        )
+
+    def _pt_online_schema_change(self, table, clause):
+        """Copy the table in chunks with triggers, then swap it in"""
+        print(f"    running pt-online-schema-change on {table}")
+        # Credentials go in a defaults file so they don't show in ps
+        with tempfile.NamedTemporaryFile('w', suffix='.cnf') as defaults:
+            defaults.write(f"[client]\nuser={self.db_config.get('user') or ''}\n"
+                           f"password={self.db_config.get('password') or ''}\n")
+            defaults.flush()
+            dsn = f"F={defaults.name},h={self.db_config.get('host', 'localhost')},D={self.db_config['database']},t={table}"
+            subprocess.run([
+                'pt-online-schema-change', '--alter', ' '.join(clause.split()),
+                '--max-load', 'Threads_running=25', '--critical-load', 'Threads_running=50',
+                '--execute', dsn
+            ], check=True)
+
+    def add_column(self, table, column, definition):
+        if self.column_exists(table, column):
+            return False
+        self.alter(table, f"ADD COLUMN {column} {definition}")
+        return True
+
+    def drop_column(self, table, column):
+        if not self.column_exists(table, column):
+            return False
+        self.alter(table, f"DROP COLUMN {column}")
+        return True
+
+    def add_index(self, table, index, columns, unique=False):
+        if self.index_exists(table, index):
+            return False
+        self.alter(table, f"ADD {'UNIQUE ' if unique else ''}INDEX {index} ({columns})")
+        return True
+
+    def drop_index(self, table, index):
+        if not self.index_exists(table, index):
+            return False
+        self.alter(table, f"DROP INDEX {index}")
+        return True
+
+    def backfill(self, table, assignments, where='1 = 1', params=(), batch_size=1000,
+                 sleep=0.05, target_seconds=0.5, key='id'):
+        """UPDATE table SET assignments WHERE where, in primary-key ranges
+
+        Each batch covers key values [start, start + batch_size) and is
+        committed on its own, so row locks are held for one short range at
+        a time and replicas apply it in small pieces. Between batches it
+        sleeps for sleep seconds; the batch size halves when a batch takes
+        longer than target_seconds and grows again when batches are quick.
+        Returns the number of rows changed.
+        """
+        low, high = self.query(f"SELECT MIN({key}), MAX({key}) FROM {table}")[0]
+        if low is None:
+            return 0
+        print(f"  Backfilling {table} ({key} {low}..{high}): SET {' '.join(assignments.split())}")
+        if self.dry_run:
+            return 0
+
+        changed = 0
+        start = low
+        started = time.monotonic()
+        while start <= high:
+            end = start + batch_size
+            batch_start = time.monotonic()
+            self.cursor.execute(f"""
+                UPDATE {table} SET {assignments}
+                WHERE {key} >= %s AND {key} < %s AND ({where})
+            """, (start, end, *params))
+            self.conn.commit()
+            changed += self.cursor.rowcount
+            elapsed = time.monotonic() - batch_start
+
+            if elapsed > target_seconds:
+                batch_size = max(1, batch_size // 2)
+            elif elapsed < target_seconds / 4:
+                batch_size *= 2
+            start = end
+            done = min(1.0, (start - low) / (high - low + 1))
+            print(f"    {done:.0%} ({changed} rows, {time.monotonic() - started:.1f}s)", end='\r')
+            if sleep and start <= high:
+                time.sleep(sleep)
+        print(f"    {changed} rows in {time.monotonic() - started:.1f}s" + ' ' * 20)
+        return changed
+
+
+class Migrator:
+    """Applies pending migrations in version order and records them
+
+    schema_migrations holds each applied version with the checksum of its
+    file. A migration edited after it was applied, or one missing from
+    disk, stops the run: fix the tree or write a new migration instead.
+    """
+
+    def __init__(self, conn, directory, db_config):
+        self.conn = conn
+        self.directory = directory
+        self.db_config = db_config
+
+    def _cursor(self):
+        return self.conn.cursor()
+
+    def ensure_table(self):
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum CHAR(64) NOT NULL,
+                    applied_at DATETIME NOT NULL,
+                    execution_ms INT NOT NULL DEFAULT 0
+                ) ENGINE=InnoDB
+            """)
+        finally:
+            cursor.close()
+
+    def applied(self):
+        """{version: (name, checksum, applied_at)} of applied migrations"""
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"SELECT version, name, checksum, applied_at FROM {MIGRATIONS_TABLE}")
+            return {row[0]: row[1:] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def plan(self):
+        """(migrations on disk, applied rows, pending migrations); raises on drift"""
+        migrations = discover(self.directory)
+        applied = self.applied()
+        on_disk = {migration.version: migration for migration in migrations}
+
+        problems = []
+        for version, (name, checksum, _) in sorted(applied.items()):
+            migration = on_disk.get(version)
+            if migration is None:
+                problems.append(f"{version:04d}_{name} was applied but its file is missing")
+            elif migration.checksum != checksum:
+                problems.append(f"{migration!r} changed after it was applied")
+        if problems:
+            raise MigrationError('; '.join(problems))
+
+        pending = [migration for migration in migrations if migration.version not in applied]
+        latest = max(applied, default=0)
+        for migration in pending:
+            if migration.version < latest:
+                print(f"Warning: {migration!r} is older than applied version {latest:04d}; it will run now")
+        return migrations, applied, pending
+
+    def _record(self, migration, elapsed_ms):
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"""
+                INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum, applied_at, execution_ms)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (migration.version, migration.name, migration.checksum, datetime.now(), elapsed_ms))
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def _lock(self):
+        cursor = self._cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+            if cursor.fetchone()[0] != 1:
+                raise MigrationError("Another migration run is in progress")
+        finally:
+            cursor.close()
+
+    def _unlock(self):
+        cursor = self._cursor()
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def status(self):
+        migrations, applied, pending = self.plan()
+        for migration in migrations:
+            if migration.version in applied:
+                print(f"  applied  {migration!r} ({applied[migration.version][2]})")
+            else:
+                print(f"  pending  {migration!r}")
+        return pending
+
+    def up(self, target=None, dry_run=False, alter_strategy='fail', lock_wait_timeout=5):
+        """Apply pending migrations up to target (all by default); returns those applied"""
+        self.ensure_table()
+        self._lock()
+        try:
+            _, _, pending = self.plan()
+            pending = [migration for migration in pending if target is None or migration.version <= target]
+            if not pending:
+                print("Database is up to date.")
+                return []
+
+            schema = Schema(self.conn, self.db_config, dry_run=dry_run, alter_strategy=alter_strategy,
+                            lock_wait_timeout=lock_wait_timeout)
+            try:
+                for migration in pending:
+                    print(f"{'Would apply' if dry_run else 'Applying'} {migration!r}")
+                    start = time.monotonic()
+                    migration.load().up(schema)
+                    elapsed_ms = int((time.monotonic() - start) * 1000)
+                    if not dry_run:
+                        self._record(migration, elapsed_ms)
+                        print(f"  done in {elapsed_ms / 1000:.1f}s")
+            finally:
+                schema.close()
+            return pending
+        finally:
+            self._unlock()
+
+    def mark(self, version):
+        """Record a migration as applied without running it"""
+        self.ensure_table()
+        migrations, applied, _ = self.plan()
+        migration = next((m for m in migrations if m.version == version), None)
+        if migration is None:
+            raise MigrationError(f"No migration with version {version:04d}")
+        if version in applied:
+            print(f"{migration!r} is already applied.")
+            return
+        self._record(migration, 0)
+        print(f"Marked {migration!r} as applied.")
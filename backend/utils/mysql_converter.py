@@ -0,0 +1,34 @@
+from mysql.connector.conversion import MySQLConverter
+
+
+class WireConverter(MySQLConverter):
+    """Converts MySQL results straight to the types the API sends out
+
+    DECIMAL columns (prices, coordinates, AVG(rating)) become floats,
+    DATETIME/TIMESTAMP become ISO 8601 strings and TINYINT becomes bool,
+    so handlers can pass rows to jsonify without touching each field.
+    Every TINYINT in our schema is a BOOLEAN column (is_host, is_primary,
+    is_available, plan_changed); use INT/SMALLINT for anything numeric.
+
+    Only the pure Python protocol honours converter_class, so connections
+    using it must be opened with use_pure=True, which also means result
+    rows are parsed in Python rather than by the C extension.
+    benchmarks/bench_driver.py measures that trade-off on the listing
+    queries.
+    """
+
+    def _DECIMAL_to_python(self, value, desc=None):  # pylint: disable=C0103
+        return float(value)
+
+    _NEWDECIMAL_to_python = _DECIMAL_to_python
+
+    def _DATETIME_to_python(self, value, dsc=None):  # pylint: disable=C0103
+        # Text protocol sends 'YYYY-MM-DD HH:MM:SS[.ffffff]'
+        if value.startswith(b'0000-00-00'):
+            return None
+        return value.decode('ascii').replace(' ', 'T', 1)
+
+    _TIMESTAMP_to_python = _DATETIME_to_python
+
+    def _TINY_to_python(self, value, desc=None):  # pylint: disable=C0103
+        return value != b'0'
@@ -0,0 +1,91 @@
+import math
+from PIL import Image
+
+# BlurHash: a DCT of a tiny downscale, packed into ~28 base83 characters
+# that clients decode into a blurred preview (https://blurha.sh)
+BLURHASH_COMPONENTS = (4, 3)
+SAMPLE_SIZE = 32
+
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+_SRGB_TO_LINEAR = [
+    value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    for value in (i / 255 for i in range(256))
+]
+
+
+def _encode83(value, length):
+    return ''.join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _quantize_ac(value, max_value):
+    scaled = math.copysign(abs(value / max_value) ** 0.5, value)
+    return max(0, min(18, int(math.floor(scaled * 9 + 9.5))))
+
+
+def blurhash(img, components=BLURHASH_COMPONENTS):
+    """BlurHash string for a small RGB image"""
+    x_components, y_components = components
+    width, height = img.size
+    data = img.tobytes()
+    pixels = [
+        (_SRGB_TO_LINEAR[data[i]], _SRGB_TO_LINEAR[data[i + 1]], _SRGB_TO_LINEAR[data[i + 2]])
+        for i in range(0, len(data), 3)
+    ]
+
+    factors = []
+    for j in range(y_components):
+        basis_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            basis_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = basis_x[x] * basis_y[y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantized_max = max(0, min(82, int(math.floor(max(abs(c) for f in ac for c in f) * 166 - 0.5))))
+        max_value = (quantized_max + 1) / 166
+        result += _encode83(quantized_max, 1)
+    else:
+        max_value = 1
+        result += _encode83(0, 1)
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for r, g, b in ac:
+        result += _encode83(
+            _quantize_ac(r, max_value) * 19 * 19 + _quantize_ac(g, max_value) * 19 + _quantize_ac(b, max_value), 2
+        )
+    return result
+
+
+def dominant_color(img, colors=8):
+    """Most common color of a small RGB image, as '#rrggbb'"""
+    quantized = img.quantize(colors=colors)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def compute_placeholder(path):
+    """BlurHash and dominant color for the image at path"""
+    with Image.open(path) as img:
+        # JPEGs decode straight at 1/8 scale; only a 32px sample is needed
+        img.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        sample = img.convert('RGB')
+        sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BOX)
+    return {'blurhash': blurhash(sample), 'dominant_color': dominant_color(sample)}
@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+# Best to worst, as MySQL ranks join types
+ACCESS_TYPES = ('system', 'const', 'eq_ref', 'ref', 'fulltext', 'ref_or_null',
+                'index_merge', 'unique_subquery', 'index_subquery', 'range', 'index', 'ALL')
+
+# Tables small enough that a full scan is the right plan
+SMALL_TABLES = {'amenities'}
+
+
+def plan_summary(plan):
+    """Tables (access type, key, rows, covering) and flags from an EXPLAIN FORMAT=JSON plan"""
+    tables = []
+    flags = set()
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+        if node.get('using_filesort'):
+            flags.add('filesort')
+        if node.get('using_temporary_table'):
+            flags.add('temporary')
+        table = node.get('table')
+        if isinstance(table, dict) and 'table_name' in table:
+            access = table.get('access_type')
+            tables.append({
+                'table': table['table_name'],
+                'access': access,
+                'key': table.get('key'),
+                'rows': table.get('rows_examined_per_scan'),
+                'covering': bool(table.get('using_index'))
+            })
+            # Derived tables alias their source; only real tables count as scans
+            if access == 'ALL' and table['table_name'] not in SMALL_TABLES and not table.get('materialized_from_subquery'):
+                flags.add(f"full scan of {table['table_name']}")
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                walk(value)
+
+    walk(plan)
+    return {'tables': tables, 'flags': sorted(flags)}
+
+
+def estimated_rows_examined(plan):
+    """Rows the optimizer expects a plan to read, from an EXPLAIN FORMAT=JSON plan
+
+    Each table in a nested loop is scanned once per row the tables before
+    it produce, so its rows_examined_per_scan is multiplied by that.
+    """
+    total = 0
+
+    def walk(node, loops):
+        nonlocal total
+        if isinstance(node, list):
+            for item in node:
+                loops = walk(item, loops)
+            return loops
+        if not isinstance(node, dict):
+            return loops
+        table = node.get('table')
+        if isinstance(table, dict) and 'table_name' in table:
+            total += (table.get('rows_examined_per_scan') or 0) * loops
+            walk({key: value for key, value in table.items() if key != 'table_name'}, 1)
+            return max(1, table.get('rows_produced_per_join') or 1)
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                loops = walk(value, loops)
+        return loops
+
+    walk(plan, 1)
+    return int(total)
+
+
+def plan_signature(summary):
+    """Short hash of a plan's shape (tables, access types, indexes, flags), ignoring row estimates"""
+    shape = [[table['table'], table['access'], table['key']] for table in summary['tables']]
+    return hashlib.sha256(json.dumps([shape, summary['flags']]).encode()).hexdigest()[:16]
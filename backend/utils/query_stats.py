@@ -0,0 +1,234 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# Called with (endpoint, QueryLog) for every finished request (see capture_queries)
+_listeners = []
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders replaced by ?, for grouping statements
+
+    "SELECT * FROM stays WHERE id = 7" and "... id = %s" both become
+    "SELECT * FROM stays WHERE id = ?"; IN lists collapse to (...).
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _VALUE_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryLog:
+    """Statements run while handling one request
+
+    Each entry is [normalized sql, seconds, rows, sql, params]; seconds
+    include the time spent fetching results, rows are those fetched (or
+    affected). The raw sql and params are kept for the slow query log.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.started = time.perf_counter()
+
+    def record(self, sql, seconds, rows, params=None):
+        entry = [normalize_sql(sql), seconds, rows, sql, params]
+        self.entries.append(entry)
+        return entry
+
+    @property
+    def count(self):
+        return len(self.entries)
+
+    @property
+    def seconds(self):
+        return sum(entry[1] for entry in self.entries)
+
+    @property
+    def rows(self):
+        return sum(entry[2] for entry in self.entries)
+
+    def repeated(self, threshold):
+        """(sql, times) for statements run more than threshold times"""
+        counts = Counter(entry[0] for entry in self.entries)
+        return [(sql, times) for sql, times in counts.most_common() if times > threshold]
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times every statement into a QueryLog"""
+
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log = log
+        self._entry = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed(self, sql, params, call):
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            self._entry = self._log.record(sql, time.perf_counter() - start, max(self._cursor.rowcount, 0), params)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(operation, params, lambda: self._cursor.execute(operation, params, *args, **kwargs))
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        # Too costly to EXPLAIN per row; only the statement is kept
+        return self._timed(operation, None, lambda: self._cursor.executemany(operation, seq_params, *args, **kwargs))
+
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if self._entry is not None:
+            self._entry[1] += time.perf_counter() - start
+            # Unbuffered cursors count rows as they are fetched
+            self._entry[2] = max(self._cursor.rowcount, 0)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetch(lambda: self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors, commits and rollbacks are logged"""
+
+    def __init__(self, conn, log):
+        self._conn = conn
+        self._log = log
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._log)
+
+    def wrap_cursor(self, cursor):
+        """Log a cursor made without cursor(), e.g. a cached prepared one"""
+        inner = getattr(self._conn, 'wrap_cursor', None)
+        return InstrumentedCursor(inner(cursor) if inner else cursor, self._log)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            self._log.record('COMMIT', time.perf_counter() - start, 0)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.rollback()
+        finally:
+            self._log.record('ROLLBACK', time.perf_counter() - start, 0)
+
+
+class QueryStats:
+    """Per-request query counts and timings
+
+    Connections handed out through wrap() during a request log every
+    statement. When the request finishes, statements slower than the
+    slow_log threshold are passed to it, statements that ran more than
+    repeat_threshold times are reported as a likely N+1, and with
+    server_timing the totals go out in a Server-Timing header (shown in
+    the browser's network panel):
+
+        Server-Timing: db;dur=12.4;desc="9 queries, 57 rows", app;dur=31.0
+    """
+
+    def __init__(self, repeat_threshold=5, server_timing=True, slow_log=None):
+        self.repeat_threshold = repeat_threshold
+        self.server_timing = server_timing
+        # A SlowQueryLog that statements over its threshold are sent to
+        self.slow_log = slow_log
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def wrap(self, conn):
+        log = g.get('query_log') if has_request_context() else None
+        return InstrumentedConnection(conn, log) if log is not None else conn
+
+    def _start(self):
+        g.query_log = QueryLog()
+
+    def _finish(self, response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+
+        for sql, times in log.repeated(self.repeat_threshold):
+            print(f"Warning: possible N+1 in {request.method} {request.path}: "
+                  f"ran {times} times: {sql[:200]}")
+
+        if self.slow_log is not None:
+            for entry in log.entries:
+                if entry[1] * 1000 >= self.slow_log.threshold_ms:
+                    self.slow_log.submit(request.endpoint, *entry)
+
+        if self.server_timing:
+            elapsed = time.perf_counter() - log.started
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={log.seconds * 1000:.1f};desc="{log.count} queries, {log.rows} rows", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        for listener in list(_listeners):
+            listener(request.endpoint, log)
+        return response
+
+
+@contextmanager
+def capture_queries():
+    """Collect (endpoint, QueryLog) for every request finished in the block"""
+    captured = []
+    listener = lambda endpoint, log: captured.append((endpoint, log))
+    _listeners.append(listener)
+    try:
+        yield captured
+    finally:
+        _listeners.remove(listener)
+
+
+def assert_max_queries(client, max_queries, path, method='GET', **kwargs):
+    """Test helper: request path with a Flask test client, failing on too many queries
+
+    Returns the response. The failure lists the statements the request
+    ran with how often each ran, so the loop that issued them stands out:
+
+        assert_max_queries(app.test_client(), 4, '/api/stays')
+    """
+    with capture_queries() as captured:
+        response = client.open(path, method=method, **kwargs)
+    for endpoint, log in captured:
+        if log.count > max_queries:
+            counts = Counter(entry[0] for entry in log.entries)
+            statements = '\n'.join(f"  {times}x {sql}" for sql, times in counts.most_common())
+            raise AssertionError(
+                f"{method} {path} ({endpoint}) ran {log.count} queries, expected at most {max_queries}:\n{statements}"
+            )
+    return response
@@ -0,0 +1,135 @@
+from dataclasses import dataclass, field
+
+
+# Column order for the listing queries. Records are built positionally from
+# tuple rows, so SELECTs must list these columns in exactly this order.
+FOOD_EXPERIENCE_COLUMNS = (
+    'id', 'host_id', 'title', 'description', 'location_name',
+    'price_per_person', 'cuisine_type', 'menu_description',
+    'created_at', 'updated_at', 'status', 'address', 'zipcode',
+    'city', 'state', 'latitude', 'longitude',
+    'duration', 'max_guests', 'language'
+)
+STAY_COLUMNS = (
+    'id', 'host_id', 'title', 'description', 'location_name',
+    'price_per_night', 'max_guests', 'bedrooms', 'bathrooms',
+    'created_at', 'updated_at', 'status', 'address', 'zipcode',
+    'city', 'state', 'latitude', 'longitude'
+)
+
+
+def select_columns(alias, columns):
+    """Render a column list for a SELECT, e.g. 'fe.id, fe.title'"""
+    return ', '.join(f'{alias}.{column}' for column in columns)
+
+
+@dataclass(slots=True)
+class Image:
+    path: str
+    order: int = 0
+    widths: list = None
+    blurhash: str = None
+    color: str = None
+
+
+@dataclass(slots=True)
+class Host:
+    name: str = None
+    image: str = None
+    rating: float = 0
+    reviews: int = 0
+
+
+@dataclass(slots=True)
+class FoodExperience:
+    id: int
+    host_id: int
+    title: str
+    description: str
+    location_name: str
+    price_per_person: float
+    cuisine_type: str
+    menu_description: str
+    created_at: str
+    updated_at: str
+    status: str
+    address: str
+    zipcode: str
+    city: str
+    state: str
+    latitude: float
+    longitude: float
+    duration: str
+    max_guests: int
+    language: str
+    host: Host = None
+    images: list = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a tuple row laid out as FOOD_EXPERIENCE_COLUMNS"""
+        return cls(*row[:len(FOOD_EXPERIENCE_COLUMNS)])
+
+
+@dataclass(slots=True)
+class Stay:
+    id: int
+    host_id: int
+    title: str
+    description: str
+    location_name: str
+    price_per_night: float
+    max_guests: int
+    bedrooms: int
+    bathrooms: int
+    created_at: str
+    updated_at: str
+    status: str
+    address: str
+    zipcode: str
+    city: str
+    state: str
+    latitude: float
+    longitude: float
+    # host/details may hold pre-encoded JSON fragments (see raw_json)
+    host: object = None
+    details: object = None
+    review_count: int = 0
+    distance: float = None
+    images: list = field(default_factory=list)
+    amenities: list = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a tuple row laid out as STAY_COLUMNS"""
+        return cls(*row[:len(STAY_COLUMNS)])
+
+
+def _render(spec):
+    items = []
+    for key, value in spec.items():
+        if isinstance(value, dict):
+            value = _render(value)
+        items.append(f'{key!r}: {value}')
+    return '{' + ', '.join(items) + '}'
+
+
+def compile_shaper(spec, namespace=None, name='shape'):
+    """Compile a function that turns a record into a response dict
+
+    spec maps response keys to Python expressions over the record ``r``
+    (nested dicts produce nested objects). The expressions are compiled
+    into a single dict literal once, at import time, so shaping a row is
+    one function call with no per-field dispatch.
+    """
+    source = f'def {name}(r):\n    return {_render(spec)}\n'
+    scope = dict(namespace or {})
+    exec(compile(source, f'<shaper {name}>', 'exec'), scope)
+    shaper = scope[name]
+    shaper.source = source
+    return shaper
+
+
+def columns_spec(columns):
+    """Spec entries that copy record attributes through under the same name"""
+    return {column: f'r.{column}' for column in columns}
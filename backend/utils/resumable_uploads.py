@@ -0,0 +1,195 @@
+import base64
+import binascii
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+from utils.blob_store import CHUNK_SIZE
+
+
+class UploadError(Exception):
+    """Raised for a request the upload session can't accept
+
+    status is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_metadata(header):
+    """Decode an Upload-Metadata header ('key base64value,key2 ...') to a dict"""
+    metadata = {}
+    for pair in header.split(','):
+        key, _, value = pair.strip().partition(' ')
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            metadata[key] = ''
+    return metadata
+
+
+class UploadSessions:
+    """Resumable (tus-style) upload sessions, kept on disk
+
+    A session is created with the total length, then filled by appending
+    chunks at the current offset; a dropped connection keeps whatever was
+    written, and the client asks for the offset and carries on from there.
+    Each session is a .part file plus a .json file of its metadata in root,
+    so every worker process sees the same sessions. The offset is the
+    .part file's size, and its mtime is the last activity: sessions idle
+    for longer than ttl seconds are expired.
+    """
+
+    def __init__(self, root, max_length, ttl):
+        self.root = root
+        self.max_length = max_length
+        self.ttl = ttl
+        # Sessions being appended to by this process, where flock is missing
+        self._writers = set()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, session_id, suffix):
+        # Ids are generated by create(); anything else can't name a session
+        if not session_id.isalnum():
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self.root, f"{session_id}{suffix}")
+
+    def create(self, owner, length, filename):
+        """Start a session for `length` bytes and return its status dict"""
+        if length <= 0:
+            raise UploadError('Upload-Length must be positive')
+        if length > self.max_length:
+            raise UploadError(f"Upload-Length exceeds {self.max_length} bytes", 413)
+
+        session_id = secrets.token_hex(16)
+        with open(self._path(session_id, '.part'), 'xb'):
+            pass
+        meta = {'owner': owner, 'length': length, 'filename': filename, 'created_at': time.time()}
+        with open(self._path(session_id, '.json'), 'x') as f:
+            json.dump(meta, f)
+        return self.status(session_id, owner)
+
+    def _load(self, session_id, owner):
+        try:
+            with open(self._path(session_id, '.json')) as f:
+                meta = json.load(f)
+            updated_at = os.path.getmtime(self._path(session_id, '.part'))
+        except (FileNotFoundError, ValueError):
+            raise UploadError('Upload not found', 404)
+        if meta['owner'] != owner:
+            raise UploadError('Upload not found', 404)
+        if time.time() - updated_at > self.ttl:
+            self.delete(session_id)
+            raise UploadError('Upload expired', 410)
+        meta['updated_at'] = updated_at
+        return meta
+
+    def status(self, session_id, owner):
+        """{'id', 'offset', 'length', 'filename', 'expires_at'} for a live session"""
+        meta = self._load(session_id, owner)
+        return {
+            'id': session_id,
+            'offset': os.path.getsize(self._path(session_id, '.part')),
+            'length': meta['length'],
+            'filename': meta['filename'],
+            'expires_at': meta['updated_at'] + self.ttl
+        }
+
+    def append(self, session_id, owner, offset, stream):
+        """Append stream at offset, which must be the current offset
+
+        Bytes are written as they arrive, so if the client disconnects the
+        session keeps the part it received. Returns the new offset.
+        """
+        meta = self._load(session_id, owner)
+        with open(self._path(session_id, '.part'), 'ab') as f, self._writer(session_id, f):
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadError(f"Upload-Offset {offset} does not match {current}", 409)
+            remaining = meta['length'] - current
+            try:
+                while True:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining + 1))
+                    if not chunk:
+                        break
+                    if len(chunk) > remaining:
+                        raise UploadError('Chunk extends past Upload-Length', 413)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            except UploadError:
+                raise
+            except Exception as e:
+                # Client went away mid-chunk; keep what arrived
+                print(f"Upload {session_id} interrupted at {f.tell()}: {e}")
+            return f.tell()
+
+    @contextmanager
+    def _writer(self, session_id, f):
+        """Be the session's only writer, or raise UploadError (423) if another is
+
+        A retry that races a chunk still arriving is turned away rather
+        than interleaved with it. flock covers every worker process; without
+        it (Windows) only writers in this process are kept apart.
+        """
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError('Upload is busy', 423)
+            yield
+            return
+
+        with self._lock:
+            if session_id in self._writers:
+                raise UploadError('Upload is busy', 423)
+            self._writers.add(session_id)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers.discard(session_id)
+
+    def open_complete(self, session_id, owner):
+        """Open the finished upload for reading; returns (file, status)"""
+        status = self.status(session_id, owner)
+        if status['offset'] != status['length']:
+            raise UploadError(f"Upload incomplete: {status['offset']} of {status['length']} bytes", 409)
+        return open(self._path(session_id, '.part'), 'rb'), status
+
+    def delete(self, session_id):
+        for suffix in ('.part', '.json'):
+            try:
+                os.remove(self._path(session_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def expire(self):
+        """Delete sessions idle for longer than ttl; returns how many"""
+        expired = 0
+        cutoff = time.time() - self.ttl
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                session_id, ext = os.path.splitext(entry.name)
+                if ext != '.json' or not session_id.isalnum():
+                    continue
+                try:
+                    updated_at = os.path.getmtime(self._path(session_id, '.part'))
+                except FileNotFoundError:
+                    updated_at = entry.stat().st_mtime
+                if updated_at < cutoff:
+                    self.delete(session_id)
+                    expired += 1
+        return expired
@@ -0,0 +1,103 @@
+import orjson
+from datetime import timedelta
+from decimal import Decimal
+from flask import current_app
+
+try:
+    from flask.json import JSONEncoder
+except ImportError:  # Removed in Flask 2.3, which uses the JSON provider
+    JSONEncoder = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 has no pluggable JSON provider
+    DefaultJSONProvider = None
+
+# orjson encodes datetime, date, time, UUID and dataclasses natively
+# (datetimes come out exactly like .isoformat()); only the MySQL types it
+# doesn't know about go through default().
+_DUMP_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Encode the MySQL result types orjson doesn't handle natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8')
+    if isinstance(obj, timedelta):
+        return str(obj)
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, pretty=False):
+    """Serialize obj to JSON bytes"""
+    option = _DUMP_OPTIONS | orjson.OPT_INDENT_2 if pretty else _DUMP_OPTIONS
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    return orjson.loads(data)
+
+
+def raw_json(value):
+    """Embed an already-encoded JSON document (e.g. a JSON_OBJECT column) verbatim"""
+    if value is None:
+        return None
+    return orjson.Fragment(value)
+
+
+def _pretty():
+    return current_app.config.get('JSONIFY_PRETTYPRINT_REGULAR') or current_app.debug
+
+
+def jsonify(*args, **kwargs):
+    """Drop-in replacement for flask.jsonify that encodes with orjson"""
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+
+    return current_app.response_class(
+        dumps(data, pretty=_pretty()) + b"\n",
+        mimetype=current_app.config.get('JSONIFY_MIMETYPE', 'application/json')
+    )
+
+
+if JSONEncoder is not None:
+    class DecimalJSONEncoder(JSONEncoder):
+        """Stdlib fallback for code paths that still go through flask.json"""
+        def default(self, obj):
+            if isinstance(obj, Decimal):
+                return float(obj)
+            return super().default(obj)
+else:
+    DecimalJSONEncoder = None
+
+
+if DefaultJSONProvider is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson"""
+        def dumps(self, obj, **kwargs):
+            return dumps(obj).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            return jsonify(*args, **kwargs)
+else:
+    OrjsonProvider = None
+
+
+def init_app(app):
+    """Plug the orjson serializer into the app's JSON handling"""
+    if OrjsonProvider is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        app.json_encoder = DecimalJSONEncoder
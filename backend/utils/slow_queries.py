@@ -0,0 +1,247 @@
+import hashlib
+import json
+import queue
+import threading
+from collections import deque
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from utils.query_plans import estimated_rows_examined, plan_signature, plan_summary
+
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha256(normalized_sql.encode()).hexdigest()[:16]
+
+
+def _redact(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes, bytearray)):
+        # Emails, names, password hashes, tokens: keep only the shape
+        return f"<{type(value).__name__} len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(params):
+    """Query parameters safe to store: numbers and dates kept, text replaced by its length"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact(value) for key, value in params.items()}
+    return [_redact(value) for value in params]
+
+
+class SlowQueryLog:
+    """Statements slower than threshold_ms, with their plans
+
+    submit() only queues the statement; a background thread runs EXPLAIN
+    FORMAT=JSON for it on its own connection (so the request isn't held
+    up) and stores the result in a ring buffer of the last capacity
+    statements and, with table set, in that table. If the plan's shape
+    differs from the last one seen for the same fingerprint (the
+    normalized SQL), the record is flagged plan_changed and a warning is
+    printed. Statements arriving while the queue is full are dropped and
+    counted.
+
+    Rows examined are the optimizer's estimate from the plan; the server
+    doesn't report actual counts to the client.
+    """
+
+    def __init__(self, connect, threshold_ms=500, capacity=200, table=None, queue_size=100):
+        self.connect = connect
+        self.threshold_ms = threshold_ms
+        self.table = table
+        self.entries = deque(maxlen=capacity)
+        self.dropped = 0
+        # fingerprint -> signature of the last plan seen
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._conn = None
+        self._thread = None
+
+    def submit(self, endpoint, normalized_sql, seconds, rows, sql, params):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((endpoint, normalized_sql, seconds, rows, sql, params, datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._capture(*item)
+            except Exception as e:
+                print(f"Error recording slow query: {e}")
+                self._close()
+
+    def _cursor(self):
+        if self._conn is None:
+            self._conn = self.connect()
+        return self._conn.cursor()
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _explain(self, sql, params):
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode('utf-8', 'replace')
+        if sql.lstrip().split(None, 1)[0].upper() not in EXPLAINABLE:
+            return None
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+            return json.loads(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+
+    def _last_signature(self, key):
+        """Signature of the last stored plan for a fingerprint, so restarts keep the history"""
+        if key in self._plans or not self.table:
+            return self._plans.get(key)
+        cursor = self._cursor()
+        try:
+            cursor.execute(
+                f"SELECT plan_signature FROM {self.table} WHERE fingerprint = %s ORDER BY id DESC LIMIT 1", (key,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            cursor.close()
+
+    def _capture(self, endpoint, normalized_sql, seconds, rows, sql, params, recorded_at):
+        key = fingerprint(normalized_sql)
+        try:
+            plan = self._explain(sql, params)
+        except Exception as e:
+            # Still worth keeping the timing without the plan
+            print(f"Error explaining slow query {key}: {e}")
+            self._close()
+            plan = None
+        summary = plan_summary(plan) if plan else None
+        signature = plan_signature(summary) if summary else None
+
+        previous = self._last_signature(key)
+        changed = bool(signature and previous and previous != signature)
+        record = {
+            'fingerprint': key,
+            'sql': normalized_sql,
+            'params': redact_params(params),
+            'endpoint': endpoint,
+            'duration_ms': round(seconds * 1000, 1),
+            'rows_sent': rows,
+            'rows_examined_est': estimated_rows_examined(plan) if plan else None,
+            'plan': summary,
+            'plan_signature': signature,
+            'plan_changed': changed,
+            'previous_signature': previous if changed else None,
+            'recorded_at': recorded_at.isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self.entries.append(record)
+            if signature:
+                self._plans[key] = signature
+        if changed:
+            print(f"Warning: plan changed for slow query {key} ({normalized_sql[:120]}): "
+                  f"{previous} -> {signature}, {summary['flags']}")
+        if self.table:
+            self._store(record, recorded_at)
+
+    def _store(self, record, recorded_at):
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"""
+                INSERT INTO {self.table} (fingerprint, normalized_sql, params, endpoint, duration_ms,
+                                          rows_sent, rows_examined_est, plan, plan_signature,
+                                          plan_changed, recorded_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                record['fingerprint'], record['sql'], json.dumps(record['params']), record['endpoint'],
+                record['duration_ms'], record['rows_sent'], record['rows_examined_est'],
+                json.dumps(record['plan']), record['plan_signature'], record['plan_changed'], recorded_at
+            ))
+            self._conn.commit()
+        finally:
+            cursor.close()
+
+    def top(self, limit=20):
+        """Statements in the ring buffer grouped by fingerprint, most total time first"""
+        with self._lock:
+            records = list(self.entries)
+
+        groups = {}
+        for record in records:
+            group = groups.get(record['fingerprint'])
+            if group is None:
+                group = groups[record['fingerprint']] = {
+                    'fingerprint': record['fingerprint'], 'sql': record['sql'], 'count': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'plan_changes': 0, 'endpoints': []
+                }
+            group['count'] += 1
+            group['total_ms'] += record['duration_ms']
+            group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+            group['plan_changes'] += record['plan_changed']
+            if record['endpoint'] not in group['endpoints']:
+                group['endpoints'].append(record['endpoint'])
+            # Records are in arrival order, so this ends on the latest
+            group.update({key: record[key] for key in ('params', 'rows_examined_est', 'plan', 'recorded_at')})
+
+        ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+        for group in ranked:
+            group['total_ms'] = round(group['total_ms'], 1)
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 1)
+        return ranked
+
+    def top_from_table(self, cursor, limit=20, hours=24):
+        """Like top(), over the table's records from the last hours"""
+        since = datetime.now() - timedelta(hours=hours)
+        cursor.execute(f"""
+            SELECT fingerprint, MAX(normalized_sql), COUNT(*), SUM(duration_ms), MAX(duration_ms),
+                   SUM(plan_changed), GROUP_CONCAT(DISTINCT endpoint), MAX(id)
+            FROM {self.table}
+            WHERE recorded_at >= %s
+            GROUP BY fingerprint
+            ORDER BY SUM(duration_ms) DESC
+            LIMIT %s
+        """, (since, limit))
+        ranked = [{
+            'fingerprint': row[0], 'sql': row[1], 'count': row[2], 'total_ms': float(row[3]),
+            'max_ms': float(row[4]), 'avg_ms': round(float(row[3]) / row[2], 1),
+            'plan_changes': int(row[5] or 0), 'endpoints': row[6].split(',') if row[6] else [],
+            'last_id': row[7]
+        } for row in cursor.fetchall()]
+        if not ranked:
+            return ranked
+
+        # The latest record of each fingerprint, for its plan and parameters
+        cursor.execute(f"""
+            SELECT id, params, rows_examined_est, plan, recorded_at
+            FROM {self.table}
+            WHERE id IN ({', '.join(['%s'] * len(ranked))})
+        """, [group['last_id'] for group in ranked])
+        latest = {row[0]: row[1:] for row in cursor.fetchall()}
+        for group in ranked:
+            params, rows_examined, plan, recorded_at = latest.get(group.pop('last_id'), (None,) * 4)
+            group.update({
+                'params': json.loads(params) if params else None,
+                'rows_examined_est': rows_examined,
+                'plan': json.loads(plan) if plan else None,
+                'recorded_at': recorded_at
+            })
+        return ranked
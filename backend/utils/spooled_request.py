@@ -0,0 +1,19 @@
+from tempfile import SpooledTemporaryFile
+from flask import Request
+
+
+class SpooledRequest(Request):
+    """Request that spools uploaded files to a chosen directory
+
+    Each file part of a multipart body is written to a SpooledTemporaryFile
+    that moves to disk after spool_size bytes, so request memory stays
+    bounded whatever the upload size. Spooling next to the upload folder
+    rather than the system temp dir avoids /tmp on tmpfs, where "on disk"
+    still means RAM.
+    """
+
+    spool_size = 256 * 1024
+    spool_dir = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=self.spool_size, mode='rb+', dir=self.spool_dir)
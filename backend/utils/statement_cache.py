@@ -0,0 +1,192 @@
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+from mysql.connector import errors
+from mysql.connector.constants import FieldType
+from mysql.connector.cursor import MySQLCursorPrepared
+from mysql.connector.pooling import MySQLConnectionPool
+
+
+def _wire_datetime(value):
+    # The binary protocol sends midnight as a bare date
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.isoformat()
+
+
+# Binary protocol values -> what WireConverter gives for the text protocol
+WIRE_TYPES = {
+    FieldType.DECIMAL: float,
+    FieldType.NEWDECIMAL: float,
+    FieldType.DATETIME: _wire_datetime,
+    FieldType.TIMESTAMP: _wire_datetime,
+    FieldType.TINY: bool,
+}
+
+
+class PreparedCursor(MySQLCursorPrepared):
+    """Server-side prepared statement cursor, kept open between requests
+
+    Results come back over the binary protocol, which doesn't go through
+    converter_class, so values are converted here to match WireConverter
+    (DECIMAL to float, DATETIME to ISO string, TINYINT to bool). With
+    dictionary rows are dicts, as with cursor(dictionary=True).
+
+    close() only discards unread rows and leaves the statement prepared;
+    release() deallocates it on the server.
+    """
+
+    def __init__(self, connection=None, dictionary=False):
+        super().__init__(connection)
+        self.dictionary = dictionary
+        self._converters = ()
+
+    def execute(self, operation, params=None, multi=False):
+        # The base class re-prepares unless handed the very string object it
+        # prepared, and most statements are rebuilt for every request
+        if operation == self._executed:
+            operation = self._executed
+        return super().execute(operation, params, multi)
+
+    def _handle_result(self, result):
+        super()._handle_result(result)
+        if self._description:
+            self._converters = [WIRE_TYPES.get(column[1]) for column in self._description]
+
+    def _wire(self, row):
+        row = tuple(
+            value if convert is None or value is None else convert(value)
+            for value, convert in zip(row, self._converters)
+        )
+        return dict(zip(self.column_names, row)) if self.dictionary else row
+
+    def _fetch_row(self, raw=False):
+        row = super()._fetch_row(raw)
+        return self._wire(row) if row else row
+
+    def fetchall(self):
+        return [self._wire(row) for row in super().fetchall()]
+
+    def close(self):
+        if self._have_result and self._have_unread_result():
+            super().fetchall()
+
+    def release(self):
+        super().close()
+
+
+class StatementCache:
+    """Prepared statements kept per database connection
+
+    cursor(conn, sql) returns a PreparedCursor for sql on conn: the first
+    time on a connection the statement is prepared (parsed once by the
+    server), after that execute() only sends the parameters. fetchall()
+    and fetchone() run a statement and return its rows in one call:
+
+        rows = statements.fetchall(conn, 'SELECT ... WHERE stay_id = %s', (stay_id,))
+
+    Up to size statements are kept per connection; the least recently
+    used is deallocated to make room.
+
+    Pooled connections have to be returned without a session reset, which
+    would deallocate every statement; see StatementPool. A connection that
+    reconnected gets a new connection_id, and its statements are forgotten.
+
+    With enabled off, cursor() returns ordinary cursors, so callers work
+    either way (e.g. behind a proxy without prepared statement support).
+    """
+
+    def __init__(self, enabled=True, size=64):
+        self.enabled = enabled
+        self.size = size
+        self.prepares = 0
+        self.hits = 0
+        self._connections = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def cursor(self, conn, sql, dictionary=False):
+        if not self.enabled:
+            return conn.cursor(dictionary=dictionary)
+
+        cnx = _unwrap(conn)
+        with self._lock:
+            connection_id, cursors = self._connections.get(cnx, (None, None))
+            if cursors is None or connection_id != cnx.connection_id:
+                cursors = OrderedDict()
+                self._connections[cnx] = (cnx.connection_id, cursors)
+
+        key = (sql, dictionary)
+        cursor = cursors.get(key)
+        if cursor is None:
+            self.prepares += 1
+            cursor = cursors[key] = PreparedCursor(cnx, dictionary)
+            if len(cursors) > self.size:
+                _, evicted = cursors.popitem(last=False)
+                evicted.release()
+        else:
+            self.hits += 1
+            cursors.move_to_end(key)
+
+        # Keep the per-request wrappers (query logging, deadlines)
+        wrap = getattr(conn, 'wrap_cursor', None)
+        return wrap(cursor) if wrap else cursor
+
+    def fetchall(self, conn, sql, params=(), dictionary=False):
+        cursor = self.cursor(conn, sql, dictionary)
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def fetchone(self, conn, sql, params=(), dictionary=False):
+        cursor = self.cursor(conn, sql, dictionary)
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def stats(self):
+        with self._lock:
+            statements = sum(len(cursors) for _, cursors in self._connections.values())
+        return {
+            'enabled': self.enabled,
+            'connections': len(self._connections),
+            'statements': statements,
+            'prepares': self.prepares,
+            'hits': self.hits
+        }
+
+
+class StatementPool(MySQLConnectionPool):
+    """Connection pool that keeps each connection's session, and so its statements
+
+    MySQLConnectionPool resets the session (COM_RESET_CONNECTION) when a
+    connection comes back, which deallocates its prepared statements. This
+    pool only rolls back a transaction left open, so the next request
+    doesn't read from an old snapshot. Anything set with SET SESSION would
+    carry over to the next request; use optimizer hints instead.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(pool_reset_session=False, **kwargs)
+
+    def add_connection(self, cnx=None):
+        if cnx is not None:
+            try:
+                if cnx.in_transaction:
+                    cnx.rollback()
+            except errors.Error:
+                # A broken connection is reconnected when next handed out
+                pass
+        super().add_connection(cnx)
+
+
+def _unwrap(conn):
+    """The MySQLConnection behind query logging, deadline and pool wrappers"""
+    while hasattr(conn, 'wrap_cursor'):  # InstrumentedConnection, DeadlineConnection
+        conn = conn._conn
+    return getattr(conn, '_cnx', conn)  # PooledMySQLConnection
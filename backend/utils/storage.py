@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import hmac
+import json
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+
+from utils.blob_store import CHUNK_SIZE, ChecksumMismatch, is_blob, storage_path, store as store_blob
+from utils.image_variants import METADATA_FILE, VARIANTS_DIR, process_upload, read_image_metadata
+
+STORAGE_BACKENDS = ('local', 's3')
+
+
+class LocalStorage:
+    """Uploads as files under root; keys are paths relative to it
+
+    Presigned PUTs are URLs on this app (upload_prefix + key, with a
+    signed query), so clients use the same direct-upload flow as with S3.
+    """
+
+    is_local = True
+
+    def __init__(self, root, secret, upload_prefix):
+        self.root = root
+        self.secret = secret
+        self.upload_prefix = upload_prefix
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def modified_at(self, key):
+        try:
+            return os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def read(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def touch(self, key):
+        os.utime(self.path(key))
+
+    def save(self, key, path):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self.path(prefix), ignore_errors=True)
+
+    def _signature(self, key, sha256, size, expires):
+        message = f"{key}\n{sha256}\n{size}\n{expires}".encode()
+        return hmac.new(self.secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def presign_put(self, key, content_type, sha256, size, expires_in):
+        """(url, headers) a client can PUT the object's bytes to"""
+        expires = int(time.time()) + expires_in
+        query = f"sha256={sha256}&size={size}&expires={expires}&signature={self._signature(key, sha256, size, expires)}"
+        return f"{self.upload_prefix}{key}?{query}", {'Content-Type': content_type}
+
+    def verify_put(self, key, args):
+        """(sha256, size) from a presigned PUT's query if it is valid and unexpired, else None"""
+        try:
+            sha256, size, expires = args['sha256'], int(args['size']), int(args['expires'])
+        except (KeyError, ValueError):
+            return None
+        if expires < time.time():
+            return None
+        if not hmac.compare_digest(self._signature(key, sha256, size, expires), args.get('signature', '')):
+            return None
+        return sha256, size
+
+
+class S3Storage:
+    """Uploads as objects in an S3-compatible bucket (AWS, MinIO, R2, ...)
+
+    endpoint_url points at non-AWS services. public_url, if set, is where
+    objects are readable without signing (a public bucket or a CDN in
+    front of it); otherwise reads get short-lived presigned URLs. Needs
+    boto3, which is only imported when the first request is made. The
+    client isn't pickled, so the storage can be handed to worker processes.
+    """
+
+    is_local = False
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_url=None, url_expires_in=3600):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.url_expires_in = url_expires_in
+        self._client = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        return head['ContentLength'] if head else None
+
+    def modified_at(self, key):
+        head = self._head(key)
+        return head['LastModified'].timestamp() if head else None
+
+    def read(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+
+    def fetch(self, key, path):
+        self.client.download_file(self.bucket, key, path)
+
+    def touch(self, key):
+        # Objects are immutable; copying one onto itself resets LastModified
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': key},
+            MetadataDirective='REPLACE',
+            ContentType=mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        )
+
+    def save(self, key, path):
+        content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={'ContentType': content_type})
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def keys(self, prefix=''):
+        """Every key in the bucket under prefix"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix.rstrip('/') + '/'):
+            objects = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects})
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=self.url_expires_in
+        )
+
+    def presign_put(self, key, content_type, sha256, size, expires_in):
+        """(url, headers) a client can PUT the object's bytes to
+
+        The SHA-256 is part of the signature, so S3 rejects any body that
+        doesn't match it; process_stored_upload checks again for services
+        that don't.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self.client.generate_presigned_url('put_object', Params={
+            'Bucket': self.bucket, 'Key': key, 'ContentType': content_type,
+            'ContentLength': size, 'ChecksumSHA256': checksum
+        }, ExpiresIn=expires_in)
+        return url, {'Content-Type': content_type, 'x-amz-checksum-sha256': checksum}
+
+
+def storage_from_env(local_root, secret, upload_prefix):
+    """Storage configured by STORAGE_BACKEND ('local' or 's3') and S3_* settings"""
+    backend = os.getenv('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(local_root, secret, upload_prefix)
+    if backend == 's3':
+        return S3Storage(
+            os.getenv('S3_BUCKET'),
+            endpoint_url=os.getenv('S3_ENDPOINT_URL') or None,
+            region=os.getenv('S3_REGION') or None,
+            public_url=os.getenv('S3_PUBLIC_URL') or None
+        )
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {', '.join(STORAGE_BACKENDS)})")
+
+
+def require_local_storage(script):
+    """Exit unless STORAGE_BACKEND is local, for scripts that walk the upload folder
+
+    With remote storage the folder holds no uploads, so they would find
+    nothing to do (and gc_uploads nothing to collect).
+    """
+    backend = os.getenv('STORAGE_BACKEND', 'local')
+    if backend != 'local':
+        raise SystemExit(f"{script} only works on the local upload folder, but STORAGE_BACKEND={backend}")
+
+
+def put_blob(storage, staging_dir, stream, ext, expected=None):
+    """Store an upload in remote storage by content hash; returns (name, created)
+
+    The stream is hashed into staging_dir first, since the key depends on
+    the content. Raises ChecksumMismatch like blob_store.store.
+    """
+    # A directory per call, so identical concurrent uploads don't share a file
+    workdir = tempfile.mkdtemp(dir=staging_dir)
+    try:
+        name, _ = store_blob(workdir, stream, ext, expected=expected)
+        key = storage_path(name)
+        if storage.exists(key):
+            # Restart the grace period, as blob_store.store does
+            storage.touch(key)
+            return name, False
+        storage.save(key, os.path.join(workdir, key))
+        return name, True
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stored_metadata(storage, name):
+    """Metadata saved by processing name, or None if it isn't processed yet"""
+    if storage.is_local:
+        # Variants and metadata are stored beside their original
+        return read_image_metadata(*os.path.split(storage.path(storage_path(name))))
+    data = storage.read(storage_path(f"{VARIANTS_DIR}/{name}/{METADATA_FILE}"))
+    return json.loads(data) if data else None
+
+
+def process_stored_upload(storage, name):
+    """Image worker task: process_upload() for an upload in any storage
+
+    Remote uploads are fetched into a temp directory, processed there, and
+    the optimized original, variants and metadata are written back, the
+    original last. Not every S3-compatible service enforces the checksum
+    of a presigned PUT, so the fetched bytes are checked against the blob
+    name first; an upload that doesn't match is deleted.
+
+    An upload is processed once: processing replaces the original with
+    optimized bytes, which no longer match the name, so a second job (the
+    same content completed on another worker, say) returns the saved
+    metadata instead of re-encoding it or taking it for a bad upload.
+    """
+    metadata = stored_metadata(storage, name)
+    if metadata is not None:
+        return metadata
+
+    key = storage_path(name)
+    if storage.is_local:
+        return process_upload(storage.path(key))
+
+    with tempfile.TemporaryDirectory(prefix='process-') as workdir:
+        path = os.path.join(workdir, name)
+        storage.fetch(key, path)
+        if is_blob(name) and _sha256(path) != name.split('.')[0]:
+            # Metadata is written before the original, so optimized bytes
+            # without it can't be; check again in case a job just finished
+            metadata = stored_metadata(storage, name)
+            if metadata is not None:
+                return metadata
+            storage.delete(key)
+            raise ChecksumMismatch(f"{name} does not match its content")
+        metadata = process_upload(path)
+        variants_dir = os.path.join(workdir, VARIANTS_DIR, name)
+        for filename in sorted(os.listdir(variants_dir)):
+            if not filename.startswith('.'):
+                storage.save(storage_path(f"{VARIANTS_DIR}/{name}/{filename}"), os.path.join(variants_dir, filename))
+        storage.save(key, path)
+    return metadata
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import mysql.connector
+from flask import has_request_context, request
+from mysql.connector import errorcode
+
+# Lock conflicts worth running the whole transaction again for, and the
+# counter each is reported under. InnoDB rolls back a deadlock victim's
+# transaction itself; after a lock wait timeout only the statement is
+# rolled back, so the rest is rolled back here before the retry.
+RETRYABLE = {
+    errorcode.ER_LOCK_DEADLOCK: 'deadlocks',
+    errorcode.ER_LOCK_WAIT_TIMEOUT: 'lock_waits',
+}
+
+
+class TransactionConflict(Exception):
+    """A transaction kept running into lock conflicts and was given up"""
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a share of all transactions
+
+    Every transaction adds ratio tokens, up to capacity, and every retry
+    takes one, so under heavy contention retries add at most ratio to the
+    load on the hot rows instead of multiplying it.
+    """
+
+    def __init__(self, ratio=0.2, capacity=10):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class Transactions:
+    """Runs units of work as transactions, retried on deadlocks and lock wait timeouts
+
+    run(conn, work) calls work() and commits. When a statement or the
+    commit fails with a deadlock (1213) or lock wait timeout (1205), the
+    transaction is rolled back and work() is called again, up to attempts
+    times in all, after a random sleep of up to base_delay doubling per
+    attempt (capped at max_delay) so the conflicting requests don't collide
+    again in step. work() has to redo everything the transaction writes,
+    and nothing outside it (file uploads, image processing) should happen
+    in there. Retries also come out of a RetryBudget shared by all
+    endpoints. Once attempts or the budget run out run() raises
+    TransactionConflict, which handlers answer with a 503 and Retry-After.
+
+    Other errors are rolled back and raised as they are.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.05, max_delay=1.0, budget_ratio=0.2, retry_after=1):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget(budget_ratio)
+        self.retry_after = retry_after
+        self.counts = defaultdict(Counter)
+
+    def run(self, conn, work):
+        name = request.endpoint if has_request_context() else getattr(work, '__name__', 'transaction')
+        counts = self.counts[name]
+        counts['transactions'] += 1
+        self.budget.deposit()
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                result = work()
+                conn.commit()
+                return result
+            except mysql.connector.Error as err:
+                _rollback(conn)
+                kind = RETRYABLE.get(err.errno)
+                if kind is None:
+                    raise
+                counts[kind] += 1
+                if attempt == self.attempts:
+                    reason = f"after {attempt} attempts"
+                elif not self.budget.withdraw():
+                    counts['budget_exhausted'] += 1
+                    reason = "retry budget exhausted"
+                else:
+                    counts['retries'] += 1
+                    time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+                    continue
+                counts['gave_up'] += 1
+                print(f"Warning: {name} transaction gave up, {reason}: {err}")
+                raise TransactionConflict(str(err)) from err
+
+    def stats(self):
+        return {
+            'retry_budget': round(self.budget.tokens, 1),
+            'endpoints': {name: dict(counts) for name, counts in self.counts.items()}
+        }
+
+
+def _rollback(conn):
+    try:
+        conn.rollback()
+    except mysql.connector.Error:
+        # A broken connection is reconnected when next handed out
+        pass
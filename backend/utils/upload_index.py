@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+from utils.blob_store import BLOBS_DIR, is_blob, storage_path
+from utils.image_variants import VARIANTS_DIR
+
+
+class UploadIndex:
+    """In-memory set of upload names (as stored in image_path) known to exist
+
+    Built by scanning the upload folder and kept current by the upload and
+    delete handlers, so listing endpoints check image existence without a
+    stat per image. A name that isn't indexed is checked on disk once and
+    added if found, which picks up files written by other worker processes;
+    if it isn't found the miss is remembered for miss_ttl seconds, so an
+    image row pointing at a missing file doesn't cost a stat per request.
+    Files are only deleted once no image row references them, so entries
+    going stale in other workers never surface in listings.
+
+    exists(name) replaces the disk check when uploads live elsewhere (see
+    utils.storage); build() is then given the storage's keys to index
+    instead of scanning the upload folder.
+    """
+
+    def __init__(self, upload_folder, exists=None, miss_ttl=30):
+        self.upload_folder = upload_folder
+        self.exists = exists or self._exists_on_disk
+        self.miss_ttl = miss_ttl
+        self._names = set()
+        self._misses = {}  # name -> time.monotonic() until which it counts as missing
+        self._lock = threading.Lock()
+
+    def build(self, keys=None):
+        """Rescan the upload folder (or index keys), replacing the current index"""
+        if keys is not None:
+            names = {name for name in map(_index_name, keys) if name}
+        else:
+            names = self._scan()
+
+        with self._lock:
+            self._names = names
+            self._misses = {}
+        return len(names)
+
+    def _scan(self):
+        names = set()
+        with os.scandir(self.upload_folder) as entries:
+            # Legacy uploads sit directly in the upload folder
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    names.add(entry.name)
+
+        blobs_root = os.path.join(self.upload_folder, BLOBS_DIR)
+        for dirpath, dirnames, filenames in os.walk(blobs_root):
+            # Variants live beside their blobs; only the originals matter here
+            dirnames[:] = [name for name in dirnames if name != VARIANTS_DIR]
+            names.update(name for name in filenames if is_blob(name))
+        return names
+
+    def __contains__(self, name):
+        if name in self._names:
+            return True
+        now = time.monotonic()
+        if self._misses.get(name, 0) > now:
+            return False
+        if self.exists(name):
+            self.add(name)
+            return True
+        with self._lock:
+            if len(self._misses) >= 10000:
+                self._misses = {missing: until for missing, until in self._misses.items() if until > now}
+            self._misses[name] = now + self.miss_ttl
+        return False
+
+    def _exists_on_disk(self, name):
+        return os.path.exists(os.path.join(self.upload_folder, storage_path(name)))
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        with self._lock:
+            self._names.add(name)
+            self._misses.pop(name, None)
+
+    def discard(self, name):
+        with self._lock:
+            self._names.discard(name)
+
+
+def _index_name(key):
+    """Upload name for a storage key, or None for variants and anything else"""
+    parts = key.split('/')
+    if len(parts) == 1:
+        # Legacy uploads sit at the top level
+        return None if key.startswith('.') else key
+    if parts[0] == BLOBS_DIR and VARIANTS_DIR not in parts and is_blob(parts[-1]):
+        return parts[-1]
+    return None